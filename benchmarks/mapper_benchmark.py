@@ -0,0 +1,106 @@
+"""
+Measures how many objects per second go through Mapper.
+
+Run from the top of the source tree::
+
+    $ python benchmarks/mapper_benchmark.py [BASELINE_TREE ...]
+
+Each source tree given is measured too, so the numbers can be compared
+with older code. To compare with the code before model mappings were
+precompiled per class::
+
+    $ git worktree add /tmp/pypump-baseline 1c662f5^
+    $ python benchmarks/mapper_benchmark.py /tmp/pypump-baseline
+"""
+from __future__ import absolute_import, print_function
+
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.environ.get("PYPUMP_TREE", ROOT))
+
+from pypump.models import Mapper  # noqa: E402
+from stubpump import make_pump  # noqa: E402
+
+
+def activity(i):
+    """ Returns an inbox activity like pump.io sends them """
+    actor = {
+        "objectType": "person",
+        "id": "acct:user%d@example.com" % (i % 10),
+        "displayName": "User %d" % (i % 10),
+        "preferredUsername": "user%d" % (i % 10),
+        "url": "https://example.com/user%d" % (i % 10),
+        "links": {"self": {"href": "https://example.com/api/user/user%d/profile" % (i % 10)}},
+    }
+    return {
+        "objectType": "activity",
+        "id": "https://example.com/api/activity/%d" % i,
+        "verb": "post",
+        "published": "2015-04-01T12:%02d:%02dZ" % (i % 60, i % 60),
+        "updated": "2015-04-01T12:%02d:%02dZ" % (i % 60, i % 60),
+        "received": "2015-04-01T12:%02d:%02dZ" % (i % 60, i % 60),
+        "actor": actor,
+        "generator": {"objectType": "application", "id": "app", "displayName": "App"},
+        "to": [{"objectType": "collection", "id": "http://activityschema.org/collection/public"}],
+        "cc": [{"objectType": "collection", "id": "https://example.com/api/user/user1/followers"}],
+        "object": {
+            "objectType": "note",
+            "id": "https://example.com/api/note/%d" % i,
+            "content": "Hello world %d" % i,
+            "published": "2015-04-01T12:%02d:%02dZ" % (i % 60, i % 60),
+            "updated": "2015-04-01T12:%02d:%02dZ" % (i % 60, i % 60),
+            "replies": {"url": "https://example.com/api/note/%d/replies" % i, "totalItems": 0, "items": []},
+            "likes": {"url": "https://example.com/api/note/%d/likes" % i, "totalItems": 0, "items": []},
+            "shares": {"url": "https://example.com/api/note/%d/shares" % i, "totalItems": 0, "items": []},
+        },
+    }
+
+
+def run(pump, count=2000):
+    """ Unserializes count activities and reads the verb and object id
+    like an inbox scanner would.
+    """
+    data = [activity(i) for i in range(count)]
+    start = time.time()
+    for item in data:
+        obj = Mapper(pypump=pump).get_object(item)
+        obj.verb, obj.obj.id
+    elapsed = time.time() - start
+    return count / elapsed
+
+
+def measure():
+    pump = make_pump()
+    for lazy in (False, True):
+        # older trees don't have these options, they're ignored there
+        pump.lazy_dates = lazy
+        pump.lazy_objects = lazy
+
+        # warm up
+        run(pump, 200)
+        results = [run(pump) for i in range(5)]
+        print("  Activities per second through Mapper.get_object%s: %d (best of 5)" % (
+            " (lazy)" if lazy else "", max(results)))
+
+
+def main(trees):
+    print("This tree:")
+    measure()
+    sys.stdout.flush()
+
+    for tree in trees:
+        print("%s:" % tree)
+        sys.stdout.flush()
+        env = dict(os.environ, PYPUMP_TREE=os.path.abspath(tree))
+        subprocess.check_call([sys.executable, os.path.abspath(__file__), "--measure"], env=env)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--measure"]:
+        measure()
+    else:
+        main(sys.argv[1:])
@@ -0,0 +1,90 @@
+"""
+Compares how long JSONStore and SQLiteStore take to load an account and
+save a change to it, with 10, 1,000 and 50,000 accounts in the store.
+
+Run from the top of the source tree::
+
+    $ python benchmarks/store_benchmark.py
+"""
+from __future__ import absolute_import, print_function
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pypump.store import JSONStore, SQLiteStore  # noqa: E402
+
+KEYS = ["client-key", "client-secret", "client-expirey", "oauth-request-token",
+        "oauth-request-secret", "oauth-access-token", "oauth-access-secret"]
+
+
+def account_data(count):
+    """ Returns what JSONStore would have saved for count accounts """
+    data = {}
+    for i in range(count):
+        for key in KEYS:
+            data["user%d@example.com-%s" % (i, key)] = "%s-%d-0123456789abcdef" % (key, i)
+    return data
+
+
+def load_json(filename, webfinger):
+    with open(filename) as fd:
+        store = JSONStore(json.load(fd), filename=filename)
+    store.prefix = webfinger
+    return store
+
+
+def best(fnc, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        fnc()
+        times.append(time.time() - start)
+    return min(times) * 1000
+
+
+def run(count, path):
+    json_filename = os.path.join(path, "credentials-%d.json" % count)
+    sqlite_filename = os.path.join(path, "credentials-%d.sqlite3" % count)
+    with open(json_filename, "w") as fd:
+        json.dump(account_data(count), fd)
+    SQLiteStore.import_json(json_filename, filename=sqlite_filename)
+
+    webfinger = "user%d@example.com" % (count // 2)
+    repeat = 3 if count > 1000 else 20
+
+    json_store = load_json(json_filename, webfinger)
+    sqlite_store = SQLiteStore.load(webfinger, None, filename=sqlite_filename)
+    changes = iter(range(10 ** 6))
+
+    def save(store):
+        store["oauth-access-token"] = "token-%d" % next(changes)
+
+    results = [
+        best(lambda: load_json(json_filename, webfinger), repeat),
+        best(lambda: save(json_store), repeat),
+        best(lambda: SQLiteStore.load(webfinger, None, filename=sqlite_filename).close(), repeat),
+        best(lambda: save(sqlite_store), repeat),
+    ]
+    sqlite_store.close()
+    return results
+
+
+def main():
+    path = tempfile.mkdtemp()
+    try:
+        print("%8s  %14s  %14s  %14s  %14s" % (
+            "accounts", "JSON load ms", "JSON save ms", "SQLite load ms", "SQLite save ms"))
+        for count in (10, 1000, 50000):
+            print("%8d  %14.2f  %14.2f  %14.2f  %14.2f" % ((count,) + tuple(run(count, path))))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    main()
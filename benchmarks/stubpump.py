@@ -0,0 +1,36 @@
+"""
+PyPump instance for the benchmarks which doesn't talk to a server.
+"""
+from __future__ import absolute_import
+
+from pypump import AbstractStore, Client, PyPump
+
+
+class MemoryStore(AbstractStore):
+    """ Store which keeps everything in memory """
+
+    def save(self):
+        pass
+
+    @classmethod
+    def load(cls, webfinger, pypump):
+        store = cls()
+        store.prefix = webfinger
+        for key in ["client-key", "client-secret", "oauth-request-token",
+                    "oauth-request-secret", "oauth-access-token", "oauth-access-secret"]:
+            store[key] = key
+        return store
+
+
+def make_pump(response=None):
+    """ Returns a PyPump which answers every request with response """
+    client = Client(webfinger="bench@example.com", type="native", name="Benchmark",
+                    key="client-key", secret="client-secret")
+    pump = PyPump(client=client, verifier_callback=None,
+                  store=MemoryStore.load(client.webfinger, None))
+
+    def requester(*args, **kwargs):
+        raise RuntimeError("The benchmark pump can't make requests")
+
+    pump._requester = response or requester
+    return pump
@@ -16,8 +16,20 @@
 ##
 
 from __future__ import absolute_import
+
+import sys
+
 from pypump.pypump import PyPump, WebPump
 from pypump.client import Client
-from pypump.store import JSONStore, AbstractStore
+from pypump.store import JSONStore, SQLiteStore, AbstractStore
+from pypump.cache import ProfileCache, DiskProfileCache, HTTPCache, MediaCache
+from pypump.pipeline import MediaPipeline
+from pypump.pool import PumpPool
+
+__all__ = ["PyPump", "WebPump", "Client", "JSONStore", "SQLiteStore", "AbstractStore",
+           "ProfileCache", "DiskProfileCache", "HTTPCache", "MediaCache",
+           "MediaPipeline", "PumpPool"]
 
-__all__ = ["PyPump", "WebPump", "Client", "JSONStore", "AbstractStore"]
+if sys.version_info >= (3, 5):
+    from pypump.aio import AsyncPyPump
+    __all__.append("AsyncPyPump")
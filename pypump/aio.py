@@ -0,0 +1,225 @@
+##
+#   Copyright (C) 2013 Jessica T. (Tsyesika) <xray7224@googlemail.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <http://www.gnu.org/licenses/>.
+##
+
+""" asyncio front end for PyPump (Python 3.5+ only) """
+
+from __future__ import absolute_import
+
+import asyncio
+import functools
+import logging
+import threading
+
+from pypump.batch import SendResult, chains, send_item
+from pypump.pypump import PyPump
+from pypump.models.note import Note
+from pypump.models.comment import Comment
+from pypump.models.person import Person
+from pypump.models.place import Place
+from pypump.models.media import Video, Audio, Image
+from pypump.models.collection import Collection
+
+_log = logging.getLogger(__name__)
+
+# Set while a model method is running on an executor thread, so nested calls
+# (f.ex. Note.comment() calling Comment.send()) run straight away.
+_local = threading.local()
+
+# Model methods which talk to the server
+AWAITABLE_METHODS = ["send", "like", "unlike", "favorite", "unfavorite",
+                     "share", "unshare", "comment", "delete", "from_file",
+                     "follow", "unfollow", "update", "add", "remove", "load"]
+
+
+def _blocking(fnc, *args, **kwargs):
+    """ Runs fnc with awaitable model methods behaving synchronously """
+    previous = getattr(_local, "blocking", False)
+    _local.blocking = True
+    try:
+        return fnc(*args, **kwargs)
+    finally:
+        _local.blocking = previous
+
+
+def run_blocking(pump, fnc, *args, **kwargs):
+    """ Runs blocking fnc on pump's executor and returns an awaitable """
+    aio = getattr(pump, "_aio", None)
+    executor = aio.executor if aio is not None else None
+    loop = asyncio.get_event_loop()
+    return loop.run_in_executor(
+        executor,
+        functools.partial(_blocking, fnc, *args, **kwargs)
+    )
+
+
+def awaitable(fnc):
+    """ Makes a blocking model method return an awaitable """
+    @functools.wraps(fnc)
+    def wrapper(self, *args, **kwargs):
+        if getattr(_local, "blocking", False):
+            return fnc(self, *args, **kwargs)
+        return run_blocking(self._pump, fnc, self, *args, **kwargs)
+    return wrapper
+
+
+def async_model(model):
+    """ Makes a subclass of model with awaitable server methods """
+    attrs = dict(
+        (name, awaitable(getattr(model, name)))
+        for name in AWAITABLE_METHODS if hasattr(model, name)
+    )
+    attrs["__doc__"] = model.__doc__
+    return type(model)(model.__name__, (model,), attrs)
+
+
+ASYNC_MODELS = dict(
+    (model.__name__, async_model(model))
+    for model in (Note, Collection, Comment, Image, Video, Audio, Person, Place)
+)
+
+
+class AsyncItemIterator(object):
+    """ Asynchronous iterator over an :class:`ItemList <pypump.models.feed.ItemList>`,
+    each page is fetched on the pump's executor.
+    """
+
+    _end = object()
+
+    def __init__(self, items):
+        self.items = items
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        obj = await run_blocking(self.items.feed._pump, next, self.items, self._end)
+        if obj is self._end:
+            raise StopAsyncIteration
+        return obj
+
+
+class AsyncPyPump(object):
+    """ asyncio counterpart of :class:`PyPump <pypump.PyPump>`.
+
+    This takes the same arguments as PyPump (the OAuth handshake when it's
+    created is still blocking). All requests are run on an executor so they
+    don't block the event loop, :meth:`request` is a coroutine and the models
+    made by its factories (``Note``, ``Person``, ``Image``, ...) have awaitable
+    ``send()``, ``like()``, ``follow()``, etc. Feeds support ``async for``.
+    Objects which come from the server, f.ex. in a feed, are the wrapped
+    pump's ordinary models, their blocking methods can be run with :meth:`run`.
+
+    :param pump: (optional) an existing PyPump instance to wrap instead of
+      creating a new one.
+    :param executor: (optional) :class:`concurrent.futures.Executor` to run
+      requests on, defaults to the event loop's default executor.
+
+    Example:
+        >>> pump = AsyncPyPump(client=client, verifier_callback=callback)
+        >>> await pump.Note("Hello world!").send()
+        >>> async for activity in pump.me.inbox:
+        ...     print(activity)
+    """
+
+    pump_class = PyPump
+
+    def __init__(self, *args, **kwargs):
+        pump = kwargs.pop("pump", None)
+        self.executor = kwargs.pop("executor", None)
+
+        if pump is None:
+            pump = self.pump_class(*args, **kwargs)
+
+        self.pump = pump
+        self.pump._aio = self
+        self._me = None
+        self._populate_models()
+
+    def _populate_models(self):
+        # the wrapped pump keeps its own blocking models
+        for name, model in ASYNC_MODELS.items():
+            setattr(self, name, self.pump._model_factory(model))
+
+    @property
+    def me(self):
+        """ :class:`Person <pypump.models.person.Person>` of the logged in
+        user, with awaitable methods.
+        """
+        if self._me is None:
+            self._me = self.Person(self.pump.client.webfinger)
+        return self._me
+
+    async def request(self, *args, **kwargs):
+        """ Same as :meth:`PyPump.request <pypump.PyPump.request>` but
+        doesn't block the event loop.
+        """
+        return await run_blocking(self.pump, self.pump.request, *args, **kwargs)
+
+    async def people(self, webfingers, workers=10):
+        """ Same as :meth:`PyPump.people <pypump.PyPump.people>` but
+        doesn't block the event loop.
+        """
+        people = [self.Person(webfinger) for webfinger in webfingers]
+        semaphore = asyncio.Semaphore(workers)
+
+        async def load(person):
+            async with semaphore:
+                try:
+                    await person.load()
+                except Exception as e:
+                    _log.warning("Failed to load profile of %s: %s", person.webfinger, e)
+
+        await asyncio.gather(*[load(person) for person in people])
+        return people
+
+    async def send_many(self, items, concurrency=4):
+        """ Same as :meth:`PyPump.send_many <pypump.PyPump.send_many>` but
+        doesn't block the event loop.
+        """
+        items = list(items)
+        results = [None] * len(items)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send_chain(indexes):
+            async with semaphore:
+                for index in indexes:
+                    item = items[index]
+                    try:
+                        result = await run_blocking(self.pump, send_item, self.pump, item)
+                        results[index] = SendResult(item, result=result)
+                    except Exception as e:
+                        _log.warning("Failed to send %r: %s", item, e)
+                        results[index] = SendResult(item, error=e)
+
+        await asyncio.gather(*[send_chain(indexes) for indexes in chains(items).values()])
+        return results
+
+    async def run(self, fnc, *args, **kwargs):
+        """ Runs any other blocking PyPump call on the executor.
+
+        Example:
+            >>> me = await pump.run(lambda: pump.me)
+        """
+        return await run_blocking(self.pump, fnc, *args, **kwargs)
+
+    def __getattr__(self, key):
+        if key == "pump":
+            raise AttributeError(key)
+        return getattr(self.pump, key)
+
+    def __repr__(self):
+        return "<AsyncPyPump {0}>".format(self.pump.client)
@@ -0,0 +1,120 @@
+##
+#   Copyright (C) 2013 Jessica T. (Tsyesika) <xray7224@googlemail.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <http://www.gnu.org/licenses/>.
+##
+
+""" Sending many objects and activities at once """
+
+from __future__ import absolute_import
+
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from pypump.models import PumpObject
+
+_log = logging.getLogger(__name__)
+
+
+class SendResult(object):
+    """ What happened when sending an item with
+    :meth:`PyPump.send_many <pypump.PyPump.send_many>`.
+
+    :param item: the object, activity or callable which was sent.
+    :param result: what sending it returned.
+    :param error: the exception raised sending it, None if it was sent.
+    """
+
+    def __init__(self, item, result=None, error=None):
+        self.item = item
+        self.result = result
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return "<SendResult: {0!r} sent>".format(self.item)
+        return "<SendResult: {0!r} failed: {1}>".format(self.item, self.error)
+
+
+def chain_key(item):
+    """ Returns what item has to be sent in order with, items for the same
+    object are sent one after another.
+    """
+    if isinstance(item, PumpObject):
+        return id(item)
+
+    target = getattr(item, "__self__", None)
+    if isinstance(target, PumpObject):
+        # bound method, f.ex. note.like
+        return id(target)
+
+    if isinstance(item, dict):
+        obj = item.get("object")
+        if isinstance(obj, dict) and obj.get("id"):
+            return obj["id"]
+
+    return ("item", id(item))
+
+
+def chains(items):
+    """ Returns an OrderedDict of chain_key -> list of indexes of items
+    which have to be sent one after another.
+    """
+    result = OrderedDict()
+    for index, item in enumerate(items):
+        result.setdefault(chain_key(item), []).append(index)
+    return result
+
+
+def send_item(pump, item):
+    """ Sends a single item, see :meth:`PyPump.send_many <pypump.PyPump.send_many>` """
+    if isinstance(item, PumpObject):
+        item.send()
+        return item
+    elif isinstance(item, dict):
+        return pump.request(pump.feed_url, method="POST", data=item)
+    elif callable(item):
+        return item()
+
+    raise TypeError("Don't know how to send {0!r}".format(item))
+
+
+def send_many(pump, items, concurrency=4):
+    """ Sends items using up to concurrency threads and returns a list of
+    :class:`SendResult` in the same order as items.
+    """
+    items = list(items)
+    results = [None] * len(items)
+
+    def send_chain(indexes):
+        for index in indexes:
+            item = items[index]
+            try:
+                results[index] = SendResult(item, result=send_item(pump, item))
+            except Exception as e:
+                _log.warning("Failed to send %r: %s", item, e)
+                results[index] = SendResult(item, error=e)
+
+    item_chains = chains(items)
+    if item_chains:
+        workers = max(1, min(concurrency, len(item_chains)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(send_chain, item_chains.values()))
+
+    return results
@@ -0,0 +1,705 @@
+##
+#   Copyright (C) 2013 Jessica T. (Tsyesika) <xray7224@googlemail.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <http://www.gnu.org/licenses/>.
+##
+
+from __future__ import absolute_import
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from requests.structures import CaseInsensitiveDict
+
+from pypump import download
+from pypump.store import replace_file
+
+_log = logging.getLogger(__name__)
+
+
+class CacheEntry(object):
+    """ A cached response with what's needed to revalidate it """
+
+    def __init__(self, data, etag=None, last_modified=None, fetched=None):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched = time.time() if fetched is None else fetched
+
+    def age(self):
+        return time.time() - self.fetched
+
+    def to_dict(self):
+        return {
+            "data": self.data,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "fetched": self.fetched,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class ProfileCache(object):
+    """ Keeps the profiles of :class:`Person <pypump.models.person.Person>`
+    objects so they're only downloaded again once they're older than ttl, and
+    then only if they have changed (using ``If-None-Match`` and
+    ``If-Modified-Since``).
+
+    Any object with the same methods can be given to PyPump as
+    ``profile_cache``, see :class:`DiskProfileCache` for one which keeps
+    profiles between runs.
+
+    :param ttl: seconds a profile is used without asking the server.
+    :param size: maximum number of profiles kept in memory.
+
+    Example:
+        >>> pump = PyPump(client=client, profile_cache=ProfileCache(ttl=600))
+        >>> pump.Person("alice@example.org").display_name
+        >>> pump.profile_cache.hits, pump.profile_cache.misses
+        (0, 1)
+    """
+
+    def __init__(self, ttl=300, size=1000):
+        self.ttl = ttl
+        self.size = size
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """ Returns the CacheEntry for url or None """
+        with self._lock:
+            entry = self._entries.pop(url, None)
+            if entry is not None:
+                self._entries[url] = entry
+                return entry
+
+        entry = self._load(url)
+        if entry is not None:
+            self._remember(url, entry)
+        return entry
+
+    def set(self, url, data, etag=None, last_modified=None):
+        """ Caches profile data downloaded from url """
+        entry = CacheEntry(data, etag=etag, last_modified=last_modified)
+        self._remember(url, entry)
+        self._save(url, entry)
+        return entry
+
+    def refresh(self, url):
+        """ Marks the profile at url as just checked with the server """
+        entry = self.get(url)
+        if entry is not None:
+            entry.fetched = time.time()
+            self._save(url, entry)
+        return entry
+
+    def fetch(self, pump, url):
+        """ Returns the profile at url, from the cache if it's fresh
+        otherwise by (conditionally) requesting it with pump.
+        """
+        entry = self.get(url)
+        if entry is not None and entry.age() < self.ttl:
+            self._count("hits")
+            return entry.data
+
+        headers = {"Content-Type": "application/json"}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+
+        response = pump._make_request(url, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            _log.debug("Profile %s not modified", url)
+            self._count("revalidated")
+            return self.refresh(url).data
+
+        self._count("misses")
+        data = response.json()
+        self.set(
+            url,
+            data,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        return data
+
+    def clear(self):
+        """ Forgets all profiles """
+        with self._lock:
+            self._entries.clear()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _remember(self, url, entry):
+        with self._lock:
+            self._entries.pop(url, None)
+            self._entries[url] = entry
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def _load(self, url):
+        """ Loads entry for url from somewhere other than memory """
+        return None
+
+    def _save(self, url, entry):
+        """ Saves entry for url somewhere other than memory """
+        pass
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return "<{0} hits={1} misses={2} revalidated={3}>".format(
+            self.__class__.__name__, self.hits, self.misses, self.revalidated)
+
+
+class DiskProfileCache(ProfileCache):
+    """ :class:`ProfileCache` which also keeps profiles on disk in path,
+    one JSON file per profile.
+
+    :param path: directory to keep the profiles in, defaults to
+      ``$XDG_CACHE_HOME/PyPump/profiles``.
+    """
+
+    def __init__(self, path=None, *args, **kwargs):
+        super(DiskProfileCache, self).__init__(*args, **kwargs)
+        self.path = path or self.get_path()
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    @classmethod
+    def get_path(cls):
+        cache_home = os.environ.get("XDG_CACHE_HOME", "~/.cache")
+        cache_home = os.path.expanduser(cache_home)
+        return os.path.join(cache_home, "PyPump", "profiles")
+
+    def get_filename(self, url):
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, name + ".json")
+
+    def _load(self, url):
+        try:
+            with open(self.get_filename(url)) as fd:
+                return CacheEntry.from_dict(json.load(fd))
+        except (IOError, OSError, ValueError, TypeError):
+            return None
+
+    def _save(self, url, entry):
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry.to_dict(), f)
+            replace_file(tmp, self.get_filename(url))
+        except (IOError, OSError) as e:
+            _log.warning("Failed to write profile cache: %s", e)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def clear(self):
+        super(DiskProfileCache, self).clear()
+        for name in os.listdir(self.path):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.path, name))
+
+
+class CachedResponse(object):
+    """ A GET response kept by :class:`HTTPCache`, it can be used in place
+    of the :class:`requests.Response` it was made from.
+    """
+
+    status_code = 200
+    ok = True
+
+    def __init__(self, url, content, headers):
+        self.url = url
+        self.content = content
+        self.headers = CaseInsensitiveDict(headers)
+        self.fetched = time.time()
+
+    @property
+    def text(self):
+        if isinstance(self.content, bytes):
+            return self.content.decode("utf-8")
+        return self.content
+
+    def json(self):
+        # parsed every time as callers are free to change what they get
+        return json.loads(self.text)
+
+    @property
+    def size(self):
+        return len(self.content)
+
+    @property
+    def cache_control(self):
+        return parse_cache_control(self.headers.get("Cache-Control", ""))
+
+    def is_fresh(self):
+        """ Checks if the response can be used without asking the server """
+        cache_control = self.cache_control
+        if "no-cache" in cache_control:
+            return False
+        try:
+            max_age = int(cache_control.get("max-age", 0))
+        except ValueError:
+            return False
+        return time.time() - self.fetched < max_age
+
+    def validators(self):
+        """ Headers making a request conditional on this response """
+        headers = {}
+        if self.headers.get("ETag"):
+            headers["If-None-Match"] = self.headers["ETag"]
+        if self.headers.get("Last-Modified"):
+            headers["If-Modified-Since"] = self.headers["Last-Modified"]
+        return headers
+
+    def revalidated(self, headers):
+        """ Updates the response with headers from a 304 response """
+        for key in ["Cache-Control", "ETag", "Last-Modified", "Expires"]:
+            if key in headers:
+                self.headers[key] = headers[key]
+        self.fetched = time.time()
+
+
+def parse_cache_control(header):
+    """ Returns a dictionary of Cache-Control directives """
+    directives = {}
+    for directive in header.split(","):
+        name, _, value = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+
+class HTTPCache(object):
+    """ Keeps responses to GET requests made by :meth:`PyPump.request
+    <pypump.PyPump.request>`. Responses are used as they are while
+    ``Cache-Control: max-age`` says they're fresh, after that the server is
+    asked if they have changed (using ``ETag`` and ``Last-Modified``) and
+    the kept response is used if it hasn't.
+
+    Responses are kept per URL, query string and OAuth tokens, so the cache
+    can be shared by several users. Responses which ``Vary`` on request
+    headers (other than ``Accept-Encoding``, they're kept decoded) aren't
+    kept.
+
+    :param max_size: maximum number of bytes of responses kept, the least
+      recently used responses are dropped first.
+
+    Example:
+        >>> pump = PyPump(client=client, http_cache=HTTPCache())
+        >>> pump.me.inbox[:20]
+        >>> pump.me.inbox[:20]  # only downloaded again if it has changed
+    """
+
+    def __init__(self, max_size=10 * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(url, params=None, auth=None):
+        """ Returns the key responses for the request are kept under """
+        client = getattr(auth, "client", None)
+        params = params or {}
+        if hasattr(params, "items"):
+            params = params.items()
+
+        # values can be lists for repeated parameters
+        params = [(name, tuple(value) if isinstance(value, (list, tuple)) else value)
+                  for name, value in params]
+        return (
+            url,
+            tuple(sorted(params, key=lambda param: param[0])),
+            getattr(client, "client_key", None),
+            getattr(client, "resource_owner_key", None),
+        )
+
+    def get(self, key):
+        """ Returns the CachedResponse for key, fresh or not, or None """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def fresh(self, key):
+        """ Returns the CachedResponse for key if it's fresh or None """
+        entry = self.get(key)
+        if entry is None or not entry.is_fresh():
+            return None
+
+        _log.debug("Using cached response for %s", entry.url)
+        self._count("hits")
+        return entry
+
+    def update(self, key, response, cached=None):
+        """ Keeps response to the request for key, returns what should be
+        used as the response.
+        """
+        if response.status_code == 304 and cached is not None:
+            _log.debug("Cached response for %s not modified", cached.url)
+            cached.revalidated(response.headers)
+            self._count("revalidated")
+            return cached
+
+        if response.status_code == 200:
+            self._count("misses")
+            self.set(key, response)
+        return response
+
+    def set(self, key, response):
+        """ Keeps response under key if it's allowed to be cached """
+        headers = CaseInsensitiveDict(response.headers)
+        cache_control = parse_cache_control(headers.get("Cache-Control", ""))
+        if "no-store" in cache_control:
+            return None
+
+        if "max-age" not in cache_control and not (headers.get("ETag") or headers.get("Last-Modified")):
+            # we'd never be able to use it
+            return None
+
+        vary = [name.strip().lower() for name in headers.get("Vary", "").split(",")]
+        if [name for name in vary if name and name != "accept-encoding"]:
+            # the response depends on request headers which aren't in the key
+            return None
+
+        entry = CachedResponse(response.url, response.content, headers)
+        if entry.size > self.max_size:
+            return None
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+
+            self._entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_size:
+                key, old = self._entries.popitem(last=False)
+                self.size -= old.size
+        return entry
+
+    def clear(self):
+        """ Forgets all responses """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return "<HTTPCache {0} responses, {1} bytes>".format(len(self), self.size)
+
+
+class MediaCache(object):
+    """ Keeps images and other media downloaded with :meth:`download
+    <pypump.models.media.StreamContainer.download>` and :meth:`iter_content
+    <pypump.models.media.StreamContainer.iter_content>` on disk, so they're
+    only downloaded from the server once.
+
+    Files are kept by the SHA-256 of their content, so a file at several
+    URLs is only kept once. They're written to a temporary file and renamed
+    into place so other processes sharing the cache never see half a file,
+    and read with mmap.
+
+    :param path: directory to keep files in, defaults to
+      ``$XDG_CACHE_HOME/PyPump/media``.
+    :param max_size: maximum number of bytes kept, the least recently used
+      files are removed first.
+
+    Example:
+        >>> pump = PyPump(client=client, media_cache=MediaCache())
+        >>> image.thumbnail.download("/tmp/thumbnail.png")
+        >>> image.thumbnail.download("/tmp/thumbnail.png")  # from the cache
+    """
+
+    def __init__(self, path=None, max_size=512 * 1024 * 1024):
+        self.path = path or self.get_path()
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+
+        for directory in ["objects", "urls"]:
+            directory = os.path.join(self.path, directory)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self.size = sum(size for path, size, used in self._objects())
+
+    @classmethod
+    def get_path(cls):
+        cache_home = os.environ.get("XDG_CACHE_HOME", "~/.cache")
+        cache_home = os.path.expanduser(cache_home)
+        return os.path.join(cache_home, "PyPump", "media")
+
+    def _url_filename(self, url):
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, "urls", name)
+
+    def _object_filename(self, digest):
+        return os.path.join(self.path, "objects", digest[:2], digest)
+
+    def _objects(self):
+        """ Yields (path, size, last used) of every file kept """
+        objects = os.path.join(self.path, "objects")
+        for directory in os.listdir(objects):
+            directory = os.path.join(objects, directory)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # removed by another process
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _write(self, filename, data):
+        """ Writes the byte string data to filename atomically """
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fileobj:
+                fileobj.write(data)
+            replace_file(tmp, filename)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _tee(self, url, chunks, result=None):
+        """ Yields chunks while writing them to a temporary file. Once they've
+        all been read the file is kept for url and its path, or None if it's
+        bigger than the whole cache, is appended to result.
+        """
+        digest = hashlib.sha256()
+        length = 0
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fileobj:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    length += len(chunk)
+                    fileobj.write(chunk)
+                    yield chunk
+        except BaseException:
+            # includes the consumer stopping before the end
+            os.remove(tmp)
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+            raise
+
+        filename = self._keep(url, tmp, digest.hexdigest(), length)
+        if result is not None:
+            result.append(filename)
+
+    def _keep(self, url, tmp, digest, length):
+        """ Moves the file tmp into the cache for url, unless it doesn't fit """
+        if length > self.max_size:
+            _log.debug("%s is bigger than the media cache, not keeping it", url)
+            os.remove(tmp)
+            return None
+
+        filename = self._object_filename(digest)
+        if os.path.exists(filename):
+            added = 0
+        else:
+            added = length
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+        replace_file(tmp, filename)
+        self._write(self._url_filename(url), digest.encode("ascii"))
+
+        with self._lock:
+            self.size += added
+        self.evict(keep=filename)
+        return filename
+
+    def get(self, url):
+        """ Returns the path to the file kept for url, or None """
+        try:
+            with open(self._url_filename(url)) as fileobj:
+                digest = fileobj.read().strip()
+        except (IOError, OSError):
+            return None
+
+        filename = self._object_filename(digest)
+        try:
+            # mtime is when the file was last used
+            os.utime(filename, None)
+        except OSError:
+            # file was removed to make space
+            return None
+        return filename
+
+    def put(self, url, chunks):
+        """ Keeps the file made of the byte strings in chunks for url,
+        returns its path. Files bigger than max_size aren't kept, None is
+        returned for them.
+        """
+        result = []
+        for chunk in self._tee(url, chunks, result):
+            pass
+        return result[0]
+
+    def add(self, url, path, chunk_size=download.CHUNK_SIZE):
+        """ Keeps a copy of the file at path for url, returns the path to
+        the copy or None if it's bigger than max_size.
+        """
+        if self._too_big(os.path.getsize(path)):
+            return None
+        with open(path, "rb") as fileobj:
+            return self.put(url, iter(lambda: fileobj.read(chunk_size), b""))
+
+    def _too_big(self, length):
+        return length is not None and length > self.max_size
+
+    def fetch(self, pump, url, chunk_size=download.CHUNK_SIZE):
+        """ Returns the path to the file at url, downloading it with pump
+        if it isn't kept yet. Returns None if the file is bigger than
+        max_size, it's only downloaded if the server doesn't say how big
+        it is.
+        """
+        filename = self.get(url)
+        if filename is not None:
+            self._count("hits")
+            return filename
+
+        self._count("misses")
+        response, offset = download.get_response(pump, url)
+        if self._too_big(download.get_length(response, offset)):
+            response.close()
+            return None
+        return self.put(url, download.iter_body(response, offset, chunk_size=chunk_size))
+
+    def open(self, pump, url):
+        """ Returns a read-only mmap of the file at url, downloading it
+        with pump if it isn't kept yet. Files bigger than max_size are
+        downloaded to a temporary file which is mapped instead.
+        """
+        filename = self.fetch(pump, url)
+        if filename is not None:
+            fileobj = open(filename, "rb")
+        else:
+            fileobj = tempfile.TemporaryFile(dir=self.path)
+            for chunk in download.iter_response(pump, url):
+                fileobj.write(chunk)
+            fileobj.flush()
+
+        with fileobj:
+            if not os.fstat(fileobj.fileno()).st_size:
+                # empty files can't be mapped
+                return b""
+            return mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def iter_content(self, pump, url, chunk_size=download.CHUNK_SIZE, start=0):
+        """ Yields the file at url chunk_size bytes at a time from byte
+        start. If it isn't kept yet it's streamed from the server with pump
+        and kept as it's read, unless the download starts part way through
+        or the file is bigger than max_size.
+        """
+        filename = self.get(url)
+        if filename is None:
+            self._count("misses")
+            response, offset = download.get_response(pump, url, start)
+            chunks = download.iter_body(response, offset, chunk_size=chunk_size, start=start)
+            if not start and not self._too_big(download.get_length(response, offset)):
+                chunks = self._tee(url, chunks)
+            for chunk in chunks:
+                yield chunk
+            return
+
+        self._count("hits")
+        with open(filename, "rb") as fileobj:
+            if not os.fstat(fileobj.fileno()).st_size:
+                return
+            data = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for offset in range(start, len(data), chunk_size):
+                yield data[offset:offset + chunk_size]
+        finally:
+            data.close()
+
+    def evict(self, keep=None):
+        """ Removes the least recently used files until the cache is no
+        bigger than max_size. The file at path keep isn't removed.
+        """
+        if self.size <= self.max_size:
+            return
+
+        with self._lock:
+            objects = sorted(self._objects(), key=lambda obj: obj[2])
+            self.size = sum(size for path, size, used in objects)
+            for path, size, used in objects:
+                if self.size <= self.max_size:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                _log.debug("Removed %s from media cache", path)
+                self.size -= size
+
+    def clear(self):
+        """ Removes every file kept """
+        with self._lock:
+            for path, size, used in list(self._objects()):
+                os.remove(path)
+            urls = os.path.join(self.path, "urls")
+            for name in os.listdir(urls):
+                os.remove(os.path.join(urls, name))
+            self.size = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def __repr__(self):
+        return "<MediaCache {0} bytes in {1}>".format(self.size, self.path)
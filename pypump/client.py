@@ -20,8 +20,6 @@ from __future__ import absolute_import
 import json
 import logging
 
-import requests
-
 from pypump.exceptions import ClientException
 
 _log = logging.getLogger(__name__)
@@ -136,7 +134,8 @@ class Client(object):
             endpoint=self.ENDPOINT,
         )
 
-        response = self._pump._requester(requests.post, url, **request)
+        session = self._pump._get_session(url)
+        response = self._pump._requester(session.post, url, **request)
 
         try:
             server_data = response.json()
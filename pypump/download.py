@@ -0,0 +1,220 @@
+##
+#   Copyright (C) 2013 Jessica T. (Tsyesika) <xray7224@googlemail.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <http://www.gnu.org/licenses/>.
+##
+
+""" Streaming downloads of media files """
+
+from __future__ import absolute_import
+
+import logging
+import os
+import re
+
+from pypump.exceptions import PyPumpException
+
+_log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+PARTIAL_SUFFIX = ".part"
+
+
+def get_response(pump, url, start=0):
+    """ Requests url through the pump's authenticated session without
+    reading the body, from byte start if it's more than 0. Returns
+    (response, offset) where offset is the byte the body starts at, 0 if
+    the server ignored the range.
+    """
+    # a compressed body would be decoded as it's read, the lengths and
+    # ranges the server gives wouldn't match what we get
+    headers = {"Accept-Encoding": "identity"}
+    if start:
+        headers["Range"] = "bytes={0}-".format(start)
+
+    response = pump._make_request(url, raw=True, stream=True, headers=headers)
+    if response.status_code != 206:
+        return response, 0
+
+    match = re.match(r"bytes (\d+)-", response.headers.get("Content-Range", ""))
+    if match is None or int(match.group(1)) != start:
+        response.close()
+        raise PyPumpException("Server sent the wrong range of {0}".format(url))
+    return response, start
+
+
+def get_length(response, offset):
+    """ Returns the size of the whole file response is part of, or None """
+    match = re.match(r"bytes \d+-\d+/(\d+)", response.headers.get("Content-Range", ""))
+    if match is not None:
+        return int(match.group(1))
+
+    length = response.headers.get("Content-Length")
+    if length is not None and length.isdigit():
+        return offset + int(length)
+    return None
+
+
+def iter_content(pump, url, chunk_size=CHUNK_SIZE, start=0):
+    """ Returns an iterator of the file at url chunk_size bytes at a time,
+    from byte start. The file is read from the pump's media cache if it
+    has one.
+    """
+    if getattr(pump, "media_cache", None) is not None:
+        return pump.media_cache.iter_content(pump, url, chunk_size=chunk_size, start=start)
+    return iter_response(pump, url, chunk_size=chunk_size, start=start)
+
+
+def iter_response(pump, url, chunk_size=CHUNK_SIZE, start=0):
+    """ Returns an iterator of the file at url chunk_size bytes at a time,
+    from byte start, downloading it from the server.
+    """
+    response, offset = get_response(pump, url, start)
+    return iter_body(response, offset, chunk_size=chunk_size, start=start)
+
+
+def iter_body(response, offset, chunk_size=CHUNK_SIZE, start=0):
+    """ Yields the body of response, which starts at byte offset of the
+    file, from byte start chunk_size bytes at a time and closes it.
+    """
+    try:
+        for chunk in response.iter_content(chunk_size):
+            if offset < start:
+                # server sent the whole file
+                skip = min(start - offset, len(chunk))
+                offset += skip
+                chunk = chunk[skip:]
+            if chunk:
+                yield chunk
+    finally:
+        response.close()
+
+
+def preallocate(fileobj, length):
+    """ Makes fileobj length bytes long before it's written to so the file
+    isn't fragmented, on systems with posix_fallocate the space is
+    reserved on disk.
+    """
+    fileobj.flush()
+    fallocate = getattr(os, "posix_fallocate", None)
+    if fallocate is not None:
+        try:
+            fallocate(fileobj.fileno(), 0, length)
+            return
+        except OSError as e:
+            _log.debug("posix_fallocate failed, truncating instead: %s", e)
+    fileobj.truncate(length)
+
+
+def download(pump, url, to, chunk_size=CHUNK_SIZE, resume=True,
+             preallocate_file=False, progress=None):
+    """ Downloads the file at url to to, see
+    :meth:`StreamContainer.download <pypump.models.media.StreamContainer.download>`.
+    Returns the number of bytes written.
+
+    With a media cache, files it already has are copied from it and other
+    files downloaded to a path are kept in it once they're finished.
+    """
+    cache = getattr(pump, "media_cache", None)
+    if cache is not None and (hasattr(to, "write") or cache.get(url) is not None):
+        return copy_cached(pump, url, to, chunk_size=chunk_size,
+                           preallocate_file=preallocate_file, progress=progress)
+
+    if hasattr(to, "write"):
+        written = 0
+        response, offset = get_response(pump, url)
+        length = get_length(response, offset)
+        try:
+            for chunk in response.iter_content(chunk_size):
+                to.write(chunk)
+                written += len(chunk)
+                if progress is not None:
+                    progress(written, length)
+        finally:
+            response.close()
+        return written
+
+    partial = to + PARTIAL_SUFFIX
+    start = 0
+    if resume and os.path.exists(partial):
+        start = os.path.getsize(partial)
+
+    try:
+        response, offset = get_response(pump, url, start)
+    except PyPumpException:
+        if not start:
+            raise
+        # f.ex. 416 as the partial file is bigger than the file now is
+        _log.info("Can't resume download of %s, starting again", url)
+        response, offset = get_response(pump, url)
+
+    if start and offset != start:
+        _log.info("Server doesn't do ranges, downloading all of %s again", url)
+
+    length = get_length(response, offset)
+    written = offset
+    fileobj = open(partial, "r+b" if offset else "wb")
+    try:
+        if preallocate_file and length:
+            preallocate(fileobj, length)
+        fileobj.seek(offset)
+
+        for chunk in response.iter_content(chunk_size):
+            fileobj.write(chunk)
+            written += len(chunk)
+            if progress is not None:
+                progress(written, length)
+    finally:
+        response.close()
+        # anything after what was written is preallocated space, it has
+        # to go so the download can be resumed
+        fileobj.truncate(written)
+        fileobj.close()
+
+    if length is not None and written != length:
+        raise PyPumpException("Download of {0} stopped at byte {1} of {2}".format(url, written, length))
+
+    if os.path.exists(to):
+        os.remove(to)
+    os.rename(partial, to)
+    if cache is not None:
+        cache.add(url, to, chunk_size=chunk_size)
+    return written - offset
+
+
+def copy_cached(pump, url, to, chunk_size=CHUNK_SIZE, preallocate_file=False, progress=None):
+    """ Copies the file at url from the pump's media cache to to, which is
+    a path or file object. Returns the number of bytes written.
+    """
+    data = pump.media_cache.open(pump, url)
+    length = len(data)
+    fileobj = to if hasattr(to, "write") else open(to + PARTIAL_SUFFIX, "wb")
+    try:
+        if preallocate_file and length and fileobj is not to:
+            preallocate(fileobj, length)
+        for offset in range(0, length, chunk_size):
+            fileobj.write(data[offset:offset + chunk_size])
+            if progress is not None:
+                progress(min(offset + chunk_size, length), length)
+    finally:
+        if hasattr(data, "close"):
+            data.close()
+        if fileobj is not to:
+            fileobj.close()
+
+    if fileobj is not to:
+        if os.path.exists(to):
+            os.remove(to)
+        os.rename(to + PARTIAL_SUFFIX, to)
+    return length
@@ -18,16 +18,368 @@
 import logging
 import re
 import six
-import os
 import mimetypes
+import datetime
 
 from dateutil.parser import parse
+from dateutil.tz import tzutc, tzoffset
 
 from pypump.exceptions import PumpException
+from pypump.upload import UploadStream, ResumableUpload, RESUMABLE_CHUNK_SIZE
 
 _log = logging.getLogger(__name__)
 
+# pump.io sends dates as RFC 3339, f.ex. 2013-12-24T16:58:42Z
+_RFC3339 = re.compile(
+    r"^(\d{4})-(\d{2})-(\d{2})[Tt ](\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?"
+    r"(?:([Zz])|([+-])(\d{2}):?(\d{2}))?$"
+)
+_UTC = tzutc()
+_dates = {}
+DATE_CACHE_SIZE = 1024
 
+# mimetype of uploads we can't work out the type of
+DEFAULT_MIMETYPE = "application/octet-stream"
+
+
+def _parse_rfc3339(value):
+    match = _RFC3339.match(value)
+    if match is None:
+        return None
+
+    (year, month, day, hour, minute, second, fraction,
+     zulu, sign, tz_hour, tz_minute) = match.groups()
+
+    if zulu:
+        tz = _UTC
+    elif sign:
+        offset = int(tz_hour) * 3600 + int(tz_minute) * 60
+        tz = tzoffset(None, -offset if sign == "-" else offset)
+    else:
+        tz = None
+
+    microsecond = int(fraction[:6].ljust(6, "0")) if fraction else 0
+    try:
+        return datetime.datetime(int(year), int(month), int(day), int(hour),
+                                 int(minute), int(second), microsecond, tz)
+    except ValueError:
+        # f.ex. leap seconds, let dateutil deal with those
+        return None
+
+
+def parse_date(value):
+    """ Parses date string value into a datetime.
+
+    RFC 3339 dates (which is what pump.io sends) are parsed directly and
+    recently seen strings are remembered, anything else is handed to
+    :func:`dateutil.parser.parse`.
+    """
+    date = _dates.get(value)
+    if date is not None:
+        return date
+
+    date = _parse_rfc3339(value)
+    if date is None:
+        date = parse(value)
+
+    if len(_dates) >= DATE_CACHE_SIZE:
+        _dates.clear()
+    _dates[value] = date
+    return date
+
+
+class Mapper(object):
+
+    """ Handles mapping of json attributes to models """
+
+    # TODO probably better to move this into the models,
+    # {"json_attr":("model_attr", "datatype"), .. } or similar
+    literals = ["content", "display_name", "id", "object_type", "summary",
+                "url", "preferred_username", "verb", "username",
+                "total_items", "liked", "license", "embed_code"]
+    dates = ["updated", "published", "deleted", "received"]
+    objects = ["generator", "actor", "obj", "author", "in_reply_to",
+               "location"]
+    lists = ["_to", "_cc", "_bto", "_bcc", "object_types", "_items"]
+    feeds = ["_comments", "_followers", "_following", "_likes", "_shares"]
+
+    def __init__(self, pypump=None, *args, **kwargs):
+        self._pump = pypump
+
+    @classmethod
+    def get_handler(cls, key):
+        """ Returns name of the method which sets attribute key or None """
+        if key in cls.objects:
+            return "set_object"
+        elif key in cls.dates:
+            return "set_date"
+        elif key in cls.lists:
+            return "set_list"
+        elif key in cls.literals:
+            return "set_literal"
+        elif key in cls.feeds:
+            return "set_feed"
+        return None
+
+    @classmethod
+    def compile_map(cls, mapping):
+        """ Returns a tuple of (model_attr, json_attr, handler) for every
+        attribute in mapping which we know how to set.
+        """
+        table = []
+        for key, json_key in mapping.items():
+            handler = cls.get_handler(key)
+            if handler is None:
+                _log.debug("Ignoring unknown attribute %r", key)
+                continue
+            table.append((key, json_key, handler))
+        return tuple(table)
+
+    def parse_map(self, obj, mapping=None, *args, **kwargs):
+        """ Parses a dictionary of (model_attr, json_attr) items """
+        mapping = mapping or obj._mapping
+
+        if "data" in kwargs:
+            if mapping is obj._mapping:
+                # worked out when the model class was made
+                table = obj._attr_table
+            else:
+                table = self.compile_map(mapping)
+
+            data = kwargs["data"]
+            # objects shared through the identity map are updated with
+            # what's in data, anything missing is left as it is
+            merge = self.is_shared(obj)
+            for key, json_key, handler in table:
+                if merge and json_key not in data:
+                    continue
+                getattr(self, handler)(obj, key, data.get(json_key), True)
+        else:
+            for k, v in mapping.items():
+                if k in kwargs:
+                    self.add_attr(obj, k, kwargs[k])
+
+    def add_attr(self, obj, key, data, from_json=False):
+        handler = self.get_handler(key)
+        if handler is None:
+            _log.debug("Ignoring unknown attribute %r", key)
+        else:
+            getattr(self, handler)(obj, key, data, from_json)
+
+    def set_literal(self, obj, key, data, from_json):
+        if data is not None:
+            setattr(obj, key, data)
+        else:
+            setattr(obj, key, None)
+
+    def is_shared(self, obj):
+        """ Checks if obj is the instance kept in the pump's identity map """
+        objects = getattr(self._pump, "_objects", None)
+        if not objects:
+            return False
+        key = obj.__dict__.get("id")
+        return key is not None and objects.get(key) is obj
+
+    def get_object(self, data):
+        objects = getattr(self._pump, "_objects", None)
+        key = data.get("id")
+        if objects is None or key is None:
+            return self.make_object(data)
+
+        obj = objects.get(key)
+        if obj is not None and obj.object_type == data.get("objectType"):
+            _log.debug("Updating %r from identity map", obj)
+            return obj.unserialize(data)
+
+        obj = self.make_object(data)
+        objects[key] = obj
+        return obj
+
+    def make_object(self, data):
+        try:
+            # Look for suitable PyPump model based on objectType
+            obj_type = data.get("objectType").capitalize()
+            obj = getattr(self._pump, obj_type)
+            obj = obj().unserialize(data)
+            _log.debug("Created PyPump model %r", obj.__class__)
+            return obj
+        except AttributeError as e:
+            _log.debug("Exception: %s", e)
+            try:
+                import pypump.models.activity
+                # Look for suitable pumpobject model based on objectType
+                obj_type = data.get("objectType").capitalize()
+                obj = getattr(pypump.models.activity, obj_type)
+                obj = obj(pypump=self._pump).unserialize(data)
+                _log.debug("Created activity.* model: %r", obj.__class__)
+                return obj
+            except AttributeError as e:
+                # Fall back to PumpObject
+                _log.debug("Exception: %s", e)
+                obj = PumpObject(pypump=self._pump).unserialize(data)
+                _log.debug("Created PumpObject: %r", obj.object_type)
+                return obj
+
+    def is_lazy(self, obj, key, option):
+        """ Checks if attribute key on obj should be set lazily, option is
+        the name of the PyPump option which turns it on.
+        """
+        if not getattr(self._pump, option, False):
+            return False
+        return isinstance(getattr(type(obj), key, None), MappedAttribute)
+
+    def set_value(self, obj, key, lazy, fnc, *args):
+        """ Sets attribute key to fnc(*args), if lazy this is done by
+        MappedAttribute the first time the attribute is used.
+        """
+        if lazy:
+            obj.__dict__.pop(key, None)
+            obj._defer(key, fnc, *args)
+        else:
+            setattr(obj, key, fnc(*args))
+
+    def set_object(self, obj, key, data, from_json):
+        if from_json:
+            if data is not None:
+                lazy = self.is_lazy(obj, key, "lazy_objects")
+                self.set_value(obj, key, lazy, self.get_object, data)
+            else:
+                setattr(obj, key, None)
+
+    def set_date(self, obj, key, data, from_json):
+        if from_json:
+            if data is not None:
+                lazy = self.is_lazy(obj, key, "lazy_dates")
+                self.set_value(obj, key, lazy, parse_date, data)
+            else:
+                setattr(obj, key, None)
+
+    def get_list(self, data):
+        tmplist = []
+        for i in data:
+            if isinstance(i, six.string_types):
+                tmplist.append(i)
+            else:
+                tmplist.append(self.get_object(i))
+        return tmplist
+
+    def set_list(self, obj, key, data, from_json):
+        if from_json:
+            if data:
+                lazy = self.is_lazy(obj, key, "lazy_objects")
+                self.set_value(obj, key, lazy, self.get_list, data)
+            else:
+                setattr(obj, key, [])
+
+    def get_feed(self, data):
+        from pypump.models.feed import Feed
+        try:
+            return Feed(pypump=self._pump).unserialize(data)
+        except Exception as e:
+            _log.debug("Exception %s", e)
+
+    def set_feed(self, obj, key, data, from_json):
+        if from_json:
+            if data is not None:
+                feed = obj.__dict__.get(key)
+                if isinstance(feed, Feed) and feed.url == data.get("url") \
+                        and self.is_shared(obj):
+                    # keep the pages it has already fetched
+                    if feed.total_items != data.get("totalItems"):
+                        feed.clear_cache()
+                    feed.unserialize(data)
+                elif self.is_lazy(obj, key, "lazy_objects"):
+                    self.set_value(obj, key, True, self.get_feed, data)
+                else:
+                    feed = self.get_feed(data)
+                    if feed is not None:
+                        setattr(obj, key, feed)
+            else:
+                setattr(obj, key, [])
+
+
+class MappedAttribute(object):
+    """ Gives a mapped attribute its default value until it's set on the
+    instance, values deferred with PumpObject._defer are worked out here the
+    first time they're used.
+    """
+
+    def __init__(self, name, default=None):
+        self.name = name
+        self.default = default
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+
+        deferred = obj.__dict__.get("_deferred")
+        if deferred:
+            try:
+                fnc, args = deferred.pop(self.name)
+            except KeyError:
+                # another thread might just have worked it out
+                return obj.__dict__.get(self.name, self.default)
+
+            value = fnc(*args)
+            setattr(obj, self.name, value)
+            return value
+
+        return self.default
+
+
+class PumpObjectType(type):
+    """ Metaclass for PumpObject models.
+
+    Works out a model's attribute mapping once when the class is made instead
+    of every time an object is made: the class' ``_mapping`` is combined with
+    PumpObject's, ``_ignore_attr`` is removed and ``_attr_table`` holds the
+    Mapper method used for each attribute.
+    """
+
+    def __init__(cls, name, bases, attrs):
+        super(PumpObjectType, cls).__init__(name, bases, attrs)
+
+        if "_mapping" in attrs:
+            cls._declared_mapping = attrs["_mapping"]
+
+        # combine mapping of cls and PumpObject
+        root = [k for k in cls.__mro__ if "_declared_mapping" in k.__dict__][-1]
+        mapping = root._declared_mapping.copy()
+        mapping.update(cls._declared_mapping)
+
+        # remove unwanted attributes from mapping
+        for i in cls._ignore_attr:
+            if mapping.get(i):
+                del mapping[i]
+
+        cls._mapping = mapping
+        cls._attr_table = Mapper.compile_map(mapping)
+
+        # add any missing attributes
+        for key in mapping:
+            if key == "links":
+                continue
+
+            default = cls._class_attr(key)
+            if hasattr(type(default), "__get__"):
+                # don't hide properties and methods
+                continue
+            setattr(cls, key, MappedAttribute(key, default))
+
+    def _class_attr(cls, key):
+        """ Value of attribute key on the class, the default is used for
+        attributes which already are a MappedAttribute.
+        """
+        for klass in cls.__mro__:
+            value = klass.__dict__.get(key)
+            if isinstance(value, MappedAttribute):
+                value = value.default
+            if value is not None:
+                return value
+        return None
+
+
+@six.add_metaclass(PumpObjectType)
 class PumpObject(object):
 
     _ignore_attr = list()
@@ -67,20 +419,11 @@ class PumpObject(object):
         if pypump:
             self._pump = pypump
 
-        # combine mapping of self and PumpObject
-        mapping = PumpObject._mapping.copy()
-        mapping.update(self._mapping)
-        self._mapping = mapping
-
-        # remove unwanted attributes from mapping
-        for i in self._ignore_attr:
-            if self._mapping.get(i):
-                del self._mapping[i]
-
-        # add any missing attributes
-        for key in self._mapping.keys():
-            if not hasattr(self, key):
-                setattr(self, key, None)
+    def _defer(self, key, fnc, *args):
+        """ Sets attribute key to fnc(*args) the first time it's used """
+        if "_deferred" not in self.__dict__:
+            self._deferred = {}
+        self._deferred[key] = (fnc, args)
 
     def _verb(self, verb):
         """ Posts minimal activity with verb and bare self object.
@@ -100,13 +443,7 @@ class PumpObject(object):
     def _post_activity(self, activity, unserialize=True):
         """ Posts a activity to feed """
         # I think we always want to post to feed
-        feed_url = "{proto}://{server}/api/user/{username}/feed".format(
-            proto=self._pump.protocol,
-            server=self._pump.client.server,
-            username=self._pump.client.nickname
-        )
-
-        data = self._pump.request(feed_url, method="POST", data=activity)
+        data = self._pump.request(self._pump.feed_url, method="POST", data=activity)
 
         if not data:
             return False
@@ -191,122 +528,6 @@ class PumpObject(object):
         return self
 
 
-class Mapper(object):
-
-    """ Handles mapping of json attributes to models """
-
-    # TODO probably better to move this into the models,
-    # {"json_attr":("model_attr", "datatype"), .. } or similar
-    literals = ["content", "display_name", "id", "object_type", "summary",
-                "url", "preferred_username", "verb", "username",
-                "total_items", "liked", "license", "embed_code"]
-    dates = ["updated", "published", "deleted", "received"]
-    objects = ["generator", "actor", "obj", "author", "in_reply_to",
-               "location"]
-    lists = ["_to", "_cc", "_bto", "_bcc", "object_types", "_items"]
-    feeds = ["_comments", "_followers", "_following", "_likes", "_shares"]
-
-    def __init__(self, pypump=None, *args, **kwargs):
-        self._pump = pypump
-
-    def parse_map(self, obj, mapping=None, *args, **kwargs):
-        """ Parses a dictionary of (model_attr, json_attr) items """
-        mapping = mapping or obj._mapping
-
-        if "data" in kwargs:
-            for k, v in mapping.items():
-                if kwargs["data"].get(v, None) is not None:
-                    val = kwargs["data"][v]
-                else:
-                    val = None
-                self.add_attr(obj, k, val, from_json=True)
-        else:
-            for k, v in mapping.items():
-                if k in kwargs:
-                    self.add_attr(obj, k, kwargs[k])
-
-    def add_attr(self, obj, key, data, from_json=False):
-        if key in self.objects:
-            self.set_object(obj, key, data, from_json)
-        elif key in self.dates:
-            self.set_date(obj, key, data, from_json)
-        elif key in self.lists:
-            self.set_list(obj, key, data, from_json)
-        elif key in self.literals:
-            self.set_literal(obj, key, data, from_json)
-        elif key in self.feeds:
-            self.set_feed(obj, key, data, from_json)
-        else:
-            _log.debug("Ignoring unknown attribute %r", key)
-
-    def set_literal(self, obj, key, data, from_json):
-        if data is not None:
-            setattr(obj, key, data)
-        else:
-            setattr(obj, key, None)
-
-    def get_object(self, data):
-        try:
-            # Look for suitable PyPump model based on objectType
-            obj_type = data.get("objectType").capitalize()
-            obj = getattr(self._pump, obj_type)
-            obj = obj().unserialize(data)
-            _log.debug("Created PyPump model %r" % obj.__class__)
-            return obj
-        except AttributeError as e:
-            _log.debug("Exception: %s" % e)
-            try:
-                import pypump.models.activity
-                # Look for suitable pumpobject model based on objectType
-                obj_type = data.get("objectType").capitalize()
-                obj = getattr(pypump.models.activity, obj_type)
-                obj = obj(pypump=self._pump).unserialize(data)
-                _log.debug("Created activity.* model: %r" % obj.__class__)
-                return obj
-            except AttributeError as e:
-                # Fall back to PumpObject
-                _log.debug("Exception: %s" % e)
-                obj = PumpObject(pypump=self._pump).unserialize(data)
-                _log.debug("Created PumpObject: %r" % obj.object_type)
-                return obj
-
-    def set_object(self, obj, key, data, from_json):
-        if from_json:
-            if data is not None:
-                setattr(obj, key, self.get_object(data))
-            else:
-                setattr(obj, key, None)
-
-    def set_date(self, obj, key, data, from_json):
-        if from_json:
-            if data is not None:
-                setattr(obj, key, parse(data))
-            else:
-                setattr(obj, key, None)
-
-    def set_list(self, obj, key, data, from_json):
-        if from_json:
-            tmplist = []
-            if data is not None:
-                for i in data:
-                    if isinstance(i, six.string_types):
-                        tmplist.append(i)
-                    else:
-                        tmplist.append(self.get_object(i))
-            setattr(obj, key, tmplist)
-
-    def set_feed(self, obj, key, data, from_json):
-        from pypump.models.feed import Feed
-        if from_json:
-            if data is not None:
-                try:
-                    setattr(obj, key, Feed(pypump=self._pump).unserialize(data))
-                except Exception as e:
-                    _log.debug("Exception %s" % e)
-            else:
-                setattr(obj, key, [])
-
-
 from pypump.models.feed import Feed
 
 
@@ -601,52 +822,122 @@ class Postable(Addressable):
 class Uploadable(Addressable):
     """ Adds .from_file() """
 
-    def from_file(self, filename):
-        """ Uploads a file from a filename on your system.
+    def from_file(self, filename, progress=None, resumable=False,
+                  chunk_size=RESUMABLE_CHUNK_SIZE):
+        """ Uploads a file from a filename on your system. The file is
+        streamed so it doesn't have to fit in memory.
 
         :param filename: Path to file on your system.
+        :param progress: (optional) callable which is called with
+          (bytes sent, total bytes) as the file is uploaded.
+        :param resumable: (optional) upload the file in chunks of
+          chunk_size bytes, if the upload is interrupted uploading the file
+          again carries on where it got to. Servers which don't do
+          resumable uploads get the whole file in one request, see
+          :class:`ResumableUpload <pypump.upload.ResumableUpload>`.
 
         Example:
             >>> myimage.from_file('/path/to/dinner.png')
+            >>> myvideo.from_file('/path/to/holiday.webm', resumable=True)
         """
+        mimetype = mimetypes.guess_type(filename)[0] or DEFAULT_MIMETYPE
+        if resumable:
+            upload = ResumableUpload(
+                self._pump,
+                "/api/user/{0}/uploads".format(self._pump.client.nickname),
+                filename,
+                mimetype,
+                chunk_size=chunk_size,
+                progress=progress,
+            )
+            file_data = upload.run()
+            if file_data is not None:
+                self._post_upload(file_data)
+                return self
+
+        with open(filename, "rb") as fileobj:
+            return self.from_stream(fileobj, mimetype, progress=progress)
+
+    def from_stream(self, source, mimetype, length=None, progress=None):
+        """ Uploads data from source, which can be an open binary file,
+        bytes, bytearray or memoryview (which aren't copied) or an iterable
+        of bytes.
+
+        :param source: data to upload.
+        :param mimetype: mimetype of the data, f.ex. ``"image/png"``.
+        :param length: (optional) size of the data in bytes, needed for
+          iterables if the server doesn't accept chunked uploads.
+        :param progress: (optional) callable which is called with
+          (bytes sent, total bytes) as the data is uploaded.
 
-        mimetype = mimetypes.guess_type(filename)[0] or "application/octal-stream"
-        headers = {
-            "Content-Type": mimetype,
-            "Content-Length": str(os.path.getsize(filename)),
-        }
+        Example:
+            >>> myimage.from_stream(png_bytes, "image/png")
+        """
+        file_data = self._upload(source, mimetype, length=length, progress=progress)
+        self._post_upload(file_data)
+        return self
+
+    def _upload(self, source, mimetype, length=None, progress=None):
+        """ Uploads source and returns the object the server made for it """
+        stream = UploadStream(source, length=length, progress=progress)
+        headers = {"Content-Type": mimetype}
+        if stream.length is not None:
+            headers["Content-Length"] = str(stream.length)
 
-        # upload file
-        file_data = self._pump.request(
+        return self._pump.request(
             "/api/user/{0}/uploads".format(self._pump.client.nickname),
             method="POST",
-            data=open(filename, "rb").read(),
+            data=stream,
             headers=headers,
         )
 
-        # now post it to the feed
+    def _post_upload(self, file_data):
+        """ Posts the uploaded file_data to the feed. display_name, content
+        and license are sent with the post, if the server doesn't take them
+        from there they're sent again in an update. Returns True if the
+        update was needed.
+        """
+        metadata = self._post_file(file_data)
+        if not metadata:
+            return False
+
+        self._update_upload(file_data, metadata)
+        return True
+
+    def _post_file(self, file_data):
+        """ Posts the uploaded file_data to the feed with display_name,
+        content and license. Returns them as {key: (json key, value)} if
+        the server didn't take them from the post, otherwise {}.
+        """
+        metadata = {}
+        for key, json_key in [("display_name", "displayName"),
+                              ("content", "content"),
+                              ("license", "license")]:
+            if getattr(self, key):
+                metadata[key] = (json_key, getattr(self, key))
+
         data = {
             "verb": "post",
-            "object": file_data,
+            "object": dict(file_data, **dict(metadata.values())),
         }
         data.update(self.serialize())
+        self._post_activity(data)
 
-        if not self.content and not self.display_name and not self.license:
-            self._post_activity(data)
-        else:
-            self._post_activity(data, unserialize=False)
-
-            # update post with display_name and content
-            if self.content:
-                file_data['content'] = self.content
-            if self.display_name:
-                file_data['displayName'] = self.display_name
-            if self.license:
-                file_data['license'] = self.license
-            data = {
-                "verb": "update",
-                "object": file_data,
-            }
-            self._post_activity(data)
+        missing = [key for key, (json_key, value) in metadata.items()
+                   if getattr(self, key) != value]
+        if not missing:
+            return {}
+        return metadata
 
-        return self
+    def _update_upload(self, file_data, metadata):
+        """ Updates the post of file_data with the metadata returned by
+        :meth:`_post_file`.
+        """
+        for key, (json_key, value) in metadata.items():
+            setattr(self, key, value)
+            file_data[json_key] = value
+        data = {
+            "verb": "update",
+            "object": file_data,
+        }
+        self._post_activity(data)
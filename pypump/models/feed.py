@@ -15,9 +15,17 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 ##
 
+import itertools
 import logging
+import threading
+import time
+import weakref
 
+from collections import deque, OrderedDict
+
+import requests
 import six
+from six.moves import queue
 
 from pypump.exceptions import PyPumpException
 from pypump.models import PumpObject, Mapper
@@ -35,14 +43,19 @@ class ItemList(object):
     :param since: PumpObject: Return objects newer than this
     :param before: PumpObject: Return objects older than this
     :param cached: bool: Return objects from feed._items instead of API
+    :param prefetch: int: Number of pages to fetch ahead on a background thread
     :raises PyPumpException: if offset is given as well as before/since
     :raises PyPumpException: if both before since are given
     """
 
     _done = False
+    _prefetcher = None
+    _index_cache = None
 
-    def __init__(self, feed, offset=None, stop=None, limit=None, since=None, before=None, cached=False):
-        self.cache = []
+    def __init__(self, feed, offset=None, stop=None, limit=None, since=None, before=None, cached=False,
+                 prefetch=0):
+        # iterator over the current page, cached items aren't copied
+        self.cache = iter(())
         self.feed = feed
         self.url = self.feed.url
         self.itemcount = 0
@@ -71,6 +84,7 @@ class ItemList(object):
             self._before = self.get_obj_id(before)
 
         self._cached = cached
+        self._prefetch = prefetch
 
         if self._offset and (self._since or self._before):
             raise PyPumpException("can not have both offset and since/before parameters")
@@ -88,24 +102,63 @@ class ItemList(object):
             elif hasattr(item, 'id'):
                 return item.id
 
-    def get_page(self, url):
-        """ Get a page of items from API """
-        if url:
-            data = self.feed._request(url, offset=self._offset, since=self._since, before=self._before)
-
-            # set values to False to avoid using them for next request
-            self._before = False if self._before is not None else None
-            self._since = False if self._since is not None else None
-            if getattr(self.feed, 'issue65', False):
-                self._offset = False
-            if self._since is not None:
-                # we want oldest items first when using 'since'
-                return reversed(data['items'])
-            else:
-                return data['items']
+    def _cursor(self):
+        """ Where the next page is, as (url, offset, since, before) """
+        return self.url, self._offset, self._since, self._before
+
+    def _request_page(self, cursor):
+        """ Get the page at cursor from API, or None if there isn't one.
+
+        Nothing is changed, only the data is returned, so this can be
+        used from another thread.
+        """
+        url, offset, since, before = cursor
+        if not url:
+            return None
+        return self.feed._fetch(url, offset=offset, since=since, before=before)
+
+    def _next_cursor(self, cursor, data):
+        """ Work out where the page after data (fetched at cursor) is """
+        url, offset, since, before = cursor
+
+        # set values to False to avoid using them for next request
+        before = False if before is not None else None
+        since = False if since is not None else None
+
+        links = data.get("links") or {}
+        if getattr(self.feed, 'issue65', False):
+            # work around API bug for favorites feed, see https://github.com/xray7224/PyPump/issues/65
+            offset = (offset or 0) + 20
+        elif since is not None:
+            url = self._get_link(links, "prev") or url
         else:
+            url = self._get_link(links, "next")
+
+        return url, offset, since, before
+
+    def _get_link(self, links, name):
+        link = links.get(name)
+        if isinstance(link, dict):
+            return link.get("href")
+        return link
+
+    def _use_page(self, cursor, data):
+        """ Make objects out of the page fetched at cursor and move on to
+        the page after it.
+        """
+        if data is None:
+            self.url = None
             return []
 
+        self.feed.unserialize(data)
+        self.url, self._offset, self._since, self._before = self._next_cursor(cursor, data)
+
+        page = self.feed._get_objects(data["items"])
+        if cursor[2] is not None:
+            # we want oldest items first when using 'since'
+            page.reverse()
+        return page
+
     def get_cached(self):
         """ Get items from feed cache while trying to emulate
         how API handles offset/since/before parameters
@@ -153,8 +206,11 @@ class ItemList(object):
             self.usedcache = True  # invalidate cache
 
             if isinstance(self._offset, int):
-                # return list based on offset
-                return self.feed._items[self._offset:]
+                # return items based on offset, without copying the list
+                offset = self._offset
+                if offset < 0:
+                    offset = max(len(self.feed._items) + offset, 0)
+                return itertools.islice(self.feed._items, offset, None)
 
             return self.feed._items
         else:
@@ -174,42 +230,24 @@ class ItemList(object):
         return self._done
 
     def _build_cache(self):
-        """ Build a list of objects from feed's cached items or API page"""
-        self.cache = []
-        if self.done:
-            return
-
-        for i in (self.get_cached() if self._cached else self.get_page(self.url)):
-            if not self._cached:
-                # some objects don't have objectType set (inbox activities)
-                if not i.get("objectType"):
-                    i["objectType"] = self.feed.object_types[0]
-                obj = Mapper(pypump=self.feed._pump).get_object(i)
-
-            else:
-                obj = i
-            self.cache.append(obj)
+        """ Iterate the next API page or the feed's cached items """
+        if self._cached:
+            self.cache = iter(self.get_cached())
+        elif self._prefetch:
+            if self._prefetcher is None:
+                self._prefetcher = Prefetcher(self, self._prefetch)
+            self.cache = iter(self._use_page(*self._prefetcher.get()))
+        else:
+            cursor = self._cursor()
+            self.cache = iter(self._use_page(cursor, self._request_page(cursor)))
 
-        # ran out of items
-        if len(self.cache) <= 0:
-            self._done = True
+    def close(self):
+        """ Stop fetching pages in the background """
+        if self._prefetcher is not None:
+            self._prefetcher.close()
 
-        # check what to do next time
-        if getattr(self.feed, 'issue65', False):
-            # work around API bug for favorites feed, see https://github.com/xray7224/PyPump/issues/65
-            if self._offset is None:
-                self._offset = 0
-            self._offset += 20
-        elif self._since is not None:
-            if self.feed.links.get('prev'):
-                self.url = self.feed.links['prev']
-                del self.feed.links['prev']  # avoid using it again
-        else:
-            if self.feed.links.get('next'):
-                self.url = self.feed.links['next']
-                del self.feed.links['next']  # avoid using it again
-            else:
-                self.url = None
+    def __del__(self):
+        self.close()
 
     def __getitem__(self, key):
         """
@@ -223,35 +261,37 @@ class ItemList(object):
         if type(key) is not int:
             raise TypeError('index must be integer')
 
-        total = self._limit or self.feed.total_items
-        if key > total or key < -total:
-            raise IndexError("ItemList index out of range")
-
         if self._since or self._before:
-            # we can't combine since/before and offset, so grab all results up to the one we want
-            if key < 0:
-                key = key + total
-            items = ItemList(self.feed, before=self._before, since=self._since, limit=key + 1, cached=self.feed.is_cached)
-            items = list(items)
-
-            # last item fetched will be the one for us
-            return items[-1]
-        else:
-            if self._offset:
-                # shift key by current offset
-                if key >= 0:
-                    key = self._offset + key
-                else:
-                    key = key + total + self._offset
-            elif key < 0:
-                key = key + total
+            # we can't combine since/before and offset, so keep the items
+            # we've walked through for later lookups
+            if self._index_cache is None:
+                self._index_cache = []
+                self._index_iter = ItemList(self.feed, before=self._before, since=self._since,
+                                            limit=self._limit, cached=self.feed.is_cached)
+
+            while key < 0 or len(self._index_cache) <= key:
+                try:
+                    self._index_cache.append(next(self._index_iter))
+                except StopIteration:
+                    break
 
-            item = ItemList(self.feed, limit=1, offset=key, stop=key + 1, cached=self.feed.is_cached)
             try:
-                return item.next()
-            except StopIteration:
+                return self._index_cache[key]
+            except IndexError:
                 raise IndexError("ItemList index out of range")
 
+        total = len(self)
+        if key < 0:
+            key = key + total
+        if key < 0 or key >= total:
+            raise IndexError("ItemList index out of range")
+
+        offset = self._offset or 0
+        if offset < 0:
+            offset = max(self.feed._get_total() + offset, 0)
+
+        return self.feed._get_index(offset + key)
+
     def _getslice(self, s):
         if not isinstance(s.start, (type(None), int)) or not isinstance(s.stop, (type(None), int)):
             raise TypeError('slice indices must be integers or None')
@@ -281,17 +321,46 @@ class ItemList(object):
         return ItemList(self.feed, offset=offset, stop=stop, cached=self.feed.is_cached)
 
     def __len__(self):
-        return len([item for item in self])
+        """ Number of items in the list, worked out from the feed's
+        ``totalItems`` so no more than one request is needed. If we can't
+        (since/before was given or the server didn't send the total) the
+        items get counted.
+        """
+        if self._since or self._before:
+            # we don't know where in the feed the id is
+            return self._count()
+
+        total = self.feed._get_total()
+        if total is None:
+            return self._count()
+
+        offset = self._offset or 0
+        if offset < 0:
+            offset = max(total + offset, 0)
+
+        length = max(total - offset, 0)
+        if self._limit is not None:
+            length = min(length, self._limit)
+        return length
+
+    def _count(self):
+        """ Count the items by walking the list """
+        return sum(1 for item in self)
 
     def __next__(self):
         """ Return next object or raise StopIteration """
-        if len(self.cache) <= 0:
-            self._build_cache()
-
-        if self.done:
+        obj = None
+        if not self.done:
+            obj = next(self.cache, None)
+            if obj is None:
+                self._build_cache()
+                obj = next(self.cache, None)
+
+        if obj is None:
+            # ran out of items
+            self._done = True
+            self.close()
             raise StopIteration
-        else:
-            obj = self.cache.pop(0)
 
         self.itemcount += 1
         return obj
@@ -305,12 +374,103 @@ class ItemList(object):
                         offset=self._offset,
                         before=self._before,
                         since=self._since,
-                        cached=self.feed.is_cached
+                        cached=self.feed.is_cached,
+                        prefetch=self._prefetch
                         )
 
     def __iter__(self):
         return self.clone()
 
+    def __aiter__(self):
+        """ Iterate with ``async for``, pages are fetched without blocking the event loop """
+        from pypump.aio import AsyncItemIterator
+        return AsyncItemIterator(self.clone())
+
+
+class Prefetcher(object):
+    """ Fetches pages for an :class:`ItemList` on a background thread.
+
+    At most ``pages`` pages are held waiting to be consumed. The thread
+    only fetches the pages, the ItemList makes objects out of them and
+    updates itself and the feed on the thread using it. The thread only
+    keeps a weak reference to the ItemList between pages so it stops
+    when the ItemList is closed, finishes or is garbage collected.
+
+    :param items: ItemList to fetch pages for.
+    :param pages: int: Number of pages to fetch ahead.
+    """
+
+    def __init__(self, items, pages):
+        self._queue = queue.Queue(maxsize=pages)
+        self._stop = threading.Event()
+
+        self._thread = threading.Thread(target=self._run, args=(weakref.ref(items), items._cursor()))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, ref, cursor):
+        fetched = 0
+        while not self._stop.is_set():
+            items = ref()
+            if items is None:
+                # ItemList has been abandoned
+                return
+
+            try:
+                data = items._request_page(cursor)
+            except Exception as e:
+                self._put((None, e))
+                return
+
+            limit = items._limit
+            if data is not None:
+                next_cursor = items._next_cursor(cursor, data)
+            del items
+
+            if not self._put(((cursor, data), None)):
+                return
+
+            if data is None or not data["items"]:
+                return
+
+            fetched += len(data["items"])
+            if limit is not None and fetched >= limit:
+                # let the ItemList know there are no more pages
+                self._put(((None, None), None))
+                return
+
+            cursor = next_cursor
+
+    def _put(self, entry):
+        """ Waits for room in the queue, gives up if we've been stopped """
+        while not self._stop.is_set():
+            try:
+                self._queue.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self):
+        """ Returns the next page as (cursor, data), waiting for it if
+        needed. data is None when there are no more pages.
+        """
+        while True:
+            try:
+                page, error = self._queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if not self._thread.is_alive() and self._queue.empty():
+                    return None, None
+
+        if error is not None:
+            self.close()
+            raise error
+        return page
+
+    def close(self):
+        self._stop.set()
+
 
 class Feed(PumpObject):
     """ This object represents a basic pump.io **feed**, which is used for
@@ -324,6 +484,19 @@ class Feed(PumpObject):
         "total_items": "totalItems",
     }
 
+    # items per page when looking up items by index
+    page_size = 20
+    # maximum number of those pages to keep
+    page_cache_size = 50
+    # seconds a kept page is used for before it's fetched again
+    page_cache_ttl = 60
+    _pages = None
+
+    # number of item ids remembered by poll() to skip items seen twice
+    poll_seen_size = 1000
+    _poll_cursor = None
+    _poll_seen = None
+
     def __init__(self, url=None, *args, **kwargs):
         super(Feed, self).__init__(*args, **kwargs)
         self.url = url or None
@@ -332,25 +505,36 @@ class Feed(PumpObject):
     def is_cached(self):
         return self._items is not None and self.total_items is not None and len(self._items) >= self.total_items
 
-    def items(self, offset=None, limit=20, since=None, before=None, *args, **kwargs):
+    def items(self, offset=None, limit=20, since=None, before=None, prefetch=0, *args, **kwargs):
         """ Get a feed's items.
 
         :param offset: Amount of items to skip before returning data
         :param since:  Return items added after this id (ordered old -> new)
         :param before: Return items added before this id (ordered new -> old)
         :param limit: Amount of items to return
+        :param prefetch: Amount of pages to download in the background while
+            the current one is being used
+
+        Example:
+            >>> for activity in pump.me.inbox.items(limit=None, prefetch=2):
+            ...     print(activity)
         """
-        return ItemList(self, offset=offset, limit=limit, since=since, before=before, cached=self.is_cached)
+        return ItemList(self, offset=offset, limit=limit, since=since, before=before, cached=self.is_cached,
+                        prefetch=prefetch)
 
-    def _request(self, url, offset=None, since=None, before=None):
+    def _request(self, url, offset=None, since=None, before=None, count=None):
+        data = self._fetch(url, offset=offset, since=since, before=before, count=count)
+        self.unserialize(data)
+        return data
+
+    def _fetch(self, url, offset=None, since=None, before=None, count=None):
+        """ Gets a page of the feed from the API without changing the feed """
         params = dict()
-        for i in ["offset", "since", "before"]:
+        for i in ["offset", "since", "before", "count"]:
             if eval(i):
                 params[i] = eval(i)
-        _log.debug("Feed._request: url: %s, params: %s", url, params)
-        data = self._pump.request(url, params=params)
-        self.unserialize(data)
-        return data
+        _log.debug("Feed._fetch: url: %s, params: %s", url, params)
+        return self._pump.request(url, params=params)
 
     def unserialize(self, data):
         Mapper(pypump=self._pump).parse_map(self, data=data)
@@ -358,6 +542,170 @@ class Feed(PumpObject):
         self.url = data.get('pump_io', {}).get('proxyURL') or self.url
         return self
 
+    def _get_objects(self, items):
+        """ Makes PyPump objects out of a list of items from the API """
+        objects = []
+        for i in items:
+            # some objects don't have objectType set (inbox activities)
+            if not i.get("objectType"):
+                i["objectType"] = self.object_types[0]
+            objects.append(Mapper(pypump=self._pump).get_object(i))
+        return objects
+
+    def _get_page_at(self, offset):
+        """ Returns the page of items starting at offset, pages are
+        kept for page_cache_ttl seconds so looking up items on the same
+        page doesn't make a request.
+
+        The feed itself isn't changed so this can't get in the way of
+        iterating it.
+        """
+        if self._pages is None:
+            self._pages = OrderedDict()
+
+        now = time.time()
+        fetched, page = self._pages.pop(offset, (None, None))
+        if page is None or now - fetched > self.page_cache_ttl:
+            data = self._fetch(self.url, offset=offset, count=self.page_size)
+            fetched, page = now, self._get_objects(data["items"])
+
+            while len(self._pages) >= self.page_cache_size:
+                self._pages.popitem(last=False)
+
+        # (re)insert so least recently used pages get dropped first
+        self._pages[offset] = (fetched, page)
+        return page
+
+    def _get_index(self, index):
+        """ Returns the item at (non negative) index in the feed """
+        if self.is_cached:
+            return self._items[index]
+
+        offset = index - index % self.page_size
+        page = self._get_page_at(offset)
+        try:
+            return page[index - offset]
+        except IndexError:
+            raise IndexError("Feed index out of range")
+
+    def clear_cache(self):
+        """ Forget the pages kept for looking up items by index """
+        self._pages = None
+
+    def _get_cursor(self, store_key):
+        if self._poll_cursor is None and store_key is not None \
+                and store_key in self._pump.store:
+            self._poll_cursor = self._pump.store[store_key]
+        return self._poll_cursor
+
+    def _set_cursor(self, cursor, store_key):
+        self._poll_cursor = cursor
+        if store_key is not None:
+            self._pump.store[store_key] = cursor
+
+    def poll(self, since=None, store_key=None):
+        """ Returns a list of the items added to the feed since the last
+        time it was polled, oldest first.
+
+        The first time a feed is polled without since (and without a
+        cursor kept under store_key) it always returns an empty list: it
+        only remembers what the newest item is, so that items which were
+        already in the feed aren't returned as new. Iterate the feed to
+        get those, or give since to get everything after a known item.
+
+        :param since: id or object to get newer items than, instead of the
+          newest item from the last poll.
+        :param store_key: key to keep the newest item's id under in the
+          pump's store so polling can carry on after a restart.
+
+        Example:
+            >>> inbox = pump.me.inbox
+            >>> inbox.poll()
+            []
+            >>> inbox.poll()
+            [<Activity: alice@example.org posted a note>]
+        """
+        if since is not None:
+            cursor = since if isinstance(since, six.string_types) else since.id
+        else:
+            cursor = self._get_cursor(store_key)
+
+        # iterating an ItemList would use the items we already have,
+        # we want to ask the server
+        if cursor is None:
+            newest = next(ItemList(self, limit=1), None)
+            if newest is not None:
+                self._set_cursor(newest.id, store_key)
+            return []
+
+        if self._poll_seen is None:
+            self._poll_seen = (set(), deque())
+        seen, order = self._poll_seen
+
+        items = []
+        newer = ItemList(self, since=cursor, limit=None)
+        for item in iter(lambda: next(newer, None), None):
+            if item.id in seen:
+                continue
+
+            seen.add(item.id)
+            order.append(item.id)
+            if len(order) > self.poll_seen_size:
+                seen.discard(order.popleft())
+            items.append(item)
+
+        if items:
+            # new items move the others along, kept pages are out of date
+            self.clear_cache()
+            self._set_cursor(items[-1].id, store_key)
+        elif since is not None:
+            self._set_cursor(cursor, store_key)
+        return items
+
+    def watch(self, interval=10, max_interval=300, backoff=2, store_key=None):
+        """ Polls the feed forever yielding new items, oldest first. Like
+        :meth:`poll` the first poll only finds the newest item, items
+        already in the feed aren't yielded.
+
+        When nothing new turns up the time between polls is multiplied by
+        backoff, up to max_interval, and goes back to interval once there
+        are new items. When a poll fails, f.ex. the server can't be
+        reached, it's tried again after a wait which is multiplied by
+        backoff for each failure in a row, also up to max_interval.
+
+        :param interval: seconds between polls while there are new items.
+        :param max_interval: most seconds to wait between polls.
+        :param backoff: what to multiply the time between polls by when idle.
+        :param store_key: see :meth:`poll`.
+
+        Example:
+            >>> for activity in pump.me.inbox.watch(store_key="inbox-cursor"):
+            ...     print(activity)
+        """
+        wait = interval
+        failures = 0
+        while True:
+            try:
+                items = self.poll(store_key=store_key)
+            except (PyPumpException, requests.exceptions.RequestException) as e:
+                failures += 1
+                delay = min(wait * backoff ** failures, max_interval)
+                _log.warning("Polling %s failed, trying again in %s seconds: %s", self.url, delay, e)
+                time.sleep(delay)
+                continue
+
+            failures = 0
+            for item in items:
+                yield item
+
+            if items:
+                wait = interval
+            else:
+                wait = min(wait * backoff, max_interval)
+
+            _log.debug("Polling %s again in %s seconds", self.url, wait)
+            time.sleep(wait)
+
     def _subfeed(self, feedname):
         """ Used for Inbox/Outbox major/minor/direct subfeeds """
         url = self.url
@@ -374,6 +722,11 @@ class Feed(PumpObject):
             >>> inbox = pump.me.inbox[slice(0, 10, 2)]
             >>> print(len(inbox))
             10  # step been ignored
+
+        Looking up an integer index fetches just the page (of ``page_size``
+        items) it's on, pages are kept for ``page_cache_ttl`` seconds so
+        other items on them don't need another request. They're dropped
+        when :meth:`poll` finds new items, or use :meth:`clear_cache`.
         """
         if isinstance(key, slice):
             stop = key.stop
@@ -387,18 +740,34 @@ class Feed(PumpObject):
         if type(key) is not int:
             raise TypeError('index must be integer')
 
-        item = ItemList(self, limit=1, offset=key, stop=key + 1, cached=self.is_cached)
-        return item[key]
+        if key < 0:
+            key = key + len(self)
+        if key < 0 or (self.total_items is not None and key >= self.total_items):
+            raise IndexError("Feed index out of range")
 
-    def __len__(self):
+        return self._get_index(key)
+
+    def _get_total(self):
+        """ Returns totalItems, fetching the first page if we don't have it yet """
         if self.total_items is None:
             # a hacky way to populate the cache
-            list(ItemList(self, limit=1, cached=False))
+            for item in ItemList(self, limit=1, cached=False):
+                pass
         return self.total_items
 
+    def __len__(self):
+        total = self._get_total()
+        if total is None:
+            # server didn't tell us, count them
+            return self.items(limit=None)._count()
+        return total
+
     def __iter__(self):
         return self.items(limit=None)
 
+    def __aiter__(self):
+        return self.items(limit=None).__aiter__()
+
     def __repr__(self):
         return '<Feed: {url}>'.format(url=self.url)
 
@@ -417,7 +786,7 @@ class Following(Feed):
 class Favorites(Feed):
     """ Person's favorites """
     # API bug, can only get 20 items, see https://github.com/xray7224/PyPump/issues/65
-    # mark feed so we can enable bug work around in ItemList._build_cache()
+    # mark feed so we can enable bug work around in ItemList._next_cursor()
     issue65 = True
 
 
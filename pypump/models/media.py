@@ -16,6 +16,9 @@
 ##
 
 import logging
+
+from pypump import download
+from pypump.exceptions import PyPumpException
 from pypump.models import (PumpObject, Likeable, Shareable, Commentable,
                            Deleteable, Uploadable, Mapper)
 
@@ -61,20 +64,93 @@ class MediaObject(PumpObject, Likeable, Shareable, Commentable, Deleteable, Uplo
         if "stream" in data:
             stream = data["stream"]
             self.stream = StreamContainer(
-                url=self._get_fileurl(stream)
+                url=self._get_fileurl(stream),
+                pypump=self._pump,
             )
         Mapper(pypump=self._pump).parse_map(self, data=data)
         self._add_links(data)
         return self
 
 
-class StreamContainer(object):
+class FileContainer(object):
+    """ Base for containers of files on the pump.io server, adds
+    downloading the file with the pump's authenticated session.
+    """
+
+    def __init__(self, url, pypump=None):
+        self.url = url
+        self._pump = pypump
+
+    def _get_pump(self):
+        if self._pump is None:
+            raise PyPumpException("{0!r} isn't connected to a PyPump".format(self))
+        return self._pump
+
+    def iter_content(self, chunk_size=download.CHUNK_SIZE, start=0):
+        """ Yields the file chunk_size bytes at a time.
+
+        :param chunk_size: (optional) bytes in each chunk.
+        :param start: (optional) byte to start at.
+
+        Example:
+            >>> for chunk in myvideo.stream.iter_content():
+            ...     player.feed(chunk)
+        """
+        return download.iter_content(self._get_pump(), self.url, chunk_size=chunk_size, start=start)
+
+    def open(self):
+        """ Returns the file as a read-only mmap from the pump's
+        :class:`MediaCache <pypump.MediaCache>`, downloading it first if
+        it isn't in the cache.
+
+        Example:
+            >>> data = myimage.thumbnail.open()
+            >>> response.write(data[:])
+        """
+        pump = self._get_pump()
+        if pump.media_cache is None:
+            raise PyPumpException("Opening files needs a PyPump with a media_cache")
+        return pump.media_cache.open(pump, self.url)
+
+    def download(self, to, chunk_size=download.CHUNK_SIZE, resume=True,
+                 preallocate=False, progress=None):
+        """ Downloads the file a chunk at a time. Returns the number of bytes
+        written.
+
+        :param to: path to save the file to, or a file object to write it to.
+        :param chunk_size: (optional) bytes to read at a time.
+        :param resume: (optional) the file is downloaded to ``<to>.part``
+          and renamed when it's finished, if that exists the download
+          carries on where it got to (when the server supports ranges).
+        :param preallocate: (optional) make ``<to>.part`` the size of the
+          file before downloading, useful for large videos.
+        :param progress: (optional) callable which is called with
+          (bytes downloaded, total bytes) after each chunk, total is None if
+          the server doesn't say.
+
+        If the pump has a media cache and the file is in it, it's copied
+        from there, otherwise it's downloaded as above and kept in the cache
+        once it's finished.
+
+        Example:
+            >>> myvideo.stream.download('/path/to/kitteh.webm')
+        """
+        return download.download(
+            self._get_pump(),
+            self.url,
+            to,
+            chunk_size=chunk_size,
+            resume=resume,
+            preallocate_file=preallocate,
+            progress=progress,
+        )
+
+
+class StreamContainer(FileContainer):
     """ Container that holds information about a stream.
 
     :param url: URL to the file on the pump.io server.
     """
-    def __init__(self, url):
-        self.url = url
 
     def __repr__(self):
         return "<Stream: {url}>".format(url=self.url)
@@ -112,15 +188,15 @@ class Audio(MediaObject):
     object_type = 'audio'
 
 
-class ImageContainer(object):
+class ImageContainer(FileContainer):
     """ Container that holds information about an image.
 
     :param url: URL to image file on the pump.io server.
     :param width: Width of the image.
     :param height: Height of the image.
     """
-    def __init__(self, url, width, height):
-        self.url = url
+    def __init__(self, url, width, height, pypump=None):
+        super(ImageContainer, self).__init__(url, pypump=pypump)
         self.width = width
         self.height = height
 
@@ -158,7 +234,8 @@ class Image(MediaObject):
             self.thumbnail = ImageContainer(
                 url=self._get_fileurl(thumbnail),
                 height=thumbnail.get("height"),
-                width=thumbnail.get("width")
+                width=thumbnail.get("width"),
+                pypump=self._pump,
             )
 
         if "fullImage" in data:
@@ -166,7 +243,8 @@ class Image(MediaObject):
             self.original = ImageContainer(
                 url=self._get_fileurl(full_image),
                 height=full_image.get("height"),
-                width=full_image.get("width")
+                width=full_image.get("width"),
+                pypump=self._pump,
             )
         else:
             self.original = self.thumbnail
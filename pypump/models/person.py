@@ -15,6 +15,8 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 ##
 
+import logging
+
 import six
 
 from pypump.models import PumpObject, Addressable
@@ -22,12 +24,16 @@ from pypump.exceptions import PyPumpException
 from pypump.models.feed import (Followers, Following, Lists,
                                 Favorites, Inbox, Outbox)
 
+_log = logging.getLogger(__name__)
+
 
 class Person(PumpObject, Addressable):
     """ This object represents a pump.io **person**,
     a person is a user on the pump.io network.
 
-    :param webfinger: User ID in ``nickname@hostname`` format.
+    :param webfinger: User ID in ``nickname@hostname`` format, the profile
+      is fetched from the person's server the first time it's used
+      (see :meth:`load`).
 
     Example:
         >>> alice = pump.Person('alice@example.org')
@@ -52,6 +58,9 @@ class Person(PumpObject, Addressable):
     _favorites = None
     _lists = None
 
+    # attributes which are known without fetching the profile
+    _local_attrs = ["id", "username", "object_type", "_to", "_cc", "_bto", "_bcc"]
+
     @property
     def outbox(self):
         """ :class:`Outbox feed <pypump.models.feed.Outbox>` with all
@@ -65,7 +74,7 @@ class Person(PumpObject, Addressable):
             pypumptest2 deleted a note
         """
         if self._outbox is None:
-            self._outbox = Outbox(self.links['activity-outbox'], pypump=self._pump)
+            self._outbox = Outbox(self._get_link('activity-outbox'), pypump=self._pump)
         return self._outbox
 
     @property
@@ -82,7 +91,7 @@ class Person(PumpObject, Addressable):
             acct:carol@example.org
         """
         if self._followers is None:
-            self._followers = Followers(self.links['followers'], pypump=self._pump)
+            self._followers = Followers(self._get_link('followers'), pypump=self._pump)
         return self._followers
 
     @property
@@ -99,7 +108,7 @@ class Person(PumpObject, Addressable):
             acct:duncan@example.org
         """
         if self._following is None:
-            self._following = Following(self.links['following'], pypump=self._pump)
+            self._following = Following(self._get_link('following'), pypump=self._pump)
         return self._following
 
     @property
@@ -116,7 +125,7 @@ class Person(PumpObject, Addressable):
             comment by evan@e14n.com
         """
         if self._favorites is None:
-            self._favorites = Favorites(self.links['favorites'], pypump=self._pump)
+            self._favorites = Favorites(self._get_link('favorites'), pypump=self._pump)
         return self._favorites
 
     @property
@@ -134,7 +143,7 @@ class Person(PumpObject, Addressable):
             Friends
         """
         if self._lists is None:
-            self._lists = Lists(self.links['lists'], pypump=self._pump)
+            self._lists = Lists(self._get_link('lists'), pypump=self._pump)
         return self._lists
 
     @property
@@ -153,7 +162,7 @@ class Person(PumpObject, Addressable):
         if not self.isme:
             raise PyPumpException("You can't read other people's inboxes")
         if self._inbox is None:
-            self._inbox = Inbox(self.links['activity-inbox'], pypump=self._pump)
+            self._inbox = Inbox(self._get_link('activity-inbox'), pypump=self._pump)
         return self._inbox
 
     @property
@@ -181,11 +190,65 @@ class Person(PumpObject, Addressable):
             self._add_link('self', "{0}://{1}/api/user/{2}/profile".format(
                 self._pump.protocol, self.server, self.username)
             )
-            try:
-                data = self._pump.request(self.links['self'])
-                self.unserialize(data)
-            except:
-                pass
+
+            # fetch the profile when one of its attributes is first used
+            for key in self._mapping:
+                if key not in self._local_attrs:
+                    self._defer(key, self._load_attr, key)
+
+    def _load_attr(self, key):
+        try:
+            self._load()
+        except Exception as e:
+            _log.warning("Failed to load profile of %s: %s", self.webfinger, e)
+        return getattr(self, key)
+
+    def _get_link(self, name):
+        if name not in self.links and self._loading:
+            self._load_attr("links")
+        return self.links[name]
+
+    @property
+    def _loading(self):
+        """ True until the profile has been fetched """
+        deferred = self.__dict__.get("_deferred", {})
+        return any(fnc == self._load_attr for fnc, args in deferred.values())
+
+    def load(self):
+        """ Fetches the person's profile from their server. This is done
+        automatically the first time a profile attribute is used, any
+        attribute set before then keeps its value.
+
+        Example:
+            >>> alice = pump.Person('alice@example.org')
+            >>> alice.load()
+            >>> alice.display_name
+            'Alice'
+        """
+        return self._load()
+
+    def _load(self):
+        """ Does the work of load(), which the asyncio front end makes
+        awaitable. Lazy attributes call this so they're always fetched
+        straight away.
+        """
+        # attributes set while the profile was waiting to be fetched
+        local = {}
+        deferred = self.__dict__.get("_deferred", {})
+        for key, (fnc, args) in list(deferred.items()):
+            if fnc == self._load_attr:
+                del deferred[key]
+                if key in self.__dict__:
+                    local[key] = self.__dict__[key]
+
+        cache = getattr(self._pump, "profile_cache", None)
+        if cache is not None:
+            data = cache.fetch(self._pump, self.links['self'])
+        else:
+            data = self._pump.request(self.links['self'])
+        self.unserialize(data)
+        self.__dict__.update(local)
+        return self
 
     def serialize(self, verb):
         data = super(Person, self).serialize()
@@ -0,0 +1,226 @@
+##
+#   Copyright (C) 2013 Jessica T. (Tsyesika) <xray7224@googlemail.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <http://www.gnu.org/licenses/>.
+##
+
+""" Uploading and posting many media files """
+
+from __future__ import absolute_import
+
+import logging
+import mimetypes
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import six
+
+from pypump.batch import SendResult
+from pypump.models import DEFAULT_MIMETYPE
+
+_log = logging.getLogger(__name__)
+
+
+class StageMetrics(object):
+    """ Counts what went through a stage of a :class:`MediaPipeline`.
+
+    The stage's time is from :meth:`start` to the last item being added,
+    or the total of the seconds given with each item if they are.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.errors = 0
+        self.bytes = 0
+        self.started = None
+        self.finished = None
+        self.busy = None
+        self._lock = threading.Lock()
+
+    def add(self, nbytes=0, error=False, seconds=None):
+        with self._lock:
+            if error:
+                self.errors += 1
+            else:
+                self.items += 1
+                self.bytes += nbytes
+            if seconds is not None:
+                self.busy = (self.busy or 0.0) + seconds
+            self.finished = time.time()
+
+    def start(self):
+        if self.started is None:
+            self.started = time.time()
+
+    @property
+    def seconds(self):
+        if self.busy is not None:
+            return self.busy
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+    @property
+    def items_per_second(self):
+        return self.items / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return "<StageMetrics {0}: {1} items, {2:.1f} items/s, {3:.0f} bytes/s>".format(
+            self.name, self.items, self.items_per_second, self.bytes_per_second)
+
+
+class MediaPipeline(object):
+    """ Uploads many media files at the same time then posts them.
+
+    Files are uploaded on up to upload_workers threads, then each uploaded
+    file is posted to the feed in the order it was added. Titles,
+    descriptions and licenses are sent with the post, an extra update is
+    only made for servers which don't take them from there.
+    :attr:`metrics` has the throughput of the ``upload``, ``post`` and
+    ``update`` stages.
+
+    :param pump: :class:`PyPump <pypump.PyPump>` instance to use.
+    :param upload_workers: maximum number of uploads at the same time.
+
+    Example:
+        >>> pipeline = MediaPipeline(pump, upload_workers=4)
+        >>> for filename in glob.glob("holiday/*.jpg"):
+        ...     pipeline.add(filename=filename, display_name=os.path.basename(filename))
+        >>> results = pipeline.run()
+        >>> pipeline.metrics["upload"]
+        <StageMetrics upload: 52 items, 3.1 items/s, 2411520 bytes/s>
+    """
+
+    def __init__(self, pump, upload_workers=4):
+        self.pump = pump
+        self.upload_workers = upload_workers
+        self.items = []
+        self.metrics = dict(
+            (name, StageMetrics(name)) for name in ["upload", "post", "update"]
+        )
+
+    def get_model(self, mimetype):
+        """ Returns the pump's model factory for files of mimetype """
+        kind = (mimetype or "").split("/")[0]
+        if kind == "video":
+            return self.pump.Video
+        elif kind == "audio":
+            return self.pump.Audio
+        return self.pump.Image
+
+    def add(self, source=None, mimetype=None, length=None, filename=None, **kwargs):
+        """ Adds a file to the pipeline and returns the media object which
+        will be uploaded.
+
+        :param source: anything :meth:`from_stream
+          <pypump.models.Uploadable.from_stream>` takes, or a filename if
+          it's a unicode string (``str`` on Python 3).
+        :param mimetype: mimetype of the file, guessed from filenames.
+        :param length: size of the file, see ``from_stream``.
+        :param filename: path to the file, instead of source. Use this for
+          filenames which are byte strings, f.ex. ``str`` on Python 2.
+        :param kwargs: display_name, content or license, or ``media`` to
+          upload into an existing media object.
+        """
+        if filename is None and isinstance(source, six.text_type):
+            filename, source = source, None
+
+        if mimetype is None and filename is not None:
+            mimetype = mimetypes.guess_type(filename)[0]
+        mimetype = mimetype or DEFAULT_MIMETYPE
+
+        media = kwargs.pop("media", None)
+        if media is None:
+            media = self.get_model(mimetype)(**kwargs)
+        else:
+            for key, value in kwargs.items():
+                setattr(media, key, value)
+
+        self.items.append((media, source, filename, mimetype, length))
+        return media
+
+    def _upload(self, item):
+        media, source, filename, mimetype, length = item
+        sent = []
+
+        def progress(nbytes, total):
+            sent[:] = [nbytes]
+
+        try:
+            if filename is not None:
+                with open(filename, "rb") as fileobj:
+                    file_data = media._upload(fileobj, mimetype, progress=progress)
+            else:
+                file_data = media._upload(source, mimetype, length=length, progress=progress)
+        except Exception as e:
+            _log.warning("Failed to upload %r: %s", filename or source, e)
+            self.metrics["upload"].add(error=True)
+            return e
+
+        self.metrics["upload"].add(nbytes=sent[0] if sent else 0)
+        return file_data
+
+    def run(self):
+        """ Uploads and posts everything added, returns a list of
+        :class:`SendResult <pypump.batch.SendResult>` in the order the
+        files were added.
+        """
+        items, self.items = self.items, []
+        if not items:
+            return []
+
+        self.metrics["upload"].start()
+        workers = max(1, min(self.upload_workers, len(items)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            uploads = list(executor.map(self._upload, items))
+
+        # posts and updates take turns, each is timed on its own
+        results = []
+        for (media, source, filename, mimetype, length), file_data in zip(items, uploads):
+            source = filename or source
+            if isinstance(file_data, Exception):
+                results.append(SendResult(media, error=file_data))
+                continue
+
+            started = time.time()
+            try:
+                metadata = media._post_file(file_data)
+            except Exception as e:
+                _log.warning("Failed to post %r: %s", source, e)
+                self.metrics["post"].add(error=True, seconds=time.time() - started)
+                results.append(SendResult(media, error=e))
+                continue
+            self.metrics["post"].add(seconds=time.time() - started)
+            _log.debug("Posted %r in %.2f seconds", source, time.time() - started)
+
+            if metadata:
+                started = time.time()
+                try:
+                    media._update_upload(file_data, metadata)
+                except Exception as e:
+                    _log.warning("Failed to update post of %r: %s", source, e)
+                    self.metrics["update"].add(error=True, seconds=time.time() - started)
+                    results.append(SendResult(media, error=e))
+                    continue
+                self.metrics["update"].add(seconds=time.time() - started)
+
+            results.append(SendResult(media, result=media))
+
+        return results
@@ -0,0 +1,242 @@
+##
+#   Copyright (C) 2013 Jessica T. (Tsyesika) <xray7224@googlemail.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <http://www.gnu.org/licenses/>.
+##
+
+""" Acting for many accounts at once """
+
+from __future__ import absolute_import
+
+import collections
+import logging
+import threading
+import time
+
+from pypump.client import Client
+from pypump.exceptions import PyPumpException
+from pypump.pypump import PyPump
+from pypump.session import SessionPool
+from pypump.store import SQLiteStore
+
+_log = logging.getLogger(__name__)
+
+
+class PumpPool(object):
+    """ Keeps a :class:`PyPump <pypump.PyPump>` for each of many accounts.
+
+    The pumps share one pool of HTTP sessions and the clients registered
+    with each server, so the client is registered with a server once for
+    all accounts instead of once per account. Caches given as keyword
+    arguments (``profile_cache``, ``http_cache``, ``media_cache``) are
+    shared too. At most max_users pumps are kept, when there are more the
+    least recently used one is closed, as are pumps which haven't been
+    used for idle_timeout seconds. A closed pump is made again the next
+    time it's asked for.
+
+    The accounts have to be authorized already, f.ex. with
+    :class:`WebPump <pypump.WebPump>`.
+
+    :param client_name: name of the application, see :class:`Client <pypump.Client>`.
+    :param client_type: whether this is a "web" or "native" client.
+    :param max_users: most pumps to keep at once.
+    :param idle_timeout: seconds a pump can be unused before it's closed,
+      None keeps pumps until there are more than max_users.
+    :param verifier_callback: called if an account hasn't been authorized,
+      see :class:`PyPump <pypump.PyPump>`. By default an exception is raised.
+    :param pool_size: maximum number of connections kept open to each server.
+    :param keep_alive: If this is set to False connections won't be reused
+      between requests.
+    :param session_idle_timeout: how long a server's connections can be
+      unused before they're closed, in seconds.
+    :param kwargs: passed on to each :class:`PyPump <pypump.PyPump>`.
+
+    Example:
+        >>> pool = PumpPool("CoolCommunicator", max_users=5000,
+        ...                 http_cache=HTTPCache())
+        >>> pump = pool.get("alice@example.org")
+        >>> pump.me.outbox.major[0]
+        <Activity: alice posted a note>
+    """
+
+    pump_class = PyPump
+    store_class = SQLiteStore
+
+    def __init__(self, client_name, client_type="native", max_users=1000,
+                 idle_timeout=None, verifier_callback=None, pool_size=10,
+                 keep_alive=True, session_idle_timeout=300, **kwargs):
+        self.client_name = client_name
+        self.client_type = client_type
+        self.max_users = max_users
+        self.idle_timeout = idle_timeout
+        self.verifier_callback = verifier_callback or self._not_authorized
+        self.pump_kwargs = kwargs
+
+        self.sessions = SessionPool(
+            pool_size=pool_size,
+            keep_alive=keep_alive,
+            idle_timeout=session_idle_timeout,
+        )
+
+        # server -> Client registered with it, shared by all pumps
+        self.clients = {}
+        self._server_locks = {}
+        self._server_lock = threading.Lock()
+
+        # webfinger -> pump, least recently used first
+        self._pumps = collections.OrderedDict()
+        self._last_used = {}
+        self._lock = threading.RLock()
+        # webfinger -> lock held while its pump is made
+        self._creating = {}
+
+    def _not_authorized(self, url):
+        raise PyPumpException("Account hasn't been authorized, it can be at {0}".format(url))
+
+    def get(self, webfinger):
+        """ Returns the :class:`PyPump <pypump.PyPump>` for webfinger,
+        making it if needed.
+
+        :param webfinger: webfinger of the account, f.ex. ``alice@example.org``.
+        """
+        with self._lock:
+            self._evict_idle(time.time())
+            pump = self._use(webfinger)
+            if pump is not None:
+                return pump
+            lock = self._creating.setdefault(webfinger, threading.Lock())
+
+        # making a pump can mean talking to the server, only other threads
+        # wanting the same account wait for it
+        with lock:
+            with self._lock:
+                pump = self._use(webfinger)
+            if pump is not None:
+                return pump
+
+            try:
+                _log.debug("Creating pump for %s", webfinger)
+                pump = self.create_pump(webfinger)
+                with self._lock:
+                    self._pumps[webfinger] = pump
+                    self._use(webfinger)
+                    while len(self._pumps) > self.max_users:
+                        old = next(iter(self._pumps))
+                        _log.debug("Closing least recently used pump for %s", old)
+                        self._release(old)
+            finally:
+                with self._lock:
+                    if self._creating.get(webfinger) is lock:
+                        del self._creating[webfinger]
+            return pump
+
+    __getitem__ = get
+
+    def _use(self, webfinger):
+        """ Marks the pump for webfinger as just used and returns it, or
+        None if there isn't one. Needs the pool's lock.
+        """
+        pump = self._pumps.pop(webfinger, None)
+        if pump is not None:
+            self._pumps[webfinger] = pump
+            self._last_used[webfinger] = time.time()
+        return pump
+
+    def create_pump(self, webfinger):
+        """ Makes the pump for webfinger, if the client has been registered
+        with the account's server it's used instead of registering again.
+        """
+        client = Client(
+            webfinger=webfinger,
+            type=self.client_type,
+            name=self.client_name,
+        )
+        shared = self.clients.get(client.server)
+        if shared is not None:
+            client.key = shared.key
+            client.secret = shared.secret
+            client.expirey = shared.expirey
+
+        pump = self.pump_class(
+            client=client,
+            verifier_callback=self.verifier_callback,
+            pool=self,
+            **self.pump_kwargs
+        )
+        self.share_client(client.server, pump.client)
+        return pump
+
+    def create_store(self, pump):
+        """ Creates the store of pump """
+        return self.store_class.load(pump.client.webfinger, pump)
+
+    def share_client(self, server, client):
+        """ Lets all pumps use client for server, unless they already have
+        one for it.
+        """
+        if server in self.clients:
+            return
+
+        # a copy so the pump which registered it isn't kept around
+        self.clients[server] = Client(
+            webfinger=client.webfinger,
+            type=client.type,
+            name=client.name,
+            key=client.key,
+            secret=client.secret,
+            expirey=client.expirey,
+        )
+
+    def release(self, webfinger):
+        """ Closes the pump for webfinger, saving its store """
+        with self._lock:
+            if webfinger in self._pumps:
+                self._release(webfinger)
+
+    def _release(self, webfinger):
+        pump = self._pumps.pop(webfinger)
+        del self._last_used[webfinger]
+
+        close = getattr(pump.store, "close", None)
+        if close is not None:
+            close()
+        else:
+            pump.store.flush()
+
+    def _evict_idle(self, now):
+        if self.idle_timeout is None:
+            return
+
+        for webfinger, last_used in list(self._last_used.items()):
+            if now - last_used > self.idle_timeout:
+                _log.debug("Closing idle pump for %s", webfinger)
+                self._release(webfinger)
+
+    def evict_idle(self):
+        """ Closes pumps which haven't been used within idle_timeout """
+        with self._lock:
+            self._evict_idle(time.time())
+
+    def close(self):
+        """ Closes all pumps and connections """
+        with self._lock:
+            for webfinger in list(self._pumps):
+                self._release(webfinger)
+        self.sessions.close()
+
+    def __contains__(self, webfinger):
+        return webfinger in self._pumps
+
+    def __len__(self):
+        return len(self._pumps)
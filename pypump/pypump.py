@@ -19,16 +19,24 @@
 
 from __future__ import absolute_import
 
+import contextlib
 import json
 import logging
+import threading
+import time
+import weakref
+from email.utils import parsedate_tz, mktime_tz
 
 import requests
+from concurrent.futures import ThreadPoolExecutor
 
 from six.moves.urllib import parse
-from requests_oauthlib import OAuth1, OAuth1Session
+from requests_oauthlib import OAuth1
 
 from pypump.store import JSONStore
 from pypump.client import Client
+from pypump.session import SessionPool
+from pypump.batch import send_many
 from pypump.exceptions import PyPumpException
 
 # load models
@@ -43,6 +51,11 @@ from pypump.models.collection import Collection, Public
 _log = logging.getLogger(__name__)
 
 
+@contextlib.contextmanager
+def _no_transaction():
+    yield
+
+
 class PyPump(object):
     """Main class to interface with PyPump.
 
@@ -65,6 +78,32 @@ class PyPump(object):
     :param retries: number of times to retry if a request fails.
     :param timeout: how long to give on a timeout for an http request, in
       seconds.
+    :param pool_size: maximum number of connections kept open to each server.
+    :param keep_alive: If this is set to False connections won't be reused
+      between requests.
+    :param session_idle_timeout: how long a server's connections can be
+      unused before they're closed, in seconds. None keeps them forever.
+    :param lazy_dates: If this is set to True dates (published, updated, ...)
+      are kept as strings until they're first used.
+    :param lazy_objects: If this is set to True objects in objects (the actor
+      and object of an activity, recipients, comments, ...) are kept as JSON
+      until they're first used.
+    :param identity_map: If this is set to True objects with the same id are
+      made into the same instance, which is updated each time the object is
+      seen again.
+    :param profile_cache: a :class:`ProfileCache <pypump.ProfileCache>` to
+      keep people's profiles in.
+    :param http_cache: a :class:`HTTPCache <pypump.HTTPCache>` to keep
+      responses to GET requests in.
+    :param media_cache: a :class:`MediaCache <pypump.MediaCache>` to keep
+      downloaded images and other media in.
+    :param preregister_servers: list of servers to register the client with
+      in the background, so the first request to them doesn't have to
+      wait for it. See :meth:`preregister`.
+    :param pool: the :class:`PumpPool <pypump.PumpPool>` this pump belongs
+      to, its HTTP sessions and client registrations are shared with the
+      other pumps in the pool. You shouldn't need to give this yourself,
+      use :meth:`PumpPool.get <pypump.PumpPool.get>`.
     """
 
     PARAM_VERIFER = "oauth_verifier"
@@ -75,6 +114,13 @@ class PyPump(object):
 
     store_class = JSONStore
 
+    # times to try again when the server says we're making too many requests
+    rate_limit_retries = 3
+    # most seconds to wait when it does
+    max_retry_after = 60
+    _rate_limited_until = 0
+    _pool = None
+
     def __init__(self,
                  client,
                  verifier_callback,
@@ -82,13 +128,46 @@ class PyPump(object):
                  callback="oob",
                  verify_requests=True,
                  retries=0,
-                 timeout=30):
+                 timeout=30,
+                 pool_size=10,
+                 keep_alive=True,
+                 session_idle_timeout=300,
+                 lazy_dates=False,
+                 lazy_objects=False,
+                 identity_map=False,
+                 profile_cache=None,
+                 http_cache=None,
+                 media_cache=None,
+                 preregister_servers=None,
+                 pool=None):
 
         self._me = None
         self.protocol = "https"
 
         self.retries = retries
         self.timeout = timeout
+        self.lazy_dates = lazy_dates
+        self.lazy_objects = lazy_objects
+        self.profile_cache = profile_cache
+        self.http_cache = http_cache
+        self.media_cache = media_cache
+
+        # object id -> model instance, see Mapper.get_object
+        self._objects = weakref.WeakValueDictionary() if identity_map else None
+
+        self._pool = pool
+        if pool is None:
+            self._sessions = SessionPool(
+                pool_size=pool_size,
+                keep_alive=keep_alive,
+                idle_timeout=session_idle_timeout,
+            )
+            self._server_locks = {}
+            self._server_lock = threading.Lock()
+        else:
+            self._sessions = pool.sessions
+            self._server_locks = pool._server_locks
+            self._server_lock = pool._server_lock
 
         self._server_cache = {}
         self._server_tokens = {}
@@ -117,18 +196,24 @@ class PyPump(object):
 
         if not self.client.key:
             self.client.register()
-            # Save the info back to the store
 
-            self.store["client-key"] = self.client.key
-            self.store["client-secret"] = self.client.secret
-            self.store["client-expirey"] = self.client.expirey
+        if "client-key" not in self.store:
+            # Save the info back to the store
+            with self._store_transaction():
+                self.store["client-key"] = self.client.key
+                self.store["client-secret"] = self.client.secret
+                self.store["client-expirey"] = self.client.expirey
 
+        self._load_clients()
         self._populate_models()
 
         if "oauth-request-token" not in self.store and "oauth-access-token" not in self.store:
             # we Need to make a new oauth request
             self.oauth_request()
 
+        if preregister_servers:
+            self.preregister(preregister_servers)
+
     @property
     def me(self):
         """ Returns :class:`Person <pypump.models.person.Person>` instance of
@@ -148,28 +233,97 @@ class PyPump(object):
         ))
         return self._me
 
+    def people(self, webfingers, workers=10):
+        """ Returns a list of :class:`Person <pypump.models.person.Person>`
+        for webfingers with their profiles fetched, up to workers profiles
+        are fetched at the same time. If a profile can't be fetched the
+        person is still returned, see :meth:`Person.load <pypump.models.person.Person.load>`.
+
+        :param webfingers: list of webfingers in ``nickname@hostname`` format.
+        :param workers: maximum number of requests made at the same time.
+
+        Example:
+            >>> note = pump.Note("Hello!")
+            >>> note.to = pump.people(["alice@example.org", "bob@example.org"])
+        """
+        people = [self.Person(webfinger) for webfinger in webfingers]
+
+        def load(person):
+            try:
+                person.load()
+            except Exception as e:
+                _log.warning("Failed to load profile of %s: %s", person.webfinger, e)
+
+        if people:
+            with ThreadPoolExecutor(max_workers=min(workers, len(people))) as executor:
+                list(executor.map(load, people))
+
+        return people
+
+    @property
+    def feed_url(self):
+        """ URL of the logged in user's feed, which activities are posted to """
+        return "{proto}://{server}/api/user/{username}/feed".format(
+            proto=self.protocol,
+            server=self.client.server,
+            username=self.client.nickname
+        )
+
+    def send_many(self, items, concurrency=4):
+        """ Sends many objects or activities, up to concurrency at the same
+        time, and returns a list of :class:`SendResult <pypump.batch.SendResult>`
+        in the same order as items. Items for the same object are sent one
+        after another in the order they're given. Failures don't stop the
+        other items being sent, check the results.
+
+        :param items: iterable of objects to send (f.ex. a Note), activity
+          dictionaries to post to the user's feed or callables such as
+          ``note.like`` or ``person.follow``.
+        :param concurrency: maximum number of requests made at the same time.
+
+        Example:
+            >>> notes = [pump.Note("Note %d" % i) for i in range(100)]
+            >>> results = pump.send_many(notes, concurrency=8)
+            >>> [result.error for result in results if not result.ok]
+            []
+        """
+        return send_many(self, items, concurrency=concurrency)
+
+    def _store_transaction(self):
+        """ Returns a context manager which saves the changes made to the
+        store in it at once, if the store can do that.
+        """
+        transaction = getattr(self.store, "transaction", None)
+        if transaction is None:
+            return _no_transaction()
+        return transaction()
+
     def create_store(self):
         """ Creates store object """
+        if self._pool is not None:
+            return self._pool.create_store(self)
+
         if self.store_class is not None:
             return self.store_class.load(self.client.webfinger, self)
 
         raise NotImplementedError("You need to specify PyPump.store_class or override PyPump.create_store method.")
 
+    def _model_factory(self, model):
+        """ Returns a callable making instances of model bound to this pump """
+        return lambda *args, **kwargs: model(
+            pypump=kwargs.pop("pypump", self),
+            *args,
+            **kwargs)
+
     def _populate_models(self):
-        def factory(pypump, model):
-            return lambda *args, **kwargs: model(
-                pypump=kwargs.pop("pypump", pypump),
-                *args,
-                **kwargs)
-
-        self.Note = factory(self, Note)
-        self.Collection = factory(self, Collection)
-        self.Comment = factory(self, Comment)
-        self.Image = factory(self, Image)
-        self.Video = factory(self, Video)
-        self.Audio = factory(self, Audio)
-        self.Person = factory(self, Person)
-        self.Place = factory(self, Place)
+        self.Note = self._model_factory(Note)
+        self.Collection = self._model_factory(Collection)
+        self.Comment = self._model_factory(Comment)
+        self.Image = self._model_factory(Image)
+        self.Video = self._model_factory(Video)
+        self.Audio = self._model_factory(Audio)
+        self.Person = self._model_factory(Person)
+        self.Place = self._model_factory(Place)
         self.Public = Public()
 
     def _build_url(self, endpoint):
@@ -193,7 +347,24 @@ class PyPump(object):
         server, endpoint = url.split("/", 1)
         return (server, endpoint)
 
-    def _add_client(self, url, key=None, secret=None):
+    def _get_session(self, url=None):
+        """ Returns the pooled HTTP session for the server url is on """
+        if url and "://" in url:
+            server, endpoint = self._deconstruct_url(url)
+        else:
+            server = url or self.client.server
+
+        return self._sessions.get(server)
+
+    def close(self):
+        """ Closes all open connections to pump.io servers, the connections
+        of pumps from a :class:`PumpPool <pypump.PumpPool>` are shared and
+        only closed by :meth:`PumpPool.close <pypump.PumpPool.close>`.
+        """
+        if self._pool is None:
+            self._sessions.close()
+
+    def _add_client(self, url, key=None, secret=None, expirey=None):
         """ Creates Client object with key and secret for server
         and adds it to _server_cache if it doesnt already exist """
 
@@ -202,7 +373,17 @@ class PyPump(object):
         else:
             server = url
 
-        if server not in self._server_cache:
+        if server in self._server_cache or self._use_shared_client(server):
+            return
+
+        # one registration per server, even with several threads
+        with self._server_lock:
+            lock = self._server_locks.setdefault(server, threading.Lock())
+
+        with lock:
+            if server in self._server_cache or self._use_shared_client(server):
+                return
+
             if not (key and secret):
                 client = Client(
                     webfinger=self.client.webfinger,
@@ -211,17 +392,100 @@ class PyPump(object):
                 )
                 client.set_pump(self)
                 client.register(server)
+                self._save_client(server, client)
             else:
                 client = Client(
                     webfinger=self.client.webfinger,
                     key=key,
                     secret=secret,
+                    expirey=expirey,
                     type=self.client.type,
                     name=self.client.name,
                 )
                 client.set_pump(self)
 
             self._server_cache[server] = client
+            if self._pool is not None:
+                self._pool.share_client(server, client)
+
+    def _use_shared_client(self, server):
+        """ Uses the client another pump in our pool has for server, returns
+        False if there isn't one.
+        """
+        if self._pool is None or server not in self._pool.clients:
+            return False
+
+        self._server_cache[server] = self._pool.clients[server]
+        return True
+
+    def _load_clients(self):
+        """ Adds the clients registered with other servers which were saved
+        in the store, unless they have expired.
+        """
+        if "remote-clients" not in self.store:
+            return
+
+        for server, data in self.store["remote-clients"].items():
+            expirey = data.get("expirey")
+            if expirey and expirey < time.time():
+                _log.debug("Client registration with %s has expired", server)
+                continue
+            self._add_client(server, key=data["key"], secret=data["secret"], expirey=expirey)
+
+    def _save_client(self, server, client):
+        """ Saves client registered with server in the store """
+        with self._store_transaction():
+            clients = {}
+            if "remote-clients" in self.store:
+                clients.update(self.store["remote-clients"])
+
+            clients[server] = {
+                "key": client.key,
+                "secret": client.secret,
+                "expirey": client.expirey,
+            }
+            self.store["remote-clients"] = clients
+
+    def _forget_client(self, server):
+        """ Drops the client registered with server, a new one is registered
+        the next time it's needed.
+        """
+        client = self._server_cache.pop(server, None)
+        if self._pool is not None and client is not None:
+            shared = self._pool.clients.get(server)
+            if shared is not None and shared.key == client.key:
+                self._pool.clients.pop(server, None)
+
+        with self._store_transaction():
+            if "remote-clients" in self.store and server in self.store["remote-clients"]:
+                clients = dict(self.store["remote-clients"])
+                del clients[server]
+                self.store["remote-clients"] = clients
+
+    def preregister(self, servers):
+        """ Registers the client with servers in a background thread, so
+        requests to them don't have to wait for it later. Servers the client
+        is already registered with are skipped. Returns the thread.
+
+        :param servers: list of servers, f.ex. ``["identi.ca", "e14n.com"]``.
+
+        Example:
+            >>> pump.preregister(["identi.ca", "e14n.com"])
+            <Thread(PyPump preregister, started daemon 140018403284736)>
+        """
+        servers = [server for server in servers if server not in self._server_cache]
+
+        def register():
+            for server in servers:
+                try:
+                    self._add_client(server)
+                except Exception as e:
+                    _log.warning("Failed to register client with %s: %s", server, e)
+
+        thread = threading.Thread(target=register, name="PyPump preregister")
+        thread.daemon = True
+        thread.start()
+        return thread
 
     def request(self, endpoint, method="GET", data="",
                 raw=False, params=None, retries=None, client=None,
@@ -258,21 +522,35 @@ class PyPump(object):
              u'updated': u'2014-09-24T02:38:32Z',
              u'url': u'https://e14n.com/evan'}
         """
+        response = self._make_request(
+            endpoint, method=method, data=data, raw=raw, params=params,
+            retries=retries, client=client, headers=headers, timeout=timeout,
+            **kwargs
+        )
 
+        if response.status_code == 200:
+            # huray!
+            return response.json()
+        return response
+
+    def _make_request(self, endpoint, method="GET", data="",
+                      raw=False, params=None, retries=None, client=None,
+                      headers=None, timeout=None, **kwargs):
+        """ Same as :meth:`request` but returns the response object """
         retries = self.retries if retries is None else retries
         timeout = self.timeout if timeout is None else timeout
 
         # check client has been setup
+        # server our client registration is used for, if it isn't ours
+        remote = None
         if client is None:
             client = self.setup_oauth_client(endpoint)
-            c = client.client
-            fnc = OAuth1Session(c.client_key,
-                                client_secret=c.client_secret,
-                                resource_owner_key=c.resource_owner_key,
-                                resource_owner_secret=c.resource_owner_secret
-                               )
+            if "://" in endpoint:
+                remote = self._deconstruct_url(endpoint)[0]
+                if remote == self.client.server:
+                    remote = None
         elif client is False:
-            fnc = requests
+            client = None
 
         params = {} if params is None else params
 
@@ -284,11 +562,27 @@ class PyPump(object):
         else:
             url = endpoint
 
+        fnc = self._get_session(url)
+
         headers = headers or {"Content-Type": "application/json"}
+
+        cache_key = cached = None
+        if method == "GET" and self.http_cache is not None and not kwargs.get("stream"):
+            cache_key = self.http_cache.get_key(url, params, client)
+            fresh = self.http_cache.fresh(cache_key)
+            if fresh is not None:
+                return fresh
+
+            cached = self.http_cache.get(cache_key)
+            if cached is not None and "If-None-Match" not in headers \
+                    and "If-Modified-Since" not in headers:
+                headers = dict(headers, **cached.validators())
+
         request = {
             "headers": headers,
             "params": params,
             "timeout": timeout,
+            "auth": client,
         }
         request.update(kwargs)
 
@@ -304,16 +598,36 @@ class PyPump(object):
             fnc = fnc.delete
 
         for attempt in range(1 + retries):
-            response = self._requester(
+            if attempt and not self._rewind(request.get("data")):
+                _log.warning("Can't send the body of the request to %s again", url)
+                break
+
+            response = self._rate_limited_request(
                 fnc=fnc,
                 endpoint=endpoint,
                 raw=raw,
                 **request
             )
 
+            if response.status_code == 401 and remote is not None:
+                # the server may have dropped our client, f.ex. it's expired
+                _log.info("%s refused our client, registering a new one", remote)
+                self._forget_client(remote)
+                request["auth"] = self.setup_oauth_client(url)
+                remote = None
+                if self._rewind(request.get("data")):
+                    response = self._rate_limited_request(
+                        fnc=fnc,
+                        endpoint=endpoint,
+                        raw=raw,
+                        **request
+                    )
+
+            if cache_key is not None:
+                response = self.http_cache.update(cache_key, response, cached)
+
             if response.status_code == 200:
-                # huray!
-                return response.json()
+                return response
 
             if response.status_code == 400:
                 # can't do much
@@ -342,6 +656,57 @@ class PyPump(object):
 
         raise PyPumpException(error)
 
+    def _rate_limited_request(self, fnc, endpoint, raw=False, **kwargs):
+        """ Makes the request with _requester, waiting and trying again when
+        the server says we're making too many requests (429). The wait is
+        shared by all threads using the pump.
+        """
+        for attempt in range(1 + self.rate_limit_retries):
+            if attempt and not self._rewind(kwargs.get("data")):
+                _log.warning("Rate limited by server, the request body can't be sent again")
+                break
+
+            wait = self._rate_limited_until - time.time()
+            if wait > 0:
+                time.sleep(wait)
+
+            response = self._requester(fnc=fnc, endpoint=endpoint, raw=raw, **kwargs)
+            if response.status_code != 429:
+                return response
+
+            delay = self._get_retry_after(response)
+            if delay is None:
+                delay = 2 ** attempt
+            delay = min(delay, self.max_retry_after)
+            _log.warning("Rate limited by server, waiting %s seconds", delay)
+            self._rate_limited_until = max(self._rate_limited_until, time.time() + delay)
+
+        return response
+
+    @staticmethod
+    def _rewind(data):
+        """ Gets a request body ready to be sent again, returns False if it
+        can't be.
+        """
+        rewind = getattr(data, "rewind", None)
+        if rewind is None:
+            return True
+        return rewind()
+
+    def _get_retry_after(self, response):
+        """ Returns seconds to wait from the Retry-After header, or None """
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+
+        try:
+            return max(0, int(value))
+        except ValueError:
+            date = parsedate_tz(value)
+            if date is None:
+                return None
+            return max(0, mktime_tz(date) - time.time())
+
     def _requester(self, fnc, endpoint, raw=False, **kwargs):
         if not raw:
             url = self._build_url(endpoint)
@@ -356,6 +721,8 @@ class PyPump(object):
         except requests.exceptions.ConnectionError:
             if (self.verify_requests and self.protocol == "https") or raw:
                 raise
+            elif not self._rewind(kwargs.get("data")):
+                raise
             else:
                 self.set_http()
                 url = self._build_url(endpoint)
@@ -379,8 +746,9 @@ class PyPump(object):
         # get tokens from server and make a dict of them.
         self._server_tokens = self.request_token()
 
-        self.store["oauth-request-token"] = self._server_tokens["token"]
-        self.store["oauth-request-secret"] = self._server_tokens["token_secret"]
+        with self._store_transaction():
+            self.store["oauth-request-token"] = self._server_tokens["token"]
+            self.store["oauth-request-secret"] = self._server_tokens["token_secret"]
 
         # now we need the user to authorize me to use their pump.io account
         result = self.verifier_callback(self.construct_oauth_url())
@@ -389,7 +757,7 @@ class PyPump(object):
 
     def construct_oauth_url(self):
         """ Constructs verifier OAuth URL """
-        response = self._requester(requests.head, 
+        response = self._requester(self._get_session().head,
                                    "{0}://{1}/".format(self.protocol, self.client.server),
                                    allow_redirects=False
                                   )
@@ -417,6 +785,12 @@ class PyPump(object):
         else:
             server = self.client.server
 
+        client = self._server_cache.get(server)
+        if client is not None and server != self.client.server \
+                and client.expirey and client.expirey < time.time():
+            _log.debug("Client registration with %s has expired", server)
+            self._forget_client(server)
+
         if server not in self._server_cache:
             self._add_client(server)
 
@@ -444,7 +818,7 @@ class PyPump(object):
 
         request = {"auth": client}
         response = self._requester(
-            requests.post,
+            self._get_session().post,
             "oauth/request_token",
             **request
         )
@@ -469,15 +843,16 @@ class PyPump(object):
 
         request = {"auth": client}
         response = self._requester(
-            requests.post,
+            self._get_session().post,
             "oauth/access_token",
             **request
         )
 
         data = parse.parse_qs(response.text)
 
-        self.store["oauth-access-token"] = data[self.PARAM_TOKEN][0]
-        self.store["oauth-access-secret"] = data[self.PARAM_TOKEN_SECRET][0]
+        with self._store_transaction():
+            self.store["oauth-access-token"] = data[self.PARAM_TOKEN][0]
+            self.store["oauth-access-secret"] = data[self.PARAM_TOKEN_SECRET][0]
         self._server_tokens = {}  # clean up code.
 
 
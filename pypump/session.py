@@ -0,0 +1,167 @@
+##
+#   Copyright (C) 2013 Jessica T. (Tsyesika) <xray7224@googlemail.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <http://www.gnu.org/licenses/>.
+##
+
+from __future__ import absolute_import
+
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from six.moves.http_cookiejar import DefaultCookiePolicy
+
+_log = logging.getLogger(__name__)
+
+
+class NoCookies(DefaultCookiePolicy):
+    """ Cookie policy which never keeps or sends cookies """
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+class PumpSession(requests.Session):
+    """ A :class:`requests.Session` which re-signs OAuth requests on redirect.
+
+    The OAuth signature covers the URL so it can't be reused when the server
+    redirects us, we keep hold of the auth the request was made with and
+    sign the redirected request again with it.
+
+    Cookies aren't kept, requests are signed with OAuth so they aren't
+    needed and a session is used for every account in a
+    :class:`PumpPool <pypump.PumpPool>`. The number of requests being made
+    with the session is kept in ``active`` so it isn't closed while in use.
+    """
+
+    def __init__(self):
+        super(PumpSession, self).__init__()
+        self.cookies.set_policy(NoCookies())
+        self.active = 0
+        self.last_used = time.time()
+        self._active_lock = threading.Lock()
+
+    def request(self, *args, **kwargs):
+        with self._active_lock:
+            self.active += 1
+        try:
+            return super(PumpSession, self).request(*args, **kwargs)
+        finally:
+            with self._active_lock:
+                self.active -= 1
+                self.last_used = time.time()
+
+    def prepare_request(self, request):
+        prepared = super(PumpSession, self).prepare_request(request)
+        prepared.pump_auth = request.auth or self.auth
+        return prepared
+
+    def rebuild_auth(self, prepared_request, response):
+        auth = getattr(response.request, "pump_auth", None)
+        prepared_request.pump_auth = auth
+
+        if auth is None:
+            return super(PumpSession, self).rebuild_auth(prepared_request, response)
+
+        prepared_request.headers.pop("Authorization", None)
+        prepared_request.prepare_auth(auth)
+
+
+class SessionPool(object):
+    """ Keeps one keep-alive :class:`PumpSession` per server.
+
+    :param pool_size: maximum number of connections kept open per server.
+    :param keep_alive: if False connections are closed after each request.
+    :param idle_timeout: seconds a session can be unused before it's closed,
+      None means sessions are never evicted.
+    """
+
+    session_class = PumpSession
+
+    def __init__(self, pool_size=10, keep_alive=True, idle_timeout=300):
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.idle_timeout = idle_timeout
+
+        self._sessions = {}
+        self._last_used = {}
+        self._lock = threading.Lock()
+
+    def create_session(self):
+        """ Creates a new session with our connection pool settings """
+        session = self.session_class()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+
+        return session
+
+    def get(self, server):
+        """ Returns the session for server, creating it if needed """
+        now = time.time()
+        with self._lock:
+            self._evict_idle(now)
+
+            session = self._sessions.get(server)
+            if session is None:
+                _log.debug("Creating HTTP session for %s", server)
+                session = self.create_session()
+                self._sessions[server] = session
+
+            self._last_used[server] = now
+            return session
+
+    def _evict_idle(self, now):
+        if self.idle_timeout is None:
+            return
+
+        for server, last_used in list(self._last_used.items()):
+            session = self._sessions[server]
+            if getattr(session, "active", 0):
+                # a request is being made with it
+                continue
+
+            last_used = max(last_used, getattr(session, "last_used", 0))
+            if now - last_used > self.idle_timeout:
+                _log.debug("Closing idle HTTP session for %s", server)
+                self._sessions.pop(server).close()
+                del self._last_used[server]
+
+    def evict_idle(self):
+        """ Closes sessions which haven't been used within idle_timeout """
+        with self._lock:
+            self._evict_idle(time.time())
+
+    def close(self):
+        """ Closes all sessions in the pool """
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._last_used.clear()
+
+    def __contains__(self, server):
+        return server in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
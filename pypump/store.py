@@ -18,18 +18,62 @@
 
 from __future__ import absolute_import
 
+import atexit
+import contextlib
 import json
+import logging
 import os
 import re
+import sqlite3
 import stat
 import datetime
+import threading
+import time
+import weakref
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
 
 from pypump.exceptions import ValidationError, StoreException
 
+_log = logging.getLogger(__name__)
+
+
+def replace_file(src, dst):
+    """ Renames the file src to dst, replacing dst if it exists """
+    replace = getattr(os, "replace", None)
+    if replace is not None:
+        replace(src, dst)
+        return
+
+    if os.name == "nt" and os.path.isfile(dst):
+        # os.rename won't overwrite files on Windows
+        os.remove(dst)
+    os.rename(src, dst)
+
+
 # Regex taken from WTForms
 EMAIL_REGEX = re.compile(r"^.+@[^.].*\.[a-z]{2,10}$", re.IGNORECASE)
 
 
+def _fsync_directory(path):
+    """ Makes sure a rename in directory path is on disk """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except (IOError, OSError):
+        # can't open directories on Windows
+        return
+    try:
+        os.fsync(fd)
+    except (IOError, OSError):
+        pass
+    finally:
+        os.close(fd)
+
+
 def webfinger_validator(webfinger):
     """ Validates webfinger is correct - should look like user@host.tld """
     error = "Invalid webfinger. Should be in format username@host.tld"
@@ -50,12 +94,25 @@ class AbstractStore(dict):
     This must save when "my-value" was set (in __setitem__). There
     should also be a .save method which should take the entire object
     and write them out.
+
+    Changes made inside ``with store.transaction():`` are saved once at
+    the end, or not at all if there was an exception. If write_delay is
+    set changes are saved by a background thread write_delay seconds
+    after the first one, :meth:`flush` saves them straight away.
     """
 
     prefix = None
 
+    # seconds to wait before saving changes, None saves every change
+    write_delay = None
+
+    _transactions = 0
+    _dirty = False
+    _timer = None
+
     def __init__(self, *args, **kwargs):
         self.__validators = {}
+        self._lock = threading.RLock()
         return super(AbstractStore, self).__init__(*args, **kwargs)
 
     def __prefix_key(self, key):
@@ -75,8 +132,9 @@ class AbstractStore(dict):
             self.__validators[key](*args, **kwargs)
 
         key = self.__prefix_key(key)
-        super(AbstractStore, self).__setitem__(key, *args, **kwargs)
-        self.save()
+        with self._lock:
+            super(AbstractStore, self).__setitem__(key, *args, **kwargs)
+            self._changed()
 
     def __getitem__(self, key, *args, **kwargs):
         key = self.__prefix_key(key)
@@ -86,9 +144,80 @@ class AbstractStore(dict):
         key = self.__prefix_key(key)
         return super(AbstractStore, self).__contains__(key, *args, **kwargs)
 
+    def __delitem__(self, key):
+        key = self.__prefix_key(key)
+        with self._lock:
+            super(AbstractStore, self).__delitem__(key)
+            self._changed()
+
     def set_validator(self, key, validator):
         self.__validators[key] = validator
 
+    def _changed(self):
+        """ Saves the store or remembers to save it later """
+        with self._lock:
+            if self._transactions:
+                self._dirty = True
+            elif self.write_delay is not None:
+                self._dirty = True
+                if self._timer is None:
+                    self._timer = threading.Timer(self.write_delay, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                    _flush_at_exit(self)
+            else:
+                self.save()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """ Saves the changes made in the with block once at the end. If the
+        block raises an exception the changes are undone and nothing is
+        saved. Other threads changing the store wait for the transaction to
+        finish. Transactions can be nested, the outer one saves or undoes
+        the changes.
+
+        Example:
+            >>> with store.transaction():
+            ...     store["oauth-access-token"] = token
+            ...     store["oauth-access-secret"] = secret
+        """
+        with self._lock:
+            outer = not self._transactions
+            if outer:
+                snapshot = dict(self), self._dirty
+            self._transactions += 1
+            try:
+                yield self
+            except BaseException:
+                if outer:
+                    data, self._dirty = snapshot
+                    super(AbstractStore, self).clear()
+                    super(AbstractStore, self).update(data)
+                raise
+            finally:
+                self._transactions -= 1
+
+            if outer and self._dirty:
+                if self.write_delay is None:
+                    self.flush()
+                else:
+                    # save it later along with anything else
+                    self._dirty = False
+                    self._changed()
+
+    def flush(self):
+        """ Saves changes which haven't been saved yet, does nothing if there
+        aren't any. When this returns the changes are on disk.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            if self._dirty and not self._transactions:
+                self._dirty = False
+                self.save()
+
     def save(self):
         """ Save all attributes in store """
         raise NotImplementedError("This is a dummy class, abstract")
@@ -110,6 +239,25 @@ class AbstractStore(dict):
         return str(self.export())
 
 
+# stores with changes waiting to be saved, id(store) -> weakref
+_pending = {}
+
+
+def _flush_at_exit(store):
+    """ Makes sure store's delayed changes are saved before Python exits """
+    if not _pending:
+        atexit.register(_flush_pending)
+    _pending[id(store)] = weakref.ref(store)
+
+
+def _flush_pending():
+    for ref in list(_pending.values()):
+        store = ref()
+        if store is not None:
+            store.flush()
+    _pending.clear()
+
+
 class DummyStore(AbstractStore):
     """
     This doesn't persistantly store any data it just acts like
@@ -129,10 +277,17 @@ class JSONStore(AbstractStore):
     """
     Persistant dictionary-like storage
 
-    Will write out all changes to disk as they're made
-    NB: Will overwrite any changes made to disk not on class.
+    Will write out all changes to disk as they're made. Several processes
+    can share the file: saving locks it, merges in changes other
+    processes have saved and only then writes it. Changes saved by other
+    processes are also picked up when reading a key, the file is checked
+    at most every reload_interval seconds.
     """
 
+    # seconds between checking if another process changed the file,
+    # None never checks
+    reload_interval = 1
+
     def __init__(self, data=None, filename=None, *args, **kwargs):
         if filename is None:
             filename = self.get_filename()
@@ -141,39 +296,151 @@ class JSONStore(AbstractStore):
         if data is None:
             data = {}
 
+        # what's in the file as far as we know, and its os.stat
+        self._synced = {}
+        self._synced_stat = None
+        self._checked = time.time()
+
         super(JSONStore, self).__init__(data, *args, **kwargs)
 
+    def __getitem__(self, key, *args, **kwargs):
+        self.reload()
+        return super(JSONStore, self).__getitem__(key, *args, **kwargs)
+
+    def __contains__(self, key, *args, **kwargs):
+        self.reload()
+        return super(JSONStore, self).__contains__(key, *args, **kwargs)
+
     def update(self, *args, **kwargs):
-        return_value = super(JSONStore, self).update(*args, **kwargs)
-        self.save()
+        with self._lock:
+            return_value = super(JSONStore, self).update(*args, **kwargs)
+            self._changed()
         return return_value
 
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """ Locks the file against other processes saving it """
+        with self._lock:
+            if fcntl is None:
+                # no advisory locks on Windows
+                yield
+                return
+
+            mode = stat.S_IRUSR | stat.S_IWUSR  # 0600
+            fd = os.open(self.filename + ".lock", os.O_RDWR | os.O_CREAT, mode)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def _stat(self):
+        """ Returns what tells us the file has changed, the inode changes
+        every time it's saved as it's replaced with a new file.
+        """
+        try:
+            info = os.stat(self.filename)
+        except OSError:
+            return None
+        return (info.st_ino, info.st_size, info.st_mtime)
+
+    def _read(self):
+        """ Returns (data in the file, stat of the file), None if the file
+        hasn't changed since it was last read or written.
+        """
+        info = self._stat()
+        if info is None or info == self._synced_stat:
+            # if the file was removed it's written again with what we
+            # have when the store is saved
+            return None
+
+        with open(self.filename) as fd:
+            return json.load(fd), info
+
+    def _merge(self, data, info):
+        """ Makes the store data from the file with the changes which
+        haven't been saved yet on top.
+        """
+        current = self.export()
+        merged = dict(data)
+        for key, value in current.items():
+            if key not in self._synced or self._synced[key] != value:
+                merged[key] = value
+        for key in self._synced:
+            if key not in current:
+                merged.pop(key, None)
+
+        dict.clear(self)
+        dict.update(self, merged)
+        self._synced = data
+        self._synced_stat = info
+
+    def reload(self, force=False):
+        """ Reads changes other processes have saved to the file, changes
+        which haven't been saved yet are kept. Unless force is True the
+        file is only checked every reload_interval seconds and errors
+        reading it are logged rather than raised.
+        """
+        if not force:
+            if self.reload_interval is None or self.filename is None:
+                return
+            if time.time() - self._checked < self.reload_interval:
+                return
+
+        with self._lock:
+            self._checked = time.time()
+            try:
+                changed = self._read()
+            except (IOError, OSError, ValueError) as e:
+                if force:
+                    raise
+                _log.warning("Failed to read %s: %s", self.filename, e)
+                return
+
+            if changed is not None:
+                _log.debug("%s was changed by another process, reloading", self.filename)
+                self._merge(*changed)
+
     def save(self):
-        """ Saves dictionary to disk in JSON format. """
+        """ Saves dictionary to disk in JSON format. Changes saved by other
+        processes since the file was last read are merged in first. Once
+        this returns the file is on disk, a crash leaves either the old or
+        the new file.
+        """
         if self.filename is None:
             raise StoreException("Filename must be set to write store to disk")
 
-        # We need an atomic way of re-writing the settings, we also need to
-        # prevent only overwriting part of the settings file (see bug #116).
-        # Create a temp file and only then re-name it to the config
-        filename = "{filename}.{date}.tmp".format(
-            filename=self.filename,
-            date=datetime.datetime.utcnow().strftime('%Y-%m-%dT%H_%M_%S.%f')
-        )
-
-        # The `open` built-in doesn't allow us to set the mode
-        mode = stat.S_IRUSR | stat.S_IWUSR  # 0600
-        fd = os.open(filename, os.O_WRONLY | os.O_CREAT, mode)
-        fout = os.fdopen(fd, "w")
-        fout.write(json.dumps(self.export()))
-        fout.close()
-
-        # Now we should remove the old config
-        if os.path.isfile(self.filename):
-            os.remove(self.filename)
-
-        # Now rename the temp file to the real config file
-        os.rename(filename, self.filename)
+        with self._file_lock():
+            changed = self._read()
+            if changed is not None:
+                self._merge(*changed)
+            data = self.export()
+
+            # We need an atomic way of re-writing the settings, we also need to
+            # prevent only overwriting part of the settings file (see bug #116).
+            # Create a temp file and only then re-name it to the config
+            filename = "{filename}.{date}.tmp".format(
+                filename=self.filename,
+                date=datetime.datetime.utcnow().strftime('%Y-%m-%dT%H_%M_%S.%f')
+            )
+
+            # The `open` built-in doesn't allow us to set the mode
+            mode = stat.S_IRUSR | stat.S_IWUSR  # 0600
+            fd = os.open(filename, os.O_WRONLY | os.O_CREAT, mode)
+            fout = os.fdopen(fd, "w")
+            fout.write(json.dumps(data))
+            fout.flush()
+            os.fsync(fout.fileno())
+            fout.close()
+
+            # Now rename the temp file to the real config file
+            replace_file(filename, self.filename)
+            _fsync_directory(os.path.dirname(os.path.abspath(self.filename)))
+
+            self._synced = data
+            self._synced_stat = self._stat()
+            self._checked = time.time()
 
     @classmethod
     def get_filename(cls):
@@ -192,12 +459,211 @@ class JSONStore(AbstractStore):
         """ Load JSON from disk into store object """
         filename = cls.get_filename()
 
-        if os.path.isfile(filename):
-            data = open(filename).read()
-            data = json.loads(data)
-            store = cls(data, filename=filename)
-        else:
-            store = cls(filename=filename)
+        store = cls(filename=filename)
+        store.reload(force=True)
+        store.prefix = webfinger
+        return store
+
+
+# database filename -> [connection, lock, number of stores using it]
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+class SQLiteStore(AbstractStore):
+    """
+    Persistant dictionary-like storage in an SQLite database
+
+    Every account's data is kept in one database, one row per key, and
+    only the rows of the account the store is for are loaded. Saving only
+    writes the keys which have changed since the last save, so loading and
+    saving don't get slower as more accounts are added.
+
+    The database is in WAL mode so other processes can read it while it's
+    being written to. Stores for the same database in a process share one
+    connection to it, which is closed when the last of them is.
+
+    :param data: initial data of the store.
+    :param filename: path to the database, defaults to
+      ``$XDG_CONFIG_HOME/PyPump/credentials.sqlite3``.
+    """
 
+    def __init__(self, data=None, filename=None, *args, **kwargs):
+        if filename is None:
+            filename = self.get_filename()
+        self.filename = filename
+        self._saved = {}
+        self._database = None
+
+        super(SQLiteStore, self).__init__(data or {}, *args, **kwargs)
+
+    @classmethod
+    def get_filename(cls):
+        """ Gets filename of the database on disk """
+        return os.path.join(os.path.dirname(JSONStore.get_filename()), "credentials.sqlite3")
+
+    @staticmethod
+    def connect(filename):
+        """ Opens the database at filename, creating it if needed """
+        new = not os.path.exists(filename)
+        # the connection is shared by threads and stores, the database's
+        # lock makes sure only one uses it at a time
+        connection = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        if new:
+            os.chmod(filename, stat.S_IRUSR | stat.S_IWUSR)  # 0600
+
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=FULL")
+        # the primary key is the index rows are looked up by webfinger with
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS store ("
+            "webfinger TEXT NOT NULL, "
+            "key TEXT NOT NULL, "
+            "value TEXT NOT NULL, "
+            "PRIMARY KEY (webfinger, key))"
+        )
+        connection.commit()
+        return connection
+
+    def _open(self):
+        """ Returns [connection, lock, stores] of our database, connecting
+        to it if no other store has.
+        """
+        if self._database is None:
+            filename = os.path.abspath(self.filename)
+            with _databases_lock:
+                database = _databases.get(filename)
+                if database is None:
+                    database = [self.connect(filename), threading.RLock(), 0]
+                    _databases[filename] = database
+                database[2] += 1
+            self._database = database
+        return self._database
+
+    @property
+    def connection(self):
+        return self._open()[0]
+
+    def _split_key(self, key):
+        """ Returns (webfinger, key) for key in the store """
+        prefix = self.prefix or ""
+        if prefix and key.startswith(prefix + "-"):
+            return prefix, key[len(prefix) + 1:]
+        return prefix, key
+
+    def update(self, *args, **kwargs):
+        with self._lock:
+            return_value = super(SQLiteStore, self).update(*args, **kwargs)
+            self._changed()
+        return return_value
+
+    def save(self):
+        """ Writes the keys which have changed since the last save to the
+        database, in one transaction.
+        """
+        with self._lock:
+            data = dict((key, json.dumps(value)) for key, value in self.items())
+            changed = [
+                self._split_key(key) + (value,)
+                for key, value in data.items()
+                if self._saved.get(key) != value
+            ]
+            deleted = [self._split_key(key) for key in self._saved if key not in data]
+            if not changed and not deleted:
+                return
+
+            connection, lock, stores = self._open()
+            with lock, connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO store (webfinger, key, value) VALUES (?, ?, ?)",
+                    changed
+                )
+                connection.executemany(
+                    "DELETE FROM store WHERE webfinger = ? AND key = ?",
+                    deleted
+                )
+            self._saved = data
+
+    def close(self):
+        """ Saves any changes and closes the database, once no other store
+        is using it.
+        """
+        self.flush()
+        with self._lock:
+            if self._database is None:
+                return
+
+            database, self._database = self._database, None
+            with _databases_lock:
+                database[2] -= 1
+                if database[2]:
+                    return
+                _databases.pop(os.path.abspath(self.filename), None)
+
+            with database[1]:
+                database[0].close()
+
+    @classmethod
+    def load(cls, webfinger, pypump, filename=None):
+        """ Load the data of webfinger from the database """
+        store = cls(filename=filename)
         store.prefix = webfinger
+
+        connection, lock, stores = store._open()
+        with lock:
+            rows = connection.execute(
+                "SELECT key, value FROM store WHERE webfinger = ?",
+                (webfinger,)
+            ).fetchall()
+        data = dict(("{0}-{1}".format(webfinger, key), value) for key, value in rows)
+        dict.update(store, ((key, json.loads(value)) for key, value in data.items()))
+        store._saved = data
         return store
+
+    @classmethod
+    def import_json(cls, json_filename=None, filename=None, webfingers=None):
+        """ Copies everything in a :class:`JSONStore` file into the
+        database and returns the number of keys copied.
+
+        :param json_filename: JSONStore file, defaults to the one
+          JSONStore uses.
+        :param filename: database to copy to, see :class:`SQLiteStore`.
+        :param webfingers: (optional) accounts in the JSON file, worked
+          out from the ``client-key`` every account has if not given.
+
+        Example:
+            >>> SQLiteStore.import_json()
+            42
+        """
+        json_filename = json_filename or JSONStore.get_filename()
+        with open(json_filename) as fd:
+            data = json.load(fd)
+
+        if webfingers is None:
+            webfingers = [key[:-len("-client-key")] for key in data
+                          if key.endswith("-client-key") and "@" in key]
+        webfingers = set(webfingers)
+
+        rows = []
+        for key, value in data.items():
+            # longest first so "bob@example.com-1" isn't taken for "bob@example.com"
+            position = key.rfind("-")
+            while position > 0 and key[:position] not in webfingers:
+                position = key.rfind("-", 0, position)
+
+            if position > 0:
+                rows.append((key[:position], key[position + 1:], json.dumps(value)))
+            else:
+                _log.warning("Don't know which account %r is for, importing it without one", key)
+                rows.append(("", key, json.dumps(value)))
+
+        connection = cls.connect(filename or cls.get_filename())
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO store (webfinger, key, value) VALUES (?, ?, ?)",
+                    rows
+                )
+        finally:
+            connection.close()
+        return len(rows)
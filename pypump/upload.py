@@ -0,0 +1,395 @@
+##
+#   Copyright (C) 2013 Jessica T. (Tsyesika) <xray7224@googlemail.com>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program. If not, see <http://www.gnu.org/licenses/>.
+##
+
+""" Streaming request bodies for uploads """
+
+from __future__ import absolute_import
+
+import base64
+import hashlib
+import logging
+import os
+import re
+
+import requests
+import six
+from six.moves.urllib import parse
+
+from pypump.exceptions import PyPumpException
+
+_log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+RESUMABLE_CHUNK_SIZE = 4 * 1024 * 1024
+
+# server -> whether it starts resumable upload sessions
+_resumable_servers = {}
+
+
+class UploadStream(object):
+    """ File-like request body which reads source a chunk at a time so
+    uploads use the same amount of memory whatever their size.
+
+    :param source: open binary file, bytes, bytearray, memoryview or an
+      iterable of bytes.
+    :param length: size of the upload in bytes, worked out for everything
+      but iterables if not given.
+    :param progress: callable which is called with (bytes sent, length)
+      after each chunk, length is None if it isn't known.
+    :param chunk_size: bytes to read at a time.
+
+    Buffers aren't copied, chunks are sliced out of a memoryview of them.
+    """
+
+    def __init__(self, source, length=None, progress=None, chunk_size=CHUNK_SIZE):
+        self.progress = progress
+        self.chunk_size = chunk_size
+        self.sent = 0
+
+        self._view = None
+        self._file = None
+        self._file_start = None
+        self._chunks = None
+        self._buffer = b""
+        self._position = 0
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._view = memoryview(source)
+            if getattr(self._view, "format", "B") != "B" and hasattr(self._view, "cast"):
+                # count bytes, not items
+                self._view = self._view.cast("B")
+            if length is None:
+                # memoryview.nbytes is Python 3.3+
+                length = getattr(self._view, "nbytes", None)
+                if length is None:
+                    length = len(self._view) * self._view.itemsize
+        elif hasattr(source, "read"):
+            self._file = source
+            try:
+                self._file_start = source.tell()
+            except (AttributeError, IOError, OSError):
+                pass
+            if length is None:
+                length = self._get_file_length(source)
+        else:
+            self._chunks = iter(source)
+
+        if length is not None:
+            # requests takes Content-Length from this
+            self.len = length
+
+    @property
+    def length(self):
+        return getattr(self, "len", None)
+
+    @staticmethod
+    def _get_file_length(fileobj):
+        try:
+            return os.fstat(fileobj.fileno()).st_size - fileobj.tell()
+        except (AttributeError, IOError, OSError, ValueError):
+            pass
+
+        try:
+            position = fileobj.tell()
+            fileobj.seek(0, os.SEEK_END)
+            length = fileobj.tell() - position
+            fileobj.seek(position)
+            return length
+        except (AttributeError, IOError, OSError):
+            return None
+
+    def _next_chunk(self, size):
+        """ Returns up to size bytes from source, empty at the end """
+        if self._buffer:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+            return chunk
+
+        if self._view is not None:
+            chunk = self._view[self._position:self._position + size]
+            self._position += len(chunk)
+            return chunk
+
+        if self._file is not None:
+            return self._file.read(size)
+
+        for chunk in self._chunks:
+            if isinstance(chunk, six.text_type):
+                chunk = chunk.encode("utf-8")
+            if len(chunk) > size:
+                chunk, self._buffer = chunk[:size], chunk[size:]
+            if chunk:
+                return chunk
+        return b""
+
+    def rewind(self):
+        """ Goes back to the start so the body can be sent again, f.ex. when
+        the request is retried. Returns False if that can't be done, which
+        is the case for iterables and unseekable files which have been read.
+        """
+        if not self.sent and not self._buffer:
+            return True
+
+        if self._view is not None:
+            self._position = 0
+        elif self._file is not None and self._file_start is not None:
+            try:
+                self._file.seek(self._file_start)
+            except (AttributeError, IOError, OSError):
+                return False
+        else:
+            return False
+
+        self._buffer = b""
+        self.sent = 0
+        return True
+
+    def _sent(self, chunk):
+        self.sent += len(chunk)
+        if self.progress is not None:
+            self.progress(self.sent, self.length)
+
+    def __iter__(self):
+        while True:
+            chunk = self._next_chunk(self.chunk_size)
+            if not len(chunk):
+                return
+            self._sent(chunk)
+            yield chunk
+
+    def read(self, size=-1):
+        """ Reads up to size bytes, everything that's left if size is -1 """
+        if size is None or size < 0:
+            return b"".join(_to_bytes(chunk) for chunk in self)
+
+        chunk = self._next_chunk(size)
+        if len(chunk):
+            self._sent(chunk)
+        return _to_bytes(chunk)
+
+
+class ResumableUpload(object):
+    """ Uploads a file in chunks, one request per chunk, so an upload which
+    is interrupted can carry on from the last chunk the server got, even
+    from another process.
+
+    :param pump: :class:`PyPump <pypump.PyPump>` instance to use.
+    :param endpoint: uploads endpoint of the user.
+    :param filename: path to the file to upload.
+    :param mimetype: mimetype of the file.
+    :param chunk_size: bytes to send in each request.
+    :param progress: callable which is called with (bytes sent, length)
+      after each chunk.
+    :param retries: times to try again after a chunk failed without the
+      upload getting any further.
+
+    This uses the resumable upload protocol: an empty POST with
+    ``X-Upload-Content-Type`` and ``X-Upload-Content-Length`` headers
+    starts an upload session, the server replies with its URL in
+    ``Location``. Chunks are PUT to the session with ``Content-Range`` and
+    a ``Digest`` header holding the SHA-256 of the chunk, which the server
+    checks before keeping it. The server replies 308 with a ``Range``
+    header of what it has until the last chunk, then with the uploaded
+    object. An empty PUT with ``Content-Range: bytes */<length>`` asks the
+    server how much it has.
+
+    The session URL is kept in the pump's store under ``upload-<hash>``,
+    the hash is of the file's path, size and modification time so a file
+    which has changed starts again from the beginning. Whether a server
+    does resumable uploads is only found out once per process.
+    """
+
+    store_prefix = "upload-"
+
+    def __init__(self, pump, endpoint, filename, mimetype,
+                 chunk_size=RESUMABLE_CHUNK_SIZE, progress=None, retries=3):
+        self.pump = pump
+        self.endpoint = endpoint
+        self.filename = filename
+        self.mimetype = mimetype
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.retries = retries
+
+        stat = os.stat(filename)
+        self.length = stat.st_size
+
+        key = "{0}:{1}:{2}".format(os.path.abspath(filename), stat.st_size, stat.st_mtime)
+        self.store_key = self.store_prefix + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+    @property
+    def session_url(self):
+        """ URL of the upload session in progress, None if there isn't one """
+        if self.store_key in self.pump.store:
+            return self.pump.store[self.store_key]["url"]
+        return None
+
+    def _save(self, url, offset):
+        self.pump.store[self.store_key] = {"url": url, "offset": offset, "length": self.length}
+
+    def _forget(self):
+        if self.store_key in self.pump.store:
+            del self.pump.store[self.store_key]
+
+    def start(self):
+        """ Starts an upload session and returns its URL, None if the
+        server doesn't do resumable uploads.
+        """
+        server = parse.urlparse(self.pump._build_url(self.endpoint)).netloc
+        if _resumable_servers.get(server) is False:
+            return None
+
+        headers = {
+            "X-Upload-Content-Type": self.mimetype,
+            "X-Upload-Content-Length": str(self.length),
+            "Content-Length": "0",
+        }
+        try:
+            response = self.pump._make_request(self.endpoint, method="POST", data=b"", headers=headers)
+        except PyPumpException as e:
+            _log.info("Server didn't start a resumable upload: %s", e)
+            _resumable_servers[server] = False
+            return None
+
+        location = response.headers.get("Location")
+        _resumable_servers[server] = bool(location)
+        if not location:
+            self._delete_probe(response)
+            return None
+
+        url = parse.urljoin(self.pump._build_url(self.endpoint), location)
+        self._save(url, 0)
+        return url
+
+    def _delete_probe(self, response):
+        """ Deletes what a server which doesn't do resumable uploads made
+        of the empty request asking it to start one, f.ex. pump.io makes
+        an empty upload object which would never be posted.
+        """
+        try:
+            data = response.json()
+        except ValueError:
+            return
+        url = data.get("id") if isinstance(data, dict) else None
+        if not url or "://" not in url:
+            return
+
+        _log.debug("Deleting empty upload %s", url)
+        try:
+            self.pump._make_request(url, method="DELETE", raw=True)
+        except (PyPumpException, requests.exceptions.RequestException) as e:
+            _log.warning("Failed to delete empty upload %s: %s", url, e)
+
+    def _get_range(self, response):
+        """ Returns (offset, uploaded object) from a response to a PUT """
+        if response.status_code in (200, 201):
+            return self.length, response.json()
+
+        match = re.match(r"bytes=(\d+)-(\d+)", response.headers.get("Range", ""))
+        if match is None:
+            return 0, None
+        return int(match.group(2)) + 1, None
+
+    def get_offset(self, url):
+        """ Asks the server how many bytes of the upload it has, returns
+        (offset, uploaded object) where the object is None until the
+        upload has finished.
+        """
+        headers = {
+            "Content-Range": "bytes */{0}".format(self.length),
+            "Content-Length": "0",
+        }
+        response = self.pump._make_request(url, method="PUT", data=b"", raw=True, headers=headers)
+        return self._get_range(response)
+
+    def send_chunk(self, url, offset, chunk):
+        """ Sends chunk starting at offset, returns like :meth:`get_offset` """
+        digest = base64.b64encode(hashlib.sha256(chunk).digest()).decode("ascii")
+        headers = {
+            "Content-Type": self.mimetype,
+            "Content-Length": str(len(chunk)),
+            "Content-Range": "bytes {0}-{1}/{2}".format(offset, offset + len(chunk) - 1, self.length),
+            "Digest": "SHA-256={0}".format(digest),
+        }
+        response = self.pump._make_request(url, method="PUT", data=chunk, raw=True, headers=headers)
+        return self._get_range(response)
+
+    def run(self):
+        """ Uploads the file, carrying on from where an earlier upload of
+        it got to. Returns the uploaded object, or None if the server
+        doesn't do resumable uploads.
+        """
+        if not self.length:
+            return None
+
+        url = self.session_url
+        file_data = None
+        if url is not None:
+            try:
+                offset, file_data = self.get_offset(url)
+                _log.info("Resuming upload of %s at byte %s", self.filename, offset)
+            except (PyPumpException, requests.exceptions.RequestException) as e:
+                _log.info("Can't resume upload of %s, starting again: %s", self.filename, e)
+                self._forget()
+                url = None
+
+        if url is None:
+            url = self.start()
+            if url is None:
+                return None
+            offset = 0
+
+        failures = 0
+        resync = False
+        with open(self.filename, "rb") as fileobj:
+            while file_data is None:
+                try:
+                    if resync:
+                        # find out what the server got of the failed chunk
+                        offset, file_data = self.get_offset(url)
+                        resync = False
+                        if file_data is not None:
+                            break
+
+                    fileobj.seek(offset)
+                    chunk = fileobj.read(self.chunk_size)
+                    sent, file_data = self.send_chunk(url, offset, chunk)
+                    if sent <= offset and file_data is None:
+                        raise PyPumpException("Server didn't keep bytes {0}-{1} of upload".format(
+                            offset, offset + len(chunk) - 1))
+                except (PyPumpException, requests.exceptions.RequestException) as e:
+                    failures += 1
+                    if failures > self.retries:
+                        raise
+                    _log.warning("Failed to send chunk at byte %s of %s: %s", offset, self.filename, e)
+                    resync = True
+                    continue
+
+                failures = 0
+                offset = sent
+                if file_data is None:
+                    self._save(url, offset)
+                if self.progress is not None:
+                    self.progress(offset, self.length)
+
+        self._forget()
+        return file_data
+
+
+def _to_bytes(chunk):
+    if isinstance(chunk, memoryview):
+        return chunk.tobytes()
+    return bytes(chunk)
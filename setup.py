@@ -31,6 +31,8 @@ install_requires = [
 tests_require = None
 
 if version_info[0] == 2:
+    # concurrent.futures backport
+    install_requires.append("futures>=3.0")
     tests_require = [
         "mock",
     ]
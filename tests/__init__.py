@@ -11,11 +11,16 @@ from pypump import WebPump, PyPump, Client, AbstractStore
 
 class Response(object):
 
-    def __init__(self, url, data, params=None, status_code=200):
+    def __init__(self, url, data, params=None, status_code=200, headers=None):
         self.url = url
         self.data = data
         self.status_code = status_code
         self.params = params or {}
+        self.headers = headers or {}
+
+    @property
+    def ok(self):
+        return self.status_code < 400
 
     def __getitem__(self, key):
         return self.json()[key]
@@ -27,7 +32,9 @@ class Response(object):
 
     @property
     def content(self):
-        return self.data
+        if isinstance(self.data, six.string_types):
+            return self.data
+        return json.dumps(self.data)
 
 
 class Bucket(object):
@@ -131,10 +138,16 @@ class TestMixin(object):
 
     def _requester(self, *args, **kwargs):
         """ Instead of requesting to a pump server we'll return the data we've been given """
+        data = kwargs.get("data", None)
+        if hasattr(data, "read"):
+            # streamed request body, read it like it's being sent
+            data = data.read()
+
         self._testcase.requests.append(Response(
-            url=kwargs.get("endpoint", None),
-            data=kwargs.get("data", None),
-            params=kwargs.get("params", None)
+            url=kwargs.get("endpoint", args[1] if len(args) > 1 else None),
+            data=data,
+            params=kwargs.get("params", None),
+            headers=kwargs.get("headers", None),
         ))
         return self._response
 
@@ -149,3 +149,23 @@ class ActivityTest(PyPumpTest):
 
         self.assertTrue(isinstance(activity.obj, PumpObject))
         self.assertEqual(activity.obj.deleted, parse(data['object']['deleted']))
+
+    def test_lazy_objects(self):
+        """ Activity with lazy_objects should make nested objects when used """
+        self.pump.lazy_objects = True
+        activity = Activity(pypump=self.pump).unserialize(self.response.data)
+
+        for key in ["actor", "obj", "generator", "_to", "_cc"]:
+            self.assertFalse(key in activity.__dict__)
+
+        self.assertEqual(activity.verb, "post")
+        self.assertTrue(isinstance(activity.actor, type(self.pump.Person())))
+        self.assertEqual(activity.actor.id, self.response["actor"]["id"])
+        self.assertTrue(isinstance(activity.generator, Application))
+        self.assertEqual(activity.obj.id, self.response["object"]["id"])
+        self.assertEqual(activity.obj.author.id, self.response["actor"]["id"])
+        self.assertEqual(activity.to[0].id, self.response["to"][0]["id"])
+        self.assertFalse("_cc" in activity.__dict__)
+
+        # made once, then kept
+        self.assertTrue(activity.actor is activity.actor)
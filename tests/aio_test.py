@@ -0,0 +1,248 @@
+from __future__ import absolute_import
+
+import json
+import sys
+import threading
+import unittest
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+import tests
+from pypump import Client, PyPump
+from pypump.models.feed import Feed
+from tests import PyPumpTest
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from pypump import AsyncPyPump
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio front end needs Python 3.5+")
+class AsyncPyPumpTest(PyPumpTest):
+
+    def setUp(self):
+        super(AsyncPyPumpTest, self).setUp()
+        self.aio = AsyncPyPump(pump=self.pump)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        self.note_data = {
+            "verb": "post",
+            "actor": {"objectType": "person", "id": "acct:test@example.com"},
+            "object": {
+                "objectType": "note",
+                "id": "https://example.com/api/note/abc",
+                "content": "Hello world!",
+            },
+        }
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_request(self):
+        self.response.data = {"id": "acct:test@example.com", "objectType": "person"}
+
+        data = self.run_async(self.aio.request("api/user/test/profile"))
+        self.assertEqual(data["id"], "acct:test@example.com")
+        self.assertEqual(len(self.requests), 1)
+
+    def test_send(self):
+        self.response.data = self.note_data
+        note = self.aio.Note("Hello world!")
+
+        self.run_async(note.send())
+        self.assertEqual(self.request["verb"], "post")
+        self.assertEqual(note.id, self.note_data["object"]["id"])
+
+    def test_nested_calls_run_synchronously(self):
+        """ Note.comment() calls Comment.send() on the executor thread """
+        self.response.data = self.note_data
+        note = self.aio.Note("Hello world!")
+        note.id = self.note_data["object"]["id"]
+
+        self.run_async(note.comment("I agree!"))
+        self.assertEqual(self.request["object"]["objectType"], "comment")
+        self.assertEqual(self.request["object"]["inReplyTo"]["id"], note.id)
+
+    def test_models_share_unserialize(self):
+        note = self.aio.Note().unserialize(self.note_data["object"])
+        self.assertTrue(isinstance(note, type(self.pump.Note())))
+        self.assertEqual(note.content, "Hello world!")
+
+    def test_async_for(self):
+        self.response.data = {
+            "url": "https://example.com/api/user/test/followers",
+            "objectTypes": ["person"],
+            "items": [{"objectType": "person", "id": "acct:test%d@example.com" % i} for i in range(5)],
+            "totalItems": 5,
+            "links": {},
+        }
+        feed = Feed(self.response.data["url"], pypump=self.pump)
+
+        ids = []
+        items = feed.__aiter__()
+        while True:
+            try:
+                ids.append(self.run_async(items.__anext__()).id)
+            except StopAsyncIteration:
+                break
+
+        self.assertEqual(ids, [item["id"] for item in self.response.data["items"]])
+
+    def test_wrapped_pump_unchanged(self):
+        """ The wrapped pump's models stay blocking """
+        self.response.data = self.note_data
+        self.assertTrue(type(self.pump.Note()) is not type(self.aio.Note()))
+
+        self.pump.Note("Hello world!").send()
+        self.assertEqual(self.request["verb"], "post")
+
+
+class StubServer(object):
+    """ Minimal pump.io server on localhost for the asyncio tests """
+
+    def __init__(self):
+        self.profiles_served = 0
+        self.posted = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, data, status=200):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                if parts[:2] != ["api", "user"] or len(parts) != 4:
+                    return self.send_json({"error": "Not found"}, 404)
+
+                nickname, what = parts[2], parts[3]
+                if nickname == "missing":
+                    return self.send_json({"error": "No such user"}, 404)
+                if what == "profile":
+                    server.profiles_served += 1
+                    return self.send_json(server.profile(nickname))
+                if what == "inbox":
+                    return self.send_json(server.inbox(nickname))
+                self.send_json({"error": "Not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                activity = json.loads(self.rfile.read(length).decode("utf-8"))
+                server.posted.append(activity)
+                activity["object"]["id"] = "{0}/api/note/{1}".format(server.url, len(server.posted))
+                activity["actor"] = server.profile("test")
+                self.send_json(activity)
+
+        self.httpd = HTTPServer(("127.0.0.1", 0), Handler)
+        self.host = "127.0.0.1:{0}".format(self.httpd.server_address[1])
+        self.url = "http://" + self.host
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def profile(self, nickname):
+        base = "{0}/api/user/{1}".format(self.url, nickname)
+        return {
+            "objectType": "person",
+            "id": "acct:{0}@{1}".format(nickname, self.host),
+            "preferredUsername": nickname,
+            "displayName": nickname.capitalize(),
+            "links": {
+                "self": {"href": base + "/profile"},
+                "activity-inbox": {"href": base + "/inbox"},
+                "activity-outbox": {"href": base + "/feed"},
+            },
+        }
+
+    def inbox(self, nickname):
+        items = [{
+            "objectType": "activity",
+            "verb": "post",
+            "id": "{0}/api/activity/{1}".format(self.url, i),
+            "actor": self.profile("alice"),
+            "object": {"objectType": "note", "id": "{0}/api/note/{1}".format(self.url, i),
+                       "content": "Note {0}".format(i)},
+        } for i in range(3)]
+        return {
+            "url": "{0}/api/user/{1}/inbox".format(self.url, nickname),
+            "objectTypes": ["activity"],
+            "items": items,
+            "totalItems": len(items),
+            "links": {},
+        }
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio front end needs Python 3.5+")
+class AsyncLocalServerTest(unittest.TestCase):
+    """ AsyncPyPump making real HTTP requests to a local server """
+
+    def setUp(self):
+        self.server = StubServer()
+        webfinger = "test@" + self.server.host
+        client = Client(webfinger=webfinger, type="native", name="PumpTest",
+                        key="AKey", secret="ASecret")
+        pump = PyPump(client=client, verifier_callback=None,
+                      store=tests.TestStore.load(webfinger, None))
+        pump.set_http()
+
+        self.aio = AsyncPyPump(pump=pump)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+        self.aio.close()
+        self.server.close()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_people(self):
+        webfingers = ["alice@" + self.server.host, "bob@" + self.server.host,
+                      "missing@" + self.server.host]
+        people = self.run_async(self.aio.people(webfingers, workers=2))
+
+        self.assertEqual(self.server.profiles_served, 2)
+        self.assertEqual([person.display_name for person in people[:2]], ["Alice", "Bob"])
+        self.assertEqual(people[2].webfinger, "missing@" + self.server.host)
+
+    def test_send_many(self):
+        notes = [self.aio.Note("Note {0}".format(i)) for i in range(5)]
+        results = self.run_async(self.aio.send_many(notes, concurrency=3))
+
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(len(self.server.posted), 5)
+        self.assertEqual(sorted(note.id for note in notes),
+                         sorted("{0}/api/note/{1}".format(self.server.url, i) for i in range(1, 6)))
+
+    def test_me_inbox(self):
+        """ Lazy profile attributes are fetched straight away """
+        activities = []
+        items = self.aio.me.inbox.__aiter__()
+        while True:
+            try:
+                activities.append(self.run_async(items.__anext__()))
+            except StopAsyncIteration:
+                break
+
+        self.assertEqual([activity.obj.content for activity in activities],
+                         ["Note 0", "Note 1", "Note 2"])
+        self.assertEqual(self.server.profiles_served, 1)
+        self.assertEqual(self.aio.me.display_name, "Test")
@@ -0,0 +1,100 @@
+from __future__ import absolute_import
+
+import threading
+import time
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from pypump.exceptions import PyPumpException
+from tests import PyPumpTest, Response
+
+
+class SendManyTest(PyPumpTest):
+
+    def setUp(self):
+        super(SendManyTest, self).setUp()
+        self.response.data = {
+            "verb": "post",
+            "actor": {"objectType": "person", "id": "acct:test@example.com"},
+            "object": {
+                "objectType": "note",
+                "id": "https://example.com/api/note/abc",
+                "content": "Hello world!",
+            },
+        }
+
+    def test_send_objects(self):
+        notes = [self.pump.Note("Note %d" % i) for i in range(10)]
+        results = self.pump.send_many(notes, concurrency=4)
+
+        self.assertEqual(len(self.requests), 10)
+        self.assertEqual([result.item for result in results], notes)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(
+            sorted(request["object"]["content"] for request in self.requests),
+            sorted("Note %d" % i for i in range(10))
+        )
+
+    def test_send_activities(self):
+        activity = {"verb": "follow", "object": {"objectType": "person", "id": "acct:bob@example.com"}}
+        results = self.pump.send_many([activity])
+
+        self.assertTrue(results[0].ok)
+        self.assertEqual(self.request.url, "https://example.com/api/user/Test/feed")
+        self.assertEqual(self.request["verb"], "follow")
+
+    def test_results(self):
+        def fail():
+            raise PyPumpException("Nope")
+
+        note = self.pump.Note("Hello")
+        results = self.pump.send_many([fail, note])
+
+        self.assertFalse(results[0].ok)
+        self.assertTrue(isinstance(results[0].error, PyPumpException))
+        self.assertTrue(results[1].ok)
+        self.assertTrue(results[1].result is note)
+
+    def test_same_object_in_order(self):
+        """ Items for one object are sent one after another, in order """
+        note = self.pump.Note("Hello")
+        calls = []
+        running = []
+        lock = threading.Lock()
+
+        def step(name):
+            def fnc():
+                with lock:
+                    running.append(name)
+                    overlap = len(running) > 1
+                time.sleep(0.01)
+                with lock:
+                    running.remove(name)
+                    calls.append(name)
+                return overlap
+            fnc.__self__ = note
+            return fnc
+
+        results = self.pump.send_many([step("post"), step("update"), step("like")], concurrency=3)
+
+        self.assertEqual(calls, ["post", "update", "like"])
+        self.assertFalse(any(result.result for result in results))
+
+    def test_rate_limit(self):
+        """ Requests are tried again after Retry-After when rate limited """
+        responses = [
+            Response(url=None, data={}, status_code=429, headers={"Retry-After": "7"}),
+            Response(url=None, data={"ok": True}),
+        ]
+        waits = []
+
+        with mock.patch.object(self.pump, "_requester", lambda *a, **k: responses.pop(0)):
+            with mock.patch("pypump.pypump.time.sleep", waits.append):
+                data = self.pump.request("/api/user/Test/feed", method="POST", data={})
+
+        self.assertEqual(data, {"ok": True})
+        self.assertEqual(len(waits), 1)
+        self.assertTrue(6 < waits[0] <= 7)
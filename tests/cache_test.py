@@ -0,0 +1,296 @@
+from __future__ import absolute_import
+
+import io
+import os
+import shutil
+import tempfile
+
+import requests
+
+from pypump import ProfileCache, DiskProfileCache, HTTPCache, MediaCache
+from tests import PyPumpTest
+from tests.download_test import FileServer
+
+
+class ProfileCacheTest(PyPumpTest):
+
+    def setUp(self):
+        super(ProfileCacheTest, self).setUp()
+        self.response.data = {
+            "objectType": "person",
+            "id": "acct:TestUser@example.com",
+            "preferredUsername": "TestUser",
+            "displayName": "Test Userson",
+        }
+        self.response.headers = {
+            "ETag": '"abc123"',
+            "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT",
+        }
+        self.pump.profile_cache = ProfileCache(ttl=60)
+
+    def test_profile_is_cached(self):
+        """ Test people with the same webfinger share one request """
+        first = self.pump.Person("TestUser@example.com")
+        self.assertEqual(first.display_name, "Test Userson")
+        second = self.pump.Person("TestUser@example.com")
+        self.assertEqual(second.display_name, "Test Userson")
+
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.pump.profile_cache.misses, 1)
+        self.assertEqual(self.pump.profile_cache.hits, 1)
+
+    def test_revalidate(self):
+        """ Test stale profiles are requested with If-None-Match """
+        cache = self.pump.profile_cache
+        self.pump.Person("TestUser@example.com").load()
+
+        cache.ttl = 0
+        self.response.status_code = 304
+        person = self.pump.Person("TestUser@example.com").load()
+
+        self.assertEqual(person.display_name, "Test Userson")
+        self.assertEqual(self.request.headers["If-None-Match"], '"abc123"')
+        self.assertEqual(self.request.headers["If-Modified-Since"], "Wed, 21 Oct 2015 07:28:00 GMT")
+        self.assertEqual(cache.revalidated, 1)
+
+    def test_lru(self):
+        """ Test least recently used profiles are dropped """
+        cache = ProfileCache(size=2)
+        cache.set("a", {})
+        cache.set("b", {})
+        cache.get("a")
+        cache.set("c", {})
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get("b"), None)
+        self.assertNotEqual(cache.get("a"), None)
+
+    def test_disk_cache(self):
+        """ Test profiles are kept on disk between caches """
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+
+        self.pump.profile_cache = DiskProfileCache(path=path)
+        self.pump.Person("TestUser@example.com").load()
+
+        self.pump.profile_cache = DiskProfileCache(path=path)
+        person = self.pump.Person("TestUser@example.com").load()
+        self.assertEqual(person.display_name, "Test Userson")
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.pump.profile_cache.hits, 1)
+
+
+class HTTPCacheTest(PyPumpTest):
+
+    def setUp(self):
+        super(HTTPCacheTest, self).setUp()
+        self.response.data = {
+            "url": "https://example.com/api/user/Test/inbox",
+            "objectTypes": ["activity"],
+            "items": [],
+            "totalItems": 0,
+            "links": {},
+        }
+        self.response.headers = {"ETag": 'W/"abc123"', "Cache-Control": "max-age=60"}
+        self.pump.http_cache = HTTPCache()
+
+    def test_fresh_response(self):
+        """ Test fresh responses are used without a request """
+        first = self.pump.request("/api/user/Test/inbox", params={"count": 20})
+        second = self.pump.request("/api/user/Test/inbox", params={"count": 20})
+
+        self.assertEqual(first, second)
+        self.assertFalse(first is second)
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.pump.http_cache.hits, 1)
+
+        # different query string
+        self.pump.request("/api/user/Test/inbox", params={"count": 40})
+        self.assertEqual(len(self.requests), 2)
+
+    def test_list_params(self):
+        """ Repeated query parameters can be kept """
+        params = {"type": ["note", "image"], "count": 20}
+        self.pump.request("/api/user/Test/inbox", params=params)
+        self.pump.request("/api/user/Test/inbox", params=params)
+        self.assertEqual(len(self.requests), 1)
+
+        self.pump.request("/api/user/Test/inbox", params={"type": ["note"], "count": 20})
+        self.assertEqual(len(self.requests), 2)
+
+    def test_vary(self):
+        """ Responses depending on request headers aren't kept """
+        self.response.headers = {"Cache-Control": "max-age=60", "Vary": "Accept"}
+        self.pump.request("/api/user/Test/inbox")
+        self.assertEqual(len(self.pump.http_cache), 0)
+
+        self.response.headers = {"Cache-Control": "max-age=60", "Vary": "Accept-Encoding"}
+        self.pump.request("/api/user/Test/inbox")
+        self.assertEqual(len(self.pump.http_cache), 1)
+
+    def test_conditional_request(self):
+        """ Test stale responses are revalidated and used on 304 """
+        self.response.headers = {"ETag": 'W/"abc123"', "Cache-Control": "no-cache"}
+        self.pump.request("/api/user/Test/inbox")
+
+        self.response.status_code = 304
+        data = self.pump.request("/api/user/Test/inbox")
+
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.request.headers["If-None-Match"], 'W/"abc123"')
+        self.assertEqual(data["url"], "https://example.com/api/user/Test/inbox")
+        self.assertEqual(self.pump.http_cache.revalidated, 1)
+
+    def test_not_cached(self):
+        """ Test POST and no-store responses aren't kept """
+        self.pump.request("/api/user/Test/feed", method="POST", data={})
+        self.response.headers = {"Cache-Control": "no-store"}
+        self.pump.request("/api/user/Test/inbox")
+
+        self.assertEqual(len(self.pump.http_cache), 0)
+
+    def test_max_size(self):
+        """ Test least recently used responses are dropped """
+        size = len(self.response.content)
+        self.pump.http_cache.max_size = size * 2
+
+        for url in ["/api/a", "/api/b", "/api/a", "/api/c"]:
+            self.pump.request(url)
+
+        cache = self.pump.http_cache
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.size, size * 2)
+        self.assertEqual([key[0] for key in cache._entries],
+                         ["https://example.com/api/a", "https://example.com/api/c"])
+
+
+class MediaCacheTest(PyPumpTest):
+
+    def setUp(self):
+        super(MediaCacheTest, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.data = open(self.bucket.path_to_png, "rb").read()
+        self.pump.media_cache = MediaCache(self.path)
+        self.server = self.pump._requester = FileServer(self, self.data)
+        self.image = self.pump.Image().unserialize({
+            "objectType": "image",
+            "id": "https://example.com/api/image/abc",
+            "image": {"url": "https://example.com/uploads/test/image_thumb.png"},
+            "fullImage": {"url": "https://example.com/uploads/test/image.png"},
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_download_once(self):
+        """ Files are only downloaded the first time """
+        target = os.path.join(self.path, "image.png")
+        for i in range(3):
+            self.assertEqual(self.image.thumbnail.download(target), len(self.data))
+            self.assertEqual(open(target, "rb").read(), self.data)
+
+        self.assertEqual(b"".join(self.image.thumbnail.iter_content(chunk_size=1000)), self.data)
+        self.assertEqual(b"".join(self.image.thumbnail.iter_content(start=100)), self.data[100:])
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.pump.media_cache.hits, 4)
+
+    def test_download_resumes(self):
+        """ resume and preallocate work as without a cache, the file is kept once it's finished """
+        target = os.path.join(self.path, "image.png")
+        self.server.fail_after = 10000
+        self.assertRaises(requests.exceptions.ConnectionError,
+                          self.image.thumbnail.download, target, chunk_size=1000, preallocate=True)
+        self.assertEqual(os.path.getsize(target + ".part"), 10000)
+        self.assertEqual(self.pump.media_cache.get(self.image.thumbnail.url), None)
+
+        self.assertEqual(self.image.thumbnail.download(target), len(self.data) - 10000)
+        self.assertEqual(self.request.headers["Range"], "bytes=10000-")
+        self.assertEqual(open(self.pump.media_cache.get(self.image.thumbnail.url), "rb").read(), self.data)
+
+        os.remove(target)
+        self.assertEqual(self.image.thumbnail.download(target, preallocate=True), len(self.data))
+        self.assertEqual(open(target, "rb").read(), self.data)
+        self.assertEqual(len(self.requests), 2)
+
+    def test_open(self):
+        data = self.image.thumbnail.open()
+        self.assertEqual(data[:], self.data)
+        data.close()
+
+        fileobj = io.BytesIO()
+        self.image.thumbnail.download(fileobj)
+        self.assertEqual(fileobj.getvalue(), self.data)
+        self.assertEqual(len(self.requests), 1)
+
+    def test_content_addressed(self):
+        """ The same file at two URLs is only kept once """
+        self.image.thumbnail.open().close()
+        self.image.original.open().close()
+
+        cache = self.pump.media_cache
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(cache.size, len(self.data))
+        self.assertEqual(MediaCache(self.path).size, len(self.data))
+        self.assertEqual(cache.get(self.image.thumbnail.url), cache.get(self.image.original.url))
+
+    def test_evict(self):
+        """ Least recently used files are removed to stay under max_size """
+        cache = MediaCache(self.path, max_size=25)
+        first = cache.put("https://example.com/1", [b"a" * 10])
+        cache.put("https://example.com/2", [b"b" * 10])
+        os.utime(first, (0, 0))
+        cache.get("https://example.com/2")
+        cache.put("https://example.com/3", [b"c" * 10])
+
+        self.assertEqual(cache.get("https://example.com/1"), None)
+        self.assertEqual(open(cache.get("https://example.com/3"), "rb").read(), b"c" * 10)
+        self.assertEqual(cache.size, 20)
+
+    def test_bigger_than_cache(self):
+        """ Files bigger than max_size are passed through without being kept """
+        cache = self.pump.media_cache = MediaCache(self.path, max_size=5)
+        self.assertEqual(cache.put("https://example.com/1", [b"a" * 10]), None)
+        self.assertEqual(cache.size, 0)
+
+        self.assertEqual(cache.fetch(self.pump, self.image.thumbnail.url), None)
+        self.assertEqual(self.server.responses[-1].closed, True)
+
+        data = self.image.thumbnail.open()
+        self.assertEqual(data[:], self.data)
+        data.close()
+        self.assertEqual(b"".join(self.image.thumbnail.iter_content()), self.data)
+        self.assertEqual(cache.get(self.image.thumbnail.url), None)
+        self.assertEqual(sorted(os.listdir(self.path)), ["objects", "urls"])
+
+    def test_iter_content_streams(self):
+        """ Files are kept while they're streamed, not before """
+        cache = self.pump.media_cache
+        chunks = self.image.thumbnail.iter_content(chunk_size=100)
+        self.assertEqual(next(chunks), self.data[:100])
+        self.assertEqual(cache.get(self.image.thumbnail.url), None)
+
+        self.assertEqual(self.data[:100] + b"".join(chunks), self.data)
+        self.assertEqual(open(cache.get(self.image.thumbnail.url), "rb").read(), self.data)
+
+        # stopping part way doesn't keep anything
+        chunks = self.image.original.iter_content(chunk_size=100)
+        next(chunks)
+        chunks.close()
+        self.assertEqual(cache.get(self.image.original.url), None)
+        self.assertEqual([name for name in os.listdir(self.path) if name.endswith(".tmp")], [])
+
+    def test_failed_download(self):
+        """ Half downloaded files aren't kept """
+        self.server.fail_after = 10000
+        cache = self.pump.media_cache
+        self.assertRaises(requests.exceptions.ConnectionError, cache.fetch,
+                          self.pump, self.image.thumbnail.url, chunk_size=1000)
+        self.assertEqual(self.pump.media_cache.get(self.image.thumbnail.url), None)
+        self.assertEqual([name for name in os.listdir(self.path) if name.endswith(".tmp")], [])
+
+    def test_clear(self):
+        self.image.thumbnail.open().close()
+        self.pump.media_cache.clear()
+        self.assertEqual(self.pump.media_cache.size, 0)
+        self.image.thumbnail.open().close()
+        self.assertEqual(len(self.requests), 2)
@@ -1,7 +1,10 @@
 from __future__ import absolute_import
 
+import threading
+import time
+
 from pypump import Client
-from tests import PyPumpTest
+from tests import PyPumpTest, Response
 
 
 class ClientTest(PyPumpTest):
@@ -77,3 +80,110 @@ class ClientTest(PyPumpTest):
 
         self.assertEqual(self.request["type"], "client_update")
         self.assertEqual(self.request["application_type"], "native")
+
+
+class RemoteClientTest(PyPumpTest):
+    """ Test clients registered with other servers are kept """
+    def setUp(self):
+        super(RemoteClientTest, self).setUp()
+
+        self.response.data = {
+            "client_id": "RemoteKey",
+            "client_secret": "RemoteSecret",
+            "expires_at": 0,
+        }
+
+    def new_pump(self):
+        return type(self.pump)(response=self.response, testcase=self, store=self.pump.store)
+
+    def registrations(self):
+        return [r for r in self.requests if r.url.endswith("/api/client/register")]
+
+    def test_saved(self):
+        """ Clients are registered once and reloaded on startup """
+        self.pump.setup_oauth_client("https://remote.example/api/user/bob/profile")
+        self.assertEqual(len(self.registrations()), 1)
+        self.assertEqual(self.pump.store["remote-clients"], {
+            "remote.example": {"key": "RemoteKey", "secret": "RemoteSecret", "expirey": 0},
+        })
+
+        pump = self.new_pump()
+        auth = pump.setup_oauth_client("https://remote.example/api/user/bob/profile")
+        self.assertEqual(auth.client.client_key, "RemoteKey")
+        self.assertEqual(len(self.registrations()), 1)
+
+    def test_expired(self):
+        self.pump.store["remote-clients"] = {
+            "remote.example": {"key": "OldKey", "secret": "OldSecret", "expirey": time.time() - 10},
+        }
+        pump = self.new_pump()
+        auth = pump.setup_oauth_client("https://remote.example/api/user/bob/profile")
+
+        self.assertEqual(auth.client.client_key, "RemoteKey")
+        self.assertEqual(len(self.registrations()), 1)
+        self.assertEqual(pump.store["remote-clients"]["remote.example"]["key"], "RemoteKey")
+
+    def test_refused(self):
+        """ A client the server refuses is dropped and registered again """
+        self.pump.store["remote-clients"] = {
+            "remote.example": {"key": "RevokedKey", "secret": "RevokedSecret", "expirey": 0},
+        }
+        pump = self.new_pump()
+        keys = []
+
+        def server(fnc, endpoint, raw=False, **kwargs):
+            if endpoint.endswith("/api/client/register"):
+                self.requests.append(Response(url=endpoint, data=kwargs.get("data")))
+                return self.response
+            keys.append(kwargs["auth"].client.client_key)
+            if kwargs["auth"].client.client_key == "RevokedKey":
+                return Response(url=endpoint, data={"error": "Invalid client"}, status_code=401)
+            return Response(url=endpoint, data={"objectType": "person"})
+
+        pump._requester = server
+        data = pump.request("https://remote.example/api/user/bob/profile")
+
+        self.assertEqual(data, {"objectType": "person"})
+        self.assertEqual(keys, ["RevokedKey", "RemoteKey"])
+        self.assertEqual(len(self.registrations()), 1)
+        self.assertEqual(pump.store["remote-clients"]["remote.example"]["key"], "RemoteKey")
+
+    def test_expired_while_running(self):
+        self.pump.setup_oauth_client("https://remote.example/api/user/bob/profile")
+        self.pump._server_cache["remote.example"].expirey = time.time() - 10
+
+        self.response.data = dict(self.response.data, client_id="NewKey")
+        auth = self.pump.setup_oauth_client("https://remote.example/api/user/bob/profile")
+        self.assertEqual(auth.client.client_key, "NewKey")
+        self.assertEqual(len(self.registrations()), 2)
+
+    def test_register_once(self):
+        """ Threads needing a client for a server only register it once """
+        threads = [threading.Thread(target=self.pump.setup_oauth_client,
+                                    args=("https://remote.example/api/user/bob/profile",))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.registrations()), 1)
+
+    def test_preregister(self):
+        self.pump.preregister(["one.example", "two.example", "example.com"]).join()
+
+        self.assertEqual([r.url for r in self.registrations()], [
+            "https://one.example/api/client/register",
+            "https://two.example/api/client/register",
+        ])
+        self.assertEqual(sorted(self.pump.store["remote-clients"]), ["one.example", "two.example"])
+
+        self.requests[:] = []
+        type(self.pump)(response=self.response, testcase=self, store=self.pump.store,
+                        preregister_servers=["one.example", "three.example"])
+        for thread in threading.enumerate():
+            if thread.name == "PyPump preregister":
+                thread.join()
+        self.assertEqual([r.url for r in self.registrations()], [
+            "https://three.example/api/client/register",
+        ])
@@ -0,0 +1,159 @@
+from __future__ import absolute_import
+
+import io
+import os
+import re
+import shutil
+import tempfile
+
+import requests
+
+from pypump.exceptions import PyPumpException
+from tests import PyPumpTest, Response
+
+
+class StreamedResponse(Response):
+
+    def __init__(self, url, data, fail_after=None, **kwargs):
+        super(StreamedResponse, self).__init__(url, data, **kwargs)
+        self.fail_after = fail_after
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.data), chunk_size):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise requests.exceptions.ConnectionError("Connection reset by peer")
+            yield self.data[i:i + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+class FileServer(object):
+    """ Stub server for a file which does Range requests """
+
+    def __init__(self, testcase, data, ranges=True, fail_after=None):
+        self.testcase = testcase
+        self.data = data
+        self.ranges = ranges
+        self.fail_after = fail_after
+        self.responses = []
+
+    def __call__(self, fnc, endpoint, raw=False, **kwargs):
+        headers = kwargs.get("headers") or {}
+        self.testcase.requests.append(Response(url=endpoint, data=None, headers=headers))
+        self.testcase.assertTrue(kwargs.get("stream"))
+        self.testcase.assertTrue(kwargs.get("auth") is not None)
+
+        start = 0
+        match = re.match(r"bytes=(\d+)-", headers.get("Range", ""))
+        if match and self.ranges:
+            start = int(match.group(1))
+            if start >= len(self.data):
+                response = StreamedResponse(endpoint, "", status_code=416)
+                self.responses.append(response)
+                return response
+            response = StreamedResponse(endpoint, self.data[start:], status_code=206, headers={
+                "Content-Range": "bytes {0}-{1}/{2}".format(start, len(self.data) - 1, len(self.data)),
+            })
+        else:
+            response = StreamedResponse(endpoint, self.data, headers={
+                "Content-Length": str(len(self.data)),
+            })
+
+        response.fail_after, self.fail_after = self.fail_after, None
+        self.responses.append(response)
+        return response
+
+
+class DownloadTest(PyPumpTest):
+
+    def setUp(self):
+        super(DownloadTest, self).setUp()
+        self.data = open(self.bucket.path_to_png, "rb").read()
+        self.video = self.pump.Video().unserialize({
+            "objectType": "video",
+            "id": "https://example.com/api/video/abc",
+            "stream": {
+                "url": "https://example.com/uploads/test/video.webm",
+                "pump_io": {"proxyURL": "https://example.com/api/proxy/abc"},
+            },
+        })
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "video.webm")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_download_file(self):
+        server = self.pump._requester = FileServer(self, self.data)
+        progress = []
+        written = self.video.stream.download(self.path, chunk_size=10000,
+                                             progress=lambda done, total: progress.append((done, total)))
+
+        self.assertEqual(written, len(self.data))
+        self.assertEqual(open(self.path, "rb").read(), self.data)
+        self.assertFalse(os.path.exists(self.path + ".part"))
+        self.assertEqual(self.request.url, "https://example.com/api/proxy/abc")
+        self.assertEqual(progress[-1], (len(self.data), len(self.data)))
+        self.assertTrue(server.responses[0].closed)
+        # lengths are of the file, not a compressed body
+        self.assertEqual(self.request.headers["Accept-Encoding"], "identity")
+
+    def test_download_fileobj(self):
+        self.pump._requester = FileServer(self, self.data)
+        fileobj = io.BytesIO()
+        self.video.stream.download(fileobj)
+        self.assertEqual(fileobj.getvalue(), self.data)
+
+    def test_resume(self):
+        """ Interrupted downloads carry on from where they got to """
+        self.pump._requester = FileServer(self, self.data, fail_after=30000)
+        self.assertRaises(requests.exceptions.ConnectionError,
+                          self.video.stream.download, self.path, chunk_size=10000, preallocate=True)
+        self.assertEqual(os.path.getsize(self.path + ".part"), 30000)
+
+        written = self.video.stream.download(self.path, chunk_size=10000)
+        self.assertEqual(self.request.headers["Range"], "bytes=30000-")
+        self.assertEqual(written, len(self.data) - 30000)
+        self.assertEqual(open(self.path, "rb").read(), self.data)
+
+    def test_resume_without_ranges(self):
+        self.pump._requester = FileServer(self, self.data, ranges=False)
+        with open(self.path + ".part", "wb") as fileobj:
+            fileobj.write(b"garbage")
+
+        self.video.stream.download(self.path)
+        self.assertEqual(open(self.path, "rb").read(), self.data)
+
+    def test_resume_too_big(self):
+        self.pump._requester = FileServer(self, self.data)
+        with open(self.path + ".part", "wb") as fileobj:
+            fileobj.write(self.data + b"garbage")
+
+        self.video.stream.download(self.path)
+        self.assertEqual(open(self.path, "rb").read(), self.data)
+
+    def test_iter_content(self):
+        self.pump._requester = FileServer(self, self.data)
+        chunks = list(self.video.stream.iter_content(chunk_size=10000))
+        self.assertEqual(max(len(chunk) for chunk in chunks), 10000)
+        self.assertEqual(b"".join(chunks), self.data)
+
+        self.pump._requester = FileServer(self, self.data, ranges=False)
+        self.assertEqual(b"".join(self.video.stream.iter_content(start=100)), self.data[100:])
+
+    def test_image(self):
+        self.pump._requester = FileServer(self, self.data)
+        image = self.pump.Image().unserialize({
+            "objectType": "image",
+            "id": "https://example.com/api/image/abc",
+            "image": {"url": "https://example.com/uploads/test/image_thumb.png"},
+        })
+        self.assertEqual(b"".join(image.thumbnail.iter_content()), self.data)
+        self.assertEqual(self.request.url, "https://example.com/uploads/test/image_thumb.png")
+
+    def test_not_connected(self):
+        from pypump.models.media import StreamContainer
+        stream = StreamContainer("https://example.com/uploads/test/video.webm")
+        self.assertRaises(PyPumpException, stream.download, self.path)
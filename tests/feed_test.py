@@ -1,9 +1,18 @@
 # -*- coding: utf-8 -*-
+import threading
+import time
+
+import requests
 import six
 
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 from pypump.exceptions import PyPumpException
 from pypump.models.feed import Feed
-from tests import PyPumpTest
+from tests import PyPumpTest, Bucket, Response
 
 
 class FeedTest(PyPumpTest):
@@ -193,3 +202,280 @@ class FeedTest(PyPumpTest):
         self.assertEqual(len(sliceditems), 18)
         self.assertEqual(sliceditems[0].id, self.response['items'][2]['id'])
         self.assertEqual(sliceditems[-1].id, self.response['items'][19]['id'])
+
+    def test_prefetch(self):
+        # more items on the server than in one page
+        self.response.data["totalItems"] = 1000
+        feed = Feed(pypump=self.pump).unserialize(self.response.data)
+        self.requests = []
+
+        items = [item for item in feed.items(limit=50, prefetch=2)]
+        self.assertEqual(len(items), 50)
+        self.assertEqual(items[0].id, self.response['items'][0]['id'])
+        self.assertEqual(items[20].id, self.response['items'][0]['id'])
+        self.assertEqual(len(self.requests), 3)
+
+    def test_prefetch_is_bounded(self):
+        self.response.data["totalItems"] = 1000
+        feed = Feed(pypump=self.pump).unserialize(self.response.data)
+        self.requests = []
+
+        items = iter(feed.items(limit=None, prefetch=1))
+        next(items)
+        time.sleep(0.3)
+
+        # the page being used, the one waiting and the one waiting to be queued
+        self.assertTrue(len(self.requests) <= 3)
+
+        items.close()
+        items._prefetcher._thread.join(1)
+        self.assertFalse(items._prefetcher._thread.is_alive())
+
+    def test_prefetch_only_fetches_in_background(self):
+        """ Objects are made and the feed changed on the consumer's thread """
+        self.response.data["totalItems"] = 1000
+        feed = Feed(pypump=self.pump).unserialize(self.response.data)
+        threads = set()
+        unserialize = feed.unserialize
+
+        def record_unserialize(data):
+            threads.add(threading.current_thread())
+            return unserialize(data)
+
+        feed.unserialize = record_unserialize
+        items = [item for item in feed.items(limit=50, prefetch=2)]
+        self.assertEqual(len(items), 50)
+        self.assertEqual(threads, set([threading.current_thread()]))
+
+    def test_cached_iteration_doesnt_copy(self):
+        """ Cached items are iterated in place, not copied for each ItemList """
+        feed = Feed(pypump=self.pump)
+        feed._items = [Bucket(id="acct:testuser%d@example.com" % i) for i in range(100)]
+        feed.total_items = len(feed._items)
+        self.assertTrue(feed.is_cached)
+
+        for items, first in [(feed.items(limit=None), 0), (feed.items(offset=50, limit=None), 50)]:
+            items = iter(items)
+            self.assertTrue(next(items) is feed._items[first])
+            # a copy wouldn't see items added after iterating started
+            extra = Bucket(id="acct:extra@example.com")
+            feed._items.append(extra)
+            self.assertTrue(list(items)[-1] is extra)
+            feed._items.pop()
+
+    def test_len_uses_total_items(self):
+        self.response.data["totalItems"] = 1000
+        feed = Feed(pypump=self.pump).unserialize(self.response.data)
+        self.requests = []
+
+        self.assertEqual(len(feed), 1000)
+        self.assertEqual(len(feed[10:]), 990)
+        self.assertEqual(len(feed[-30:]), 30)
+        self.assertEqual(len(feed.items(offset=10)), 20)
+        self.assertEqual(len(feed.items(offset=995)), 5)
+        self.assertEqual(len(self.requests), 0)
+
+    def test_len_fetches_total_items_once(self):
+        self.response.data["totalItems"] = 1000
+        feed = Feed(self.response.data["url"], pypump=self.pump)
+
+        self.assertEqual(len(feed[10:]), 990)
+        self.assertEqual(len(self.requests), 1)
+
+    def test_len_without_total_items(self):
+        del self.response.data["totalItems"]
+        del self.response.data["links"]["next"]
+        feed = Feed(self.response.data["url"], pypump=self.pump)
+
+        self.assertEqual(len(feed.items(limit=None)), 20)
+        self.assertEqual(len(feed), 20)
+
+    def test_random_access_by_offset(self):
+        self.response.data["totalItems"] = 1000
+        feed = Feed(self.response.data["url"], pypump=self.pump)
+        feed.total_items = 1000
+
+        # item 25 is on the page starting at offset 20
+        self.assertEqual(feed[25].id, self.response['items'][5]['id'])
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.request.params, {"offset": 20, "count": 20})
+
+        # same page again doesn't make a request
+        self.assertEqual(feed[39].id, self.response['items'][19]['id'])
+        self.assertEqual(len(self.requests), 1)
+
+        # negative index
+        self.assertEqual(feed[-1].id, self.response['items'][19]['id'])
+        self.assertEqual(self.request.params, {"offset": 980, "count": 20})
+        feed[-2]
+        self.assertEqual(len(self.requests), 2)
+
+        with self.assertRaises(IndexError):
+            feed[1000]
+
+        with self.assertRaises(IndexError):
+            feed[-1001]
+
+    def test_random_access_leaves_feed_alone(self):
+        """ Looking up an item by index doesn't disturb iterating the feed """
+        self.response.data["totalItems"] = 1000
+        feed = Feed(pypump=self.pump).unserialize(self.response.data)
+        items = iter(feed.items(limit=20))
+        self.assertEqual(next(items).id, "acct:testuser0@example.com")
+        links = dict(feed.links)
+        feed_items = feed._items
+
+        self.response.data = dict(self.response.data, items=self.people(*range(40, 60)))
+        self.assertEqual(feed[45].id, "acct:testuser45@example.com")
+        self.assertEqual(feed.links, links)
+        self.assertTrue(feed._items is feed_items)
+        self.assertEqual([next(items).id for i in range(19)][-1], "acct:testuser19@example.com")
+
+    def test_random_access_pages_expire(self):
+        feed = Feed(self.response.data["url"], pypump=self.pump)
+        feed.total_items = 20
+
+        feed[0]
+        feed[1]
+        self.assertEqual(len(self.requests), 1)
+
+        feed.page_cache_ttl = 0
+        time.sleep(0.01)
+        feed[1]
+        self.assertEqual(len(self.requests), 2)
+
+    def test_itemlist_random_access(self):
+        self.response.data["totalItems"] = 1000
+        feed = Feed(self.response.data["url"], pypump=self.pump)
+        feed.total_items = 1000
+
+        items = feed[100:200]
+        self.assertEqual(items[5].id, self.response['items'][5]['id'])
+        self.assertEqual(self.request.params, {"offset": 100, "count": 20})
+        items[-1]
+        self.assertEqual(self.request.params, {"offset": 180, "count": 20})
+
+        with self.assertRaises(IndexError):
+            items[100]
+
+    def test_random_access_since(self):
+        items = self.feed.items(before='acct:testuser10@example.com', limit=None)
+        self.assertEqual(items[2].id, self.response['items'][13]['id'])
+        self.assertEqual(items[0].id, self.response['items'][11]['id'])
+        self.assertEqual(items[-1].id, self.response['items'][19]['id'])
+
+        with self.assertRaises(IndexError):
+            items[9]
+
+    def set_pages(self, *pages):
+        """ Make each request get the next page of items """
+        pages = list(pages)
+        response = self.response
+
+        class PagedResponse(Response):
+            def json(self):
+                items = pages.pop(0) if pages else []
+                return dict(response.data, items=items, links={})
+
+        self.pump._response = PagedResponse(url=None, data=None)
+
+    def people(self, *numbers):
+        return [{"objectType": "person", "id": "acct:testuser%d@example.com" % i} for i in numbers]
+
+    def test_poll(self):
+        # first poll just finds the newest item
+        self.set_pages(self.people(19, 18))
+        self.assertEqual(self.feed.poll(), [])
+
+        # newer items are returned oldest first
+        self.set_pages(self.people(22, 21, 20), self.people(23), [])
+        items = self.feed.poll()
+        self.assertEqual([item.id for item in items],
+                         ["acct:testuser%d@example.com" % i for i in [20, 21, 22, 23]])
+        self.assertEqual(self.requests[1].params["since"], "acct:testuser19@example.com")
+
+        # items aren't returned twice
+        self.set_pages(self.people(24, 23), [])
+        self.assertEqual([item.id for item in self.feed.poll()], ["acct:testuser24@example.com"])
+        self.assertEqual(self.request.params.get("since"), None)
+        self.assertEqual(self.requests[-2].params["since"], "acct:testuser23@example.com")
+
+    def test_poll_drops_pages(self):
+        """ New items move the others along so pages kept for indexing are dropped """
+        self.feed.total_items = 1000
+        self.feed[30]
+        self.set_pages(self.people(19))
+        self.feed.poll()
+        self.assertTrue(self.feed._pages)
+
+        self.set_pages(self.people(20), [])
+        self.feed.poll()
+        self.assertFalse(self.feed._pages)
+
+    def test_poll_store_key(self):
+        self.pump.store["inbox-cursor"] = "acct:testuser19@example.com"
+        self.set_pages(self.people(20), [])
+
+        items = self.feed.poll(store_key="inbox-cursor")
+        self.assertEqual(len(items), 1)
+        self.assertEqual(self.requests[0].params["since"], "acct:testuser19@example.com")
+        self.assertEqual(self.pump.store["inbox-cursor"], "acct:testuser20@example.com")
+
+    def test_watch_backoff(self):
+        self.feed._poll_cursor = "acct:testuser19@example.com"
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            if len(waits) == 4:
+                raise StopIteration
+            if len(waits) == 2:
+                self.set_pages(self.people(20), [])
+            else:
+                self.set_pages([])
+
+        self.set_pages([])
+        items = []
+        with mock.patch("pypump.models.feed.time.sleep", sleep):
+            try:
+                for item in self.feed.watch(interval=5, max_interval=15):
+                    items.append(item.id)
+            except (StopIteration, RuntimeError):
+                pass
+
+        self.assertEqual(items, ["acct:testuser20@example.com"])
+        self.assertEqual(waits, [10, 15, 5, 10])
+
+    def test_watch_transport_error(self):
+        """ Connection errors don't stop watching, they're retried with backoff """
+        self.feed._poll_cursor = "acct:testuser19@example.com"
+        responses = [requests.exceptions.ConnectionError("Connection refused"),
+                     requests.exceptions.Timeout("Read timed out"),
+                     self.people(20), []]
+        requester = self.pump._requester
+        waits = []
+
+        def flaky_requester(*args, **kwargs):
+            response = responses.pop(0) if responses else []
+            if isinstance(response, Exception):
+                raise response
+            self.set_pages(response)
+            return requester(*args, **kwargs)
+
+        def sleep(seconds):
+            waits.append(seconds)
+            if len(waits) == 4:
+                raise StopIteration
+
+        self.pump._requester = flaky_requester
+        items = []
+        with mock.patch("pypump.models.feed.time.sleep", sleep):
+            try:
+                for item in self.feed.watch(interval=5, max_interval=30):
+                    items.append(item.id)
+            except (StopIteration, RuntimeError):
+                pass
+
+        self.assertEqual(items, ["acct:testuser20@example.com"])
+        # two failures in a row, then a poll with an item, then an empty one
+        self.assertEqual(waits, [10, 20, 5, 10])
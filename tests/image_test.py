@@ -133,3 +133,41 @@ class ImageTest(PyPumpTest):
         # Test that the data is the same
         binary_image = open(self.bucket.path_to_png, "rb").read()
         self.assertEqual(upload_request.data, binary_image)
+
+    def test_upload_progress(self):
+        """ Test progress is reported while the file is uploaded """
+        progress = []
+        image = self.pump.Image()
+        image.from_file(self.bucket.path_to_png, progress=lambda sent, total: progress.append((sent, total)))
+
+        size = len(open(self.bucket.path_to_png, "rb").read())
+        self.assertEqual(progress[-1], (size, size))
+
+    def test_upload_stream(self):
+        """ Test images can be uploaded from buffers and iterables """
+        binary_image = open(self.bucket.path_to_png, "rb").read()
+
+        self.pump.Image().from_stream(memoryview(binary_image), "image/png")
+        self.assertEqual(self.requests[0].data, binary_image)
+
+        chunks = [binary_image[i:i + 100] for i in range(0, len(binary_image), 100)]
+        self.pump.Image().from_stream(iter(chunks), "image/png")
+        self.assertEqual(self.requests[2].data, binary_image)
+
+    def test_upload_metadata_inline(self):
+        """ Test no update is sent when the post keeps the metadata """
+        image = self.pump.Image(display_name="O M G", content=self.imgdata["content"])
+        image.from_file(self.bucket.path_to_png)
+
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.requests[1]["verb"], "post")
+        self.assertEqual(self.requests[1]["object"]["displayName"], "O M G")
+
+    def test_upload_metadata_update(self):
+        """ Test metadata the server dropped from the post is updated """
+        image = self.pump.Image(display_name="My lovely image")
+        image.from_file(self.bucket.path_to_png)
+
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(self.requests[2]["verb"], "update")
+        self.assertEqual(self.requests[2]["object"]["displayName"], "My lovely image")
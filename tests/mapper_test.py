@@ -1,6 +1,11 @@
 from __future__ import absolute_import
 
-from pypump.models import Mapper, PumpObject
+import gc
+import weakref
+
+from dateutil.parser import parse
+
+from pypump.models import Mapper, PumpObject, parse_date
 from pypump.models.activity import Application
 from tests import PyPumpTest
 
@@ -58,3 +63,94 @@ class MapperTest(PyPumpTest):
         test_obj = Mapper(pypump=self.pump).get_object(test_data)
 
         self.assertTrue(isinstance(test_obj, Application))
+
+    def test_attribute_table(self):
+        """ Test mapping is worked out once per model class """
+        Comment = type(self.pump.Comment())
+        table = dict((key, handler) for key, _, handler in Comment._attr_table)
+
+        self.assertEqual(table["published"], "set_date")
+        self.assertEqual(table["in_reply_to"], "set_object")
+        self.assertEqual(table["content"], "set_literal")
+        self.assertEqual(Comment._mapping["in_reply_to"], "inReplyTo")
+
+    def test_attribute_defaults(self):
+        """ Test unset attributes keep the model's defaults """
+        comment = self.pump.Comment()
+        self.assertEqual(comment.object_type, "comment")
+        self.assertEqual(comment.content, None)
+        self.assertEqual(comment.to, [])
+
+        comment.content = "Nice!"
+        self.assertEqual(comment.content, "Nice!")
+        self.assertEqual(self.pump.Comment().content, None)
+
+    def test_parse_date(self):
+        """ Test RFC 3339 dates are parsed like dateutil does """
+        dates = [
+            "2013-12-24T16:58:42Z",
+            "2013-12-24T16:58:42.123Z",
+            "2013-12-24T16:58:42.1234567+02:00",
+            "2013-12-24T16:58:42-05:30",
+            "2013-12-24T16:58:42",
+            "24 Dec 2013 16:58:42 GMT",  # not RFC 3339
+        ]
+        for date in dates:
+            self.assertEqual(parse_date(date), parse(date))
+            self.assertEqual(parse_date(date).utcoffset(), parse(date).utcoffset())
+
+    def test_lazy_dates(self):
+        """ Test dates are parsed when first used with lazy_dates """
+        self.pump.lazy_dates = True
+        test_data = {
+            "objectType": "comment",
+            "id": "https://example.com/api/comment/abc",
+            "published": "2014-01-04T17:39:21Z",
+            "updated": "2014-01-04T17:39:22Z",
+        }
+        comment = Mapper(pypump=self.pump).get_object(test_data)
+
+        self.assertFalse("published" in comment.__dict__)
+        self.assertEqual(comment.published, parse(test_data["published"]))
+        self.assertTrue("published" in comment.__dict__)
+        self.assertEqual(comment.updated, parse(test_data["updated"]))
+
+        comment.unserialize({"updated": "2014-01-05T10:00:00Z"})
+        self.assertEqual(comment.updated, parse("2014-01-05T10:00:00Z"))
+
+    def test_identity_map(self):
+        """ Test objects with the same id are the same instance """
+        self.pump._objects = weakref.WeakValueDictionary()
+        mapper = Mapper(pypump=self.pump)
+        actor = {
+            "objectType": "person",
+            "id": "acct:testuser@example.com",
+            "displayName": "Test User",
+            "likes": {"url": "https://example.com/api/user/testuser/likes", "totalItems": 1},
+        }
+
+        first = mapper.get_object(actor)
+        likes = first._likes
+        second = mapper.get_object({
+            "objectType": "person",
+            "id": "acct:testuser@example.com",
+            "summary": "Hello",
+            "likes": {"url": "https://example.com/api/user/testuser/likes", "totalItems": 1},
+        })
+
+        self.assertTrue(first is second)
+        # data is merged into the instance
+        self.assertEqual(second.summary, "Hello")
+        self.assertEqual(second.display_name, "Test User")
+        self.assertTrue(second._likes is likes)
+
+        # objects are only kept while they're used
+        del first, second, likes
+        gc.collect()
+        self.assertEqual(len(self.pump._objects), 0)
+
+    def test_identity_map_disabled(self):
+        """ Test objects aren't shared without identity_map """
+        mapper = Mapper(pypump=self.pump)
+        actor = {"objectType": "person", "id": "acct:testuser@example.com"}
+        self.assertFalse(mapper.get_object(actor) is mapper.get_object(actor))
@@ -99,7 +99,7 @@ class PersonTest(PyPumpTest):
 
     def test_update(self):
         """ Test that a update works """
-        person = self.pump.Person("TestUser@example.com")
+        person = self.pump.Person("TestUser@example.com").load()
         person.summary = "New summary!"
         person.display_name = "New user"
 
@@ -166,3 +166,41 @@ class PersonTest(PyPumpTest):
 
         # Test place model was made
         self.assertTrue(isinstance(person.location, Place))
+
+    def test_profile_is_fetched_lazily(self):
+        """ Test the profile is only fetched when it's used """
+        person = self.pump.Person("TestUser@example.com")
+        self.assertEqual(len(self.requests), 0)
+        self.assertEqual(repr(person), "<Person: TestUser@example.com>")
+        self.assertEqual(len(self.requests), 0)
+
+        person.summary = "My own summary"
+        self.assertEqual(person.display_name, self.response["displayName"])
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.requests[0].url, "https://example.com/api/user/TestUser/profile")
+
+        # set before the profile was fetched
+        self.assertEqual(person.summary, "My own summary")
+        self.assertEqual(person.followers.total_items, 72)
+        self.assertEqual(len(self.requests), 1)
+
+    def test_profile_fetch_fails(self):
+        """ Test attributes are left unset if the profile can't be fetched """
+        self.response.status_code = 500
+        person = self.pump.Person("TestUser@example.com")
+        self.assertEqual(person.display_name, None)
+        self.assertEqual(person.summary, None)
+        self.assertEqual(len(self.requests), 1)
+
+    def test_people(self):
+        """ Test many profiles are fetched at once """
+        webfingers = ["TestUser%d@example.com" % i for i in range(20)]
+        people = self.pump.people(webfingers, workers=4)
+
+        self.assertEqual(len(people), 20)
+        self.assertEqual(
+            sorted(request.url for request in self.requests),
+            sorted("https://example.com/api/user/%s/profile" % w.split("@")[0] for w in webfingers)
+        )
+        self.assertEqual(people[5].display_name, self.response["displayName"])
+        self.assertEqual(len(self.requests), 20)
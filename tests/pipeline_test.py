@@ -0,0 +1,100 @@
+from __future__ import absolute_import
+
+import time
+
+import six
+
+from pypump.exceptions import PyPumpException
+from pypump.pipeline import MediaPipeline
+from tests import PyPumpTest
+
+
+class MediaPipelineTest(PyPumpTest):
+
+    def setUp(self):
+        super(MediaPipelineTest, self).setUp()
+        self.response.data = {
+            "verb": "post",
+            "actor": {"objectType": "person", "id": "acct:test@example.com"},
+            "object": {
+                "objectType": "image",
+                "id": "https://example.com/api/image/abc",
+                "displayName": "Holiday",
+            },
+        }
+        self.binary_image = open(self.bucket.path_to_png, "rb").read()
+
+    def test_models(self):
+        pipeline = MediaPipeline(self.pump)
+        image = pipeline.add(filename=self.bucket.path_to_png)
+        named = pipeline.add(six.text_type(self.bucket.path_to_png))
+        video = pipeline.add(b"data", mimetype="video/webm")
+        audio = pipeline.add(b"data", mimetype="audio/ogg")
+
+        self.assertEqual(image.object_type, "image")
+        self.assertEqual(named.object_type, "image")
+        self.assertEqual(pipeline.items[1][2], self.bucket.path_to_png)
+        self.assertEqual(video.object_type, "video")
+        self.assertEqual(audio.object_type, "audio")
+
+    def test_run(self):
+        pipeline = MediaPipeline(self.pump, upload_workers=3)
+        media = [pipeline.add(filename=self.bucket.path_to_png, display_name="Holiday") for i in range(5)]
+        results = pipeline.run()
+
+        self.assertEqual([result.item for result in results], media)
+        self.assertTrue(all(result.ok for result in results))
+
+        uploads = [r for r in self.requests if r.url.endswith("/uploads")]
+        posts = [r for r in self.requests if r.url.endswith("/feed")]
+        self.assertEqual(len(uploads), 5)
+        self.assertEqual([r["verb"] for r in posts], ["post"] * 5)
+
+        metrics = pipeline.metrics
+        self.assertEqual(metrics["upload"].items, 5)
+        self.assertEqual(metrics["upload"].bytes, 5 * len(self.binary_image))
+        self.assertEqual(metrics["post"].items, 5)
+        self.assertEqual(metrics["update"].items, 0)
+        self.assertEqual(pipeline.run(), [])
+
+    def test_update(self):
+        pipeline = MediaPipeline(self.pump)
+        pipeline.add(self.binary_image, mimetype="image/png", display_name="Beach")
+        pipeline.run()
+
+        self.assertEqual(self.requests[-1]["verb"], "update")
+        self.assertEqual(self.requests[-1]["object"]["displayName"], "Beach")
+        self.assertEqual(pipeline.metrics["update"].items, 1)
+
+    def test_update_timed_alone(self):
+        """ The update stage's time doesn't include posting """
+        pipeline = MediaPipeline(self.pump)
+        media = pipeline.add(self.binary_image, mimetype="image/png", display_name="Beach")
+        post_activity = media._post_activity
+
+        def slow_post_activity(data, *args, **kwargs):
+            if data["verb"] == "post":
+                time.sleep(0.2)
+            return post_activity(data, *args, **kwargs)
+
+        media._post_activity = slow_post_activity
+        pipeline.run()
+
+        self.assertEqual(pipeline.metrics["update"].items, 1)
+        self.assertTrue(pipeline.metrics["post"].seconds >= 0.2)
+        self.assertTrue(pipeline.metrics["update"].seconds < 0.2)
+
+    def test_errors(self):
+        def broken():
+            yield b"data"
+            raise PyPumpException("Disk on fire")
+
+        pipeline = MediaPipeline(self.pump)
+        pipeline.add(broken(), mimetype="image/png")
+        pipeline.add(self.binary_image, mimetype="image/png")
+        results = pipeline.run()
+
+        self.assertFalse(results[0].ok)
+        self.assertTrue(isinstance(results[0].error, PyPumpException))
+        self.assertTrue(results[1].ok)
+        self.assertEqual(pipeline.metrics["upload"].errors, 1)
@@ -0,0 +1,140 @@
+from __future__ import absolute_import
+
+import threading
+import time
+
+from pypump import PumpPool
+from tests import PyPumpTest
+
+
+class PumpPoolTest(PyPumpTest):
+
+    def setUp(self):
+        super(PumpPoolTest, self).setUp()
+
+        self.response.data = {
+            "client_id": "SharedKey",
+            "client_secret": "SharedSecret",
+            "expires_at": 0,
+        }
+        self.pool = self.create_pool()
+
+    def create_pool(self, **kwargs):
+        pool = PumpPool("PumpTest", response=self.response, testcase=self, **kwargs)
+        pool.pump_class = type(self.pump)
+        pool.store_class = type(self.pump.store)
+        return pool
+
+    def registrations(self):
+        return [r for r in self.requests if r.url.endswith("/api/client/register")]
+
+    def test_get(self):
+        alice = self.pool.get("alice@example.com")
+        bob = self.pool["bob@example.org"]
+
+        self.assertTrue(self.pool.get("alice@example.com") is alice)
+        self.assertEqual(alice.client.webfinger, "alice@example.com")
+        self.assertEqual(bob.store.prefix, "bob@example.org")
+        self.assertTrue(alice._sessions is self.pool.sessions)
+        self.assertTrue(bob._sessions is self.pool.sessions)
+        self.assertEqual(len(self.pool), 2)
+
+    def test_close_pump_keeps_sessions(self):
+        pump = self.pool.get("alice@example.com")
+        pump._get_session("https://example.com/api/user/alice/feed")
+        pump.close()
+        self.assertEqual(len(self.pool.sessions), 1)
+
+        self.pool.close()
+        self.assertEqual(len(self.pool.sessions), 0)
+        self.assertEqual(len(self.pool), 0)
+
+    def test_least_recently_used_evicted(self):
+        pool = self.create_pool(max_users=2)
+        alice = pool.get("alice@example.com")
+        pool.get("bob@example.com")
+        pool.get("alice@example.com")
+        pool.get("carol@example.com")
+
+        self.assertTrue("alice@example.com" in pool)
+        self.assertFalse("bob@example.com" in pool)
+        self.assertTrue("carol@example.com" in pool)
+        self.assertTrue(pool.get("alice@example.com") is alice)
+        self.assertFalse(pool.get("bob@example.com") is None)
+
+    def test_idle_evicted(self):
+        pool = self.create_pool(idle_timeout=0)
+        pool.get("alice@example.com")
+        time.sleep(0.01)
+        pool.get("bob@example.com")
+
+        self.assertFalse("alice@example.com" in pool)
+        self.assertTrue("bob@example.com" in pool)
+
+    def test_release(self):
+        pump = self.pool.get("alice@example.com")
+        pump.store["saved"] = True
+        self.pool.release("alice@example.com")
+
+        self.assertFalse("alice@example.com" in self.pool)
+        self.assertFalse(pump.store._dirty)
+
+    def test_remote_client_shared(self):
+        """ The client is registered with a server once for all accounts """
+        url = "https://remote.example/api/user/dave/profile"
+        alice = self.pool.get("alice@example.com")
+        bob = self.pool.get("bob@example.org")
+
+        alice.setup_oauth_client(url)
+        auth = bob.setup_oauth_client(url)
+
+        self.assertEqual(len(self.registrations()), 1)
+        self.assertEqual(auth.client.client_key, "SharedKey")
+        self.assertEqual(self.pool.clients["remote.example"].key, "SharedKey")
+
+    def test_home_client_shared(self):
+        """ Accounts on a server the client is registered with use it """
+        store_class = self.pool.store_class
+
+        class UnregisteredStore(store_class):
+            @classmethod
+            def load(cls, webfinger, pump):
+                store = super(UnregisteredStore, cls).load(webfinger, pump)
+                for key in ["client-key", "client-secret", "client-expirey"]:
+                    del store[key]
+                return store
+
+        self.pool.store_class = UnregisteredStore
+        alice = self.pool.get("alice@example.com")
+        bob = self.pool.get("bob@example.com")
+
+        self.assertEqual(len(self.registrations()), 1)
+        self.assertEqual(bob.client.key, "SharedKey")
+        self.assertEqual(bob.store["client-key"], "SharedKey")
+        self.assertEqual(alice.store["client-secret"], "SharedSecret")
+
+    def test_create_doesnt_block_pool(self):
+        """ An account whose pump is slow to make doesn't hold up others """
+        created = []
+        ready = threading.Event()
+        create_pump = self.pool.create_pump
+
+        def slow_create_pump(webfinger):
+            created.append(webfinger)
+            if webfinger.startswith("slow@"):
+                ready.wait(5)
+            return create_pump(webfinger)
+
+        self.pool.create_pump = slow_create_pump
+        threads = [threading.Thread(target=self.pool.get, args=("slow@example.com",)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+
+        self.assertEqual(self.pool.get("alice@example.com").client.webfinger, "alice@example.com")
+        self.assertFalse("slow@example.com" in self.pool)
+
+        ready.set()
+        for thread in threads:
+            thread.join()
+        self.assertTrue("slow@example.com" in self.pool)
+        self.assertEqual(created.count("slow@example.com"), 1)
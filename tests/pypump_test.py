@@ -1,4 +1,6 @@
 from __future__ import absolute_import
+import threading
+import time
 from unittest import TestCase
 
 try:
@@ -7,18 +9,22 @@ except ImportError:
     import mock
 
 from requests import exceptions as request_excs
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 
 from pypump import PyPump
+from pypump.session import SessionPool
 
 
 class PyPumpTest(TestCase):
+    @mock.patch("pypump.pypump.SessionPool")
     @mock.patch("pypump.pypump.requests")
-    def test_https_failover(self, requests_mock):
+    def test_https_failover(self, requests_mock, pool_mock):
         store = mock.MagicMock()
         store.__iter__.return_value = []
         client = mock.Mock()
         verifier = mock.Mock()
-        requests_mock.post.return_value.text = "%s=thingy&%s=secretthingy" % (PyPump.PARAM_TOKEN, PyPump.PARAM_TOKEN_SECRET)
+        session_mock = pool_mock.return_value.get.return_value
+        session_mock.post.return_value.text = "%s=thingy&%s=secretthingy" % (PyPump.PARAM_TOKEN, PyPump.PARAM_TOKEN_SECRET)
         # re-add exceptions to mocked library
         requests_mock.exceptions = request_excs
 
@@ -46,3 +52,68 @@ class PyPumpTest(TestCase):
         self.assertTrue(fnc_mock.call_args_list[1][0][0].startswith("http://"))
         # make sure that we're reset to https after
         self.assertEqual(pump.protocol, "https")
+
+    def test_sessions_are_pooled_per_server(self):
+        pump = PyPump.__new__(PyPump)
+        pump.client = mock.Mock(server="example.com")
+        pump._sessions = SessionPool()
+
+        session = pump._get_session("https://example.com/api/user/bob/feed")
+        self.assertTrue(pump._get_session() is session)
+        self.assertTrue(pump._get_session("https://example.com/oauth/request_token") is session)
+        self.assertFalse(pump._get_session("https://remote.org/api/user/alice/profile") is session)
+        self.assertEqual(len(pump._sessions), 2)
+
+        pump.close()
+        self.assertEqual(len(pump._sessions), 0)
+
+    def test_idle_sessions_are_evicted(self):
+        pool = SessionPool(idle_timeout=0)
+        pool.get("example.com")
+        time.sleep(0.01)
+        pool.get("remote.org")
+
+        self.assertFalse("example.com" in pool)
+        self.assertTrue("remote.org" in pool)
+
+    def test_sessions_in_use_arent_evicted(self):
+        pool = SessionPool(idle_timeout=0)
+        session = pool.get("example.com")
+        session.active = 1
+        time.sleep(0.01)
+        pool.get("remote.org")
+        self.assertTrue("example.com" in pool)
+
+        session.active = 0
+        pool.evict_idle()
+        self.assertFalse("example.com" in pool)
+
+    def test_sessions_dont_keep_cookies(self):
+        """ Sessions are shared by accounts, a cookie for one mustn't be sent for another """
+        received = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                received.append(self.headers.get("Cookie"))
+                self.send_response(200)
+                self.send_header("Set-Cookie", "session=alice; Path=/")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        session = SessionPool().get("127.0.0.1")
+        url = "http://127.0.0.1:{0}/".format(server.server_address[1])
+        session.get(url)
+        session.get(url)
+
+        self.assertEqual(received, [None, None])
+        self.assertEqual(len(session.cookies), 0)
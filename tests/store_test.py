@@ -1,16 +1,30 @@
 from __future__ import absolute_import
 
+import json
 import os
 import shutil
 import stat
+import tempfile
+import time
 
-from pypump import AbstractStore, JSONStore
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from pypump import AbstractStore, JSONStore, SQLiteStore
 from tests import PyPumpTest
 
 
 class TestStore(AbstractStore):
     """ Provide a more testable store """
     save_called = False
+    saves = 0
 
     def save(self):
         """
@@ -18,6 +32,8 @@ class TestStore(AbstractStore):
         This will just change a flag to show it's been called
         """
         self.save_called = True
+        self.saves += 1
+        self.saved = dict(self)
 
 
 class StoreTest(PyPumpTest):
@@ -73,6 +89,88 @@ class StoreTest(PyPumpTest):
 
         self.assertEqual(store["hai-key"], "value")
 
+    def test_delete(self):
+        """ Test that deleting a key uses the prefix and saves """
+        store = TestStore()
+        store.prefix = "hai"
+        store["key"] = "value"
+        store.save_called = False
+
+        del store["key"]
+        self.assertFalse("key" in store)
+        self.assertEqual(store.save_called, True)
+
+
+class TransactionTest(PyPumpTest):
+
+    def test_transaction(self):
+        """ Changes in a transaction are saved once at the end """
+        store = TestStore()
+        with store.transaction():
+            store["key"] = "value"
+            store["secret"] = "value"
+            with store.transaction():
+                store["expirey"] = 0
+            self.assertEqual(store.saves, 0)
+
+        self.assertEqual(store.saves, 1)
+        self.assertEqual(store.saved, {"key": "value", "secret": "value", "expirey": 0})
+
+        with store.transaction():
+            pass
+        self.assertEqual(store.saves, 1)
+
+    def test_rollback(self):
+        """ Changes in a transaction which fails are undone """
+        store = TestStore()
+        store["key"] = "value"
+
+        def fail():
+            with store.transaction():
+                store["key"] = "changed"
+                store["secret"] = "value"
+                raise ValueError("Oops")
+
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(dict(store), {"key": "value"})
+        self.assertEqual(store.saves, 1)
+
+    def test_write_delay(self):
+        """ Changes are saved together in the background """
+        store = TestStore()
+        store.write_delay = 0.05
+        for i in range(10):
+            store["key"] = i
+        self.assertEqual(store.saves, 0)
+
+        time.sleep(0.2)
+        self.assertEqual(store.saves, 1)
+        self.assertEqual(store.saved, {"key": 9})
+
+    def test_flush(self):
+        store = TestStore()
+        store.write_delay = 60
+        store["key"] = "value"
+        del store["key"]
+        store["secret"] = "value"
+
+        store.flush()
+        self.assertEqual(store.saves, 1)
+        self.assertEqual(store.saved, {"secret": "value"})
+        self.assertTrue(store._timer is None)
+
+        store.flush()
+        self.assertEqual(store.saves, 1)
+
+    def test_oauth(self):
+        """ Tokens are saved together """
+        store = self.pump.store
+        store.saves = 0
+        store.save = lambda: setattr(store, "saves", store.saves + 1)
+
+        self.pump.oauth_request()
+        self.assertEqual(store.saves, 1)
+
 
 class JSONStoreTest(PyPumpTest):
     """
@@ -88,10 +186,11 @@ class JSONStoreTest(PyPumpTest):
         self.filename = filename
 
     def tearDown(self):
-        try:
-            os.remove(self.filename)
-        except OSError:
-            pass
+        for filename in [self.filename, self.filename + ".lock"]:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
 
     def test_creating_pypump_dir(self):
         os.environ["XDG_CONFIG_HOME"] = os.path.join(os.path.abspath("."), "pypump_config")
@@ -110,3 +209,169 @@ class JSONStoreTest(PyPumpTest):
 
         # we're only going to test to make sure "others" can't read the file
         self.assertEqual(mode & stat.S_IRWXO, 0, "File mode is insecure")
+
+    def test_durable(self):
+        """ The file is synced to disk before it replaces the old one """
+        store = JSONStore(filename=self.filename)
+        with mock.patch("pypump.store.os.fsync") as fsync:
+            with store.transaction():
+                store["unittest"] = "framework"
+                store.update({"other": "value"})
+            self.assertEqual(fsync.call_count, 2)
+
+        with open(self.filename) as fd:
+            self.assertEqual(json.load(fd), {"unittest": "framework", "other": "value"})
+        self.assertEqual([name for name in os.listdir(".") if name.endswith(".tmp")], [])
+
+    def test_processes(self):
+        """ Stores of several processes sharing the file merge changes """
+        first = JSONStore(filename=self.filename)
+        first["client-key"] = "key"
+        first["oauth-access-token"] = "old"
+
+        second = JSONStore(filename=self.filename)
+        second.reload(force=True)
+        second["oauth-access-token"] = "new"
+        first["oauth-request-token"] = "request"
+        del first["client-key"]
+
+        with open(self.filename) as fd:
+            self.assertEqual(json.load(fd), {"oauth-access-token": "new", "oauth-request-token": "request"})
+
+        # changes are picked up when reading
+        first.reload_interval = second.reload_interval = 0
+        self.assertEqual(first["oauth-access-token"], "new")
+        self.assertFalse("client-key" in second)
+
+    def test_reload_unchanged(self):
+        """ The file is only read when it changed """
+        store = JSONStore(filename=self.filename)
+        store["key"] = "value"
+        store.reload_interval = 0
+
+        with mock.patch("pypump.store.json.load") as load:
+            store["key"]
+            "key" in store
+            self.assertEqual(load.call_count, 0)
+
+        other = JSONStore(filename=self.filename)
+        other["key"] = "changed"
+        self.assertEqual(store["key"], "changed")
+
+    def test_reload_interval(self):
+        store = JSONStore(filename=self.filename)
+        store["key"] = "value"
+        JSONStore(filename=self.filename)["key"] = "changed"
+
+        store.reload_interval = 60
+        self.assertEqual(store["key"], "value")
+        store.reload(force=True)
+        self.assertEqual(store["key"], "changed")
+
+    def test_load_corrupt(self):
+        """ A file which can't be read isn't loaded as an empty store """
+        with open(self.filename, "w") as fd:
+            fd.write("{not json")
+
+        with mock.patch.object(JSONStore, "get_filename", return_value=self.filename):
+            self.assertRaises(ValueError, JSONStore.load, "test@example.com", None)
+
+        # checking for changes in the background only warns
+        store = JSONStore(filename=self.filename)
+        store.reload_interval = 0
+        self.assertFalse("key" in store)
+
+    def test_lock(self):
+        """ The file is locked while it's read, merged and written """
+        if fcntl is None:
+            self.skipTest("No fcntl on this system")
+
+        store = JSONStore(filename=self.filename)
+        with mock.patch("pypump.store.fcntl.flock") as flock:
+            store["key"] = "value"
+        self.assertEqual([call[0][1] for call in flock.call_args_list], [fcntl.LOCK_EX, fcntl.LOCK_UN])
+
+
+class SQLiteStoreTest(PyPumpTest):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, "credentials.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def load(self, webfinger):
+        store = SQLiteStore.load(webfinger, None, filename=self.filename)
+        self.addCleanup(store.close)
+        return store
+
+    def test_accounts(self):
+        """ Each account only loads its own keys """
+        alice = self.load("alice@example.com")
+        bob = self.load("bob@example.com")
+        alice["client-key"] = "alice key"
+        alice["oauth-access-token"] = {"token": [1, 2]}
+        bob["client-key"] = "bob key"
+
+        alice = self.load("alice@example.com")
+        self.assertEqual(alice["client-key"], "alice key")
+        self.assertEqual(alice["oauth-access-token"], {"token": [1, 2]})
+        self.assertEqual(len(alice), 2)
+        self.assertEqual(dict(self.load("bob@example.com")), {"bob@example.com-client-key": "bob key"})
+
+        del alice["client-key"]
+        self.assertFalse("client-key" in self.load("alice@example.com"))
+
+        mode = os.stat(self.filename).st_mode
+        self.assertEqual(mode & stat.S_IRWXO, 0, "File mode is insecure")
+
+    def test_changed_keys(self):
+        """ Only keys which changed are written """
+        store = self.load("alice@example.com")
+        store["client-key"] = "key"
+        store["client-secret"] = "secret"
+
+        # rows written, set_trace_callback is Python 3.3+
+        changes = store.connection.total_changes
+        with store.transaction():
+            store["client-secret"] = "new secret"
+            store["client-key"] = "key"
+
+        self.assertEqual(store.connection.total_changes - changes, 1)
+        self.assertEqual(self.load("alice@example.com")["client-secret"], "new secret")
+
+    def test_shared_connection(self):
+        """ Stores for the same database share one connection """
+        alice = self.load("alice@example.com")
+        bob = SQLiteStore.load("bob@example.com", None, filename=self.filename)
+        self.assertTrue(alice.connection is bob.connection)
+
+        bob["client-key"] = "bob key"
+        bob.close()
+        alice["client-key"] = "alice key"
+        self.assertEqual(self.load("bob@example.com")["client-key"], "bob key")
+        self.assertEqual(self.load("alice@example.com")["client-key"], "alice key")
+
+    def test_wal(self):
+        store = self.load("alice@example.com")
+        mode = store.connection.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    def test_import_json(self):
+        json_filename = os.path.join(self.path, "credentials.json")
+        json_store = JSONStore(filename=json_filename)
+        for webfinger in ["alice@example.com", "alice@example.com-mirror.org"]:
+            json_store.prefix = webfinger
+            json_store["client-key"] = webfinger + " key"
+            json_store["oauth-access-token"] = webfinger + " token"
+        json_store.prefix = None
+        json_store["stray"] = 1
+
+        self.assertEqual(SQLiteStore.import_json(json_filename, filename=self.filename), 5)
+
+        store = self.load("alice@example.com-mirror.org")
+        self.assertEqual(store["client-key"], "alice@example.com-mirror.org key")
+        self.assertEqual(store["oauth-access-token"], "alice@example.com-mirror.org token")
+        self.assertEqual(len(self.load("alice@example.com")), 2)
+        self.assertEqual(self.load("")["stray"], 1)
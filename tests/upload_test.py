@@ -0,0 +1,224 @@
+from __future__ import absolute_import
+
+import base64
+import hashlib
+import io
+import re
+
+import requests
+
+from pypump.exceptions import PyPumpException
+from pypump import upload
+from pypump.pypump import PyPump
+from pypump.upload import ResumableUpload, UploadStream
+from tests import PyPumpTest, Response
+
+
+class ResumableServer(object):
+    """ Stub pump.io server which does resumable uploads """
+
+    session = "https://example.com/api/user/Test/uploads/session/1"
+
+    def __init__(self, testcase, fail_at=None, corrupt_at=None, resumable=True, fail_offset=0):
+        self.testcase = testcase
+        self.fail_at = fail_at
+        self.fail_offset = fail_offset
+        self.probes = 0
+        self.corrupt_at = corrupt_at
+        self.resumable = resumable
+        self.received = b""
+        self.length = None
+        self.puts = []
+        self.deleted = []
+
+    def __call__(self, fnc, endpoint, raw=False, **kwargs):
+        method = fnc.__name__.upper()
+        headers = kwargs.get("headers") or {}
+        data = kwargs.get("data")
+        if hasattr(data, "read"):
+            data = data.read()
+
+        if endpoint.endswith("/feed"):
+            self.testcase.requests.append(Response(url=endpoint, data=data, headers=headers))
+            return Response(url=endpoint, data={
+                "verb": "post",
+                "actor": {"objectType": "person", "id": "acct:test@example.com"},
+                "object": self.image(),
+            })
+
+        if method == "DELETE":
+            self.deleted.append(endpoint)
+            return Response(url=endpoint, data={})
+
+        if method == "POST":
+            if "X-Upload-Content-Length" in headers:
+                self.probes += 1
+            if self.resumable and "X-Upload-Content-Length" in headers:
+                self.length = int(headers["X-Upload-Content-Length"])
+                return Response(url=endpoint, data="", status_code=201,
+                                headers={"Location": "/api/user/Test/uploads/session/1"})
+            self.received = data
+            return Response(url=endpoint, data=self.image())
+
+        assert endpoint == self.session
+        start, end, length = re.match(r"bytes (\*|\d+)-?(\d+)?/(\d+)", headers["Content-Range"]).groups()
+        if start == "*" and self.fail_offset:
+            self.fail_offset -= 1
+            raise requests.exceptions.ConnectionError("Connection reset by peer")
+        if start != "*":
+            self.puts.append(int(start))
+            if self.fail_at is not None and int(start) >= self.fail_at:
+                self.fail_at = None
+                raise requests.exceptions.ConnectionError("Connection reset by peer")
+
+            digest = base64.b64encode(hashlib.sha256(data).digest()).decode("ascii")
+            if self.corrupt_at is not None and int(start) >= self.corrupt_at:
+                self.corrupt_at = None
+                digest = "broken"
+            if headers["Digest"] != "SHA-256=" + digest:
+                return Response(url=endpoint, data={"error": "Digest mismatch"}, status_code=400)
+
+            assert int(start) == len(self.received)
+            self.received += data
+
+        if len(self.received) == self.length:
+            return Response(url=endpoint, data=self.image(), status_code=201)
+        if not self.received:
+            return Response(url=endpoint, data="", status_code=308)
+        return Response(url=endpoint, data="", status_code=308,
+                        headers={"Range": "bytes=0-{0}".format(len(self.received) - 1)})
+
+    def image(self):
+        return {
+            "objectType": "image",
+            "id": "https://example.com/api/image/abc",
+            "author": {"objectType": "person", "id": "acct:test@example.com"},
+        }
+
+
+class ResumableUploadTest(PyPumpTest):
+
+    def setUp(self):
+        super(ResumableUploadTest, self).setUp()
+        self.binary_image = open(self.bucket.path_to_png, "rb").read()
+        upload._resumable_servers.clear()
+
+    def upload(self, **kwargs):
+        kwargs.setdefault("chunk_size", 10000)
+        return ResumableUpload(self.pump, "/api/user/Test/uploads",
+                               self.bucket.path_to_png, "image/png", **kwargs)
+
+    def test_chunks(self):
+        server = self.pump._requester = ResumableServer(self)
+        progress = []
+        image = self.pump.Image(display_name="Test")
+        image.from_file(self.bucket.path_to_png, resumable=True, chunk_size=10000,
+                        progress=lambda sent, total: progress.append(sent))
+
+        self.assertEqual(server.received, self.binary_image)
+        self.assertEqual(server.puts, list(range(0, len(self.binary_image), 10000)))
+        self.assertEqual(progress[-1], len(self.binary_image))
+        self.assertEqual(image.id, "https://example.com/api/image/abc")
+        self.assertEqual([r["verb"] for r in self.requests], ["post", "update"])
+        self.assertEqual(self.upload().session_url, None)
+
+    def test_resume(self):
+        """ An interrupted upload carries on from the last chunk the server has """
+        server = self.pump._requester = ResumableServer(self, fail_at=30000)
+        upload = self.upload(retries=0)
+        self.assertRaises(requests.exceptions.ConnectionError, upload.run)
+        self.assertEqual(upload.session_url, server.session)
+        self.assertEqual(len(server.received), 30000)
+
+        # a new process uploading the same file
+        server.puts = []
+        file_data = self.upload().run()
+        self.assertEqual(file_data["id"], "https://example.com/api/image/abc")
+        self.assertEqual(server.puts, [30000, 40000, 50000])
+        self.assertEqual(server.received, self.binary_image)
+
+    def test_retry_chunk(self):
+        """ Chunks the server got corrupted are sent again """
+        server = self.pump._requester = ResumableServer(self, corrupt_at=20000)
+        self.upload().run()
+
+        self.assertEqual(server.puts, [0, 10000, 20000, 20000, 30000, 40000, 50000])
+        self.assertEqual(server.received, self.binary_image)
+
+    def test_retry_offset(self):
+        """ Failing to ask the server what it has counts as a retry """
+        server = self.pump._requester = ResumableServer(self, fail_at=20000, fail_offset=2)
+        self.upload(retries=3).run()
+        self.assertEqual(server.received, self.binary_image)
+
+        server = self.pump._requester = ResumableServer(self, fail_at=20000, fail_offset=2)
+        self.assertRaises(requests.exceptions.ConnectionError, self.upload(retries=2).run)
+
+    def test_retries(self):
+        server = self.pump._requester = ResumableServer(self, corrupt_at=0)
+        self.assertRaises(PyPumpException, self.upload(retries=0).run)
+        self.assertEqual(server.received, b"")
+
+    def test_not_resumable(self):
+        """ Servers without resumable uploads get the whole file at once """
+        server = self.pump._requester = ResumableServer(self, resumable=False)
+        self.assertEqual(self.upload().run(), None)
+
+        self.pump.Image().from_file(self.bucket.path_to_png, resumable=True)
+        self.assertEqual(server.received, self.binary_image)
+        self.assertEqual(server.puts, [])
+        # the server is only asked once
+        self.assertEqual(server.probes, 1)
+        # and the empty upload it made of that is deleted
+        self.assertEqual(server.deleted, ["https://example.com/api/image/abc"])
+
+
+class UploadRetryTest(PyPumpTest):
+    """ Streamed bodies are sent whole when a request is made again """
+
+    data = b"0123456789" * 1000
+
+    def setUp(self):
+        super(UploadRetryTest, self).setUp()
+        self.bodies = []
+        self.responses = [
+            Response(url=None, data={}, status_code=429, headers={"Retry-After": "0"}),
+            Response(url=None, data={"ok": True}),
+        ]
+        self.pump._requester = self.server
+
+    def server(self, fnc, endpoint, raw=False, **kwargs):
+        self.bodies.append(kwargs["data"].read())
+        return self.responses.pop(0)
+
+    def upload(self, source):
+        return self.pump.request("/api/user/Test/uploads", method="POST",
+                                 data=UploadStream(source, length=len(self.data)))
+
+    def test_rate_limited(self):
+        for source in [self.data, io.BytesIO(self.data)]:
+            self.setUp()
+            self.assertEqual(self.upload(source), {"ok": True})
+            self.assertEqual(self.bodies, [self.data, self.data])
+
+    def test_not_rewindable(self):
+        """ Iterables can't be sent again, the request fails instead """
+        self.assertRaises(PyPumpException, self.upload, iter([self.data]))
+        self.assertEqual(self.bodies, [self.data])
+
+    def test_http_fallback(self):
+        bodies = []
+
+        def post(url, data=None, **kwargs):
+            bodies.append(data.read())
+            if url.startswith("https://"):
+                raise requests.exceptions.ConnectionError("Connection refused")
+            return Response(url=url, data={"ok": True})
+
+        self.pump.verify_requests = False
+        self.pump.set_https()
+        self.pump._requester = lambda *args, **kwargs: PyPump._requester(self.pump, *args, **kwargs)
+        stream = UploadStream(io.BytesIO(self.data))
+        self.pump._requester(post, "/api/user/Test/uploads", data=stream)
+        self.assertEqual(len(bodies), 2)
+        self.assertTrue(bodies[0] == bodies[1] == self.data)